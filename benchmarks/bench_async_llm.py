@@ -0,0 +1,112 @@
+"""Benchmark the blocking and awaitable LiteLLMWrapper call paths.
+
+Starts a local OpenAI-compatible stub server that answers every chat completion
+after a fixed delay, then issues the same number of requests through
+``LiteLLMWrapper.__call__`` (what ``process_scene`` used to do on the event loop)
+and through ``LiteLLMWrapper.acall`` at increasing concurrency levels.
+
+Usage:
+    python benchmarks/bench_async_llm.py --requests 32 --latency 0.5 --concurrency 1 2 4 8 16
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import litellm
+from mllm_tools.litellm import LiteLLMWrapper
+from mllm_tools.utils import _prepare_text_inputs
+
+
+def _make_stub_handler(latency: float):
+    """Create a request handler that mimics the OpenAI chat completions endpoint."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub-model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "```python\nprint('stub')\n```"},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+async def run_blocking(model: LiteLLMWrapper, num_requests: int, concurrency: int) -> float:
+    """Issue requests through the blocking call path from coroutines, as process_scene did."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request(i):
+        async with semaphore:
+            return model(_prepare_text_inputs(f"request {i}"), metadata={})
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one_request(i) for i in range(num_requests)])
+    return time.perf_counter() - start
+
+
+async def run_async(model: LiteLLMWrapper, num_requests: int, concurrency: int) -> float:
+    """Issue requests through the awaitable call path."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request(i):
+        async with semaphore:
+            return await model.acall(_prepare_text_inputs(f"request {i}"), metadata={})
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one_request(i) for i in range(num_requests)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blocking vs. async LLM calls against a local stub model")
+    parser.add_argument("--requests", type=int, default=32, help="Number of requests per measurement")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated model latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrency levels to measure")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_stub_handler(args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    litellm.api_base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    model = LiteLLMWrapper(model_name="openai/stub-model", temperature=0.7, print_cost=False, use_langfuse=False)
+
+    print(f"{'Concurrency':<12} {'Blocking req/s':<16} {'Async req/s':<14} {'Speedup':<8}")
+    print("-" * 52)
+    for concurrency in args.concurrency:
+        blocking_time = asyncio.run(run_blocking(model, args.requests, concurrency))
+        async_time = asyncio.run(run_async(model, args.requests, concurrency))
+        blocking_throughput = args.requests / blocking_time
+        async_throughput = args.requests / async_time
+        print(f"{concurrency:<12} {blocking_throughput:<16.2f} {async_throughput:<14.2f} {async_throughput / blocking_throughput:<8.2f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
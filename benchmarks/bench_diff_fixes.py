@@ -0,0 +1,78 @@
+"""Benchmark the output size of diff-based code fixes against full rewrites.
+
+Walks the stored code versions of a generated topic (``<scene>/code/*_vN.py``) and, for
+each fix from version N to N+1, compares the tokens of the full corrected code the model
+wrote with the tokens of the minimal SEARCH/REPLACE blocks producing the same change.
+The blocks are applied back with ``apply_code_edits`` to check that they round-trip.
+Tokens are estimated at four characters per token, like the rate limiter does.
+
+Usage:
+    python benchmarks/bench_diff_fixes.py --topic_dir output/triangle_props/triangle_properties
+"""
+import os
+import re
+import sys
+import glob
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.code_edits import apply_code_edits, make_search_replace_blocks
+
+CHARS_PER_TOKEN = 4
+
+
+def tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def load_versions(code_dir: str):
+    """Return the stored code versions of a scene, ordered by version number."""
+    versions = []
+    for path in glob.glob(os.path.join(code_dir, "*_v*.py")):
+        match = re.search(r"_v(\d+)\.py$", path)
+        if match:
+            with open(path, "r", encoding="utf-8") as f:
+                versions.append((int(match.group(1)), f.read()))
+    return [code for _, code in sorted(versions)]
+
+
+def summarize(name: str, values) -> None:
+    """Print total, mean and median of a token count."""
+    print(f"{name:<28} total {sum(values):7d}  mean {statistics.mean(values):7.0f}  median {statistics.median(values):7.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare diff-based fixes with full rewrites on stored code versions")
+    parser.add_argument("--topic_dir", default="output/triangle_props/triangle_properties",
+                        help="Topic output directory holding sceneN/code/ versions")
+    parser.add_argument("--context", type=int, default=1, help="Unchanged lines around each edit")
+    args = parser.parse_args()
+
+    full, diff, changed_lines = [], [], []
+    round_trips = 0
+    for code_dir in sorted(glob.glob(os.path.join(args.topic_dir, "scene*", "code"))):
+        versions = load_versions(code_dir)
+        for old, new in zip(versions, versions[1:]):
+            if old == new:
+                continue
+            blocks = make_search_replace_blocks(old, new, args.context)
+            full.append(tokens(new))
+            diff.append(tokens(blocks))
+            changed_lines.append(blocks.count("\n"))
+            applied = apply_code_edits(old, blocks)
+            round_trips += applied is not None and applied.strip() == new.strip()
+
+    if not full:
+        print(f"No consecutive code versions found under {args.topic_dir}")
+        return
+    print(f"{len(full)} fixes, edits round-tripped for {round_trips}")
+    summarize("Full rewrite (tokens)", full)
+    summarize("SEARCH/REPLACE (tokens)", diff)
+    summarize("SEARCH/REPLACE (lines)", changed_lines)
+    print(f"Output tokens saved: {1 - sum(diff) / sum(full):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Measure how much the error distiller shrinks the errors sent to fix prompts.
+
+Reads the stored render errors of generated topics (``*_error.log``), distills each one
+and reports the estimated tokens before and after, plus how many distinct error-fix RAG
+query cache keys the errors map to. Tokens are estimated at four characters per token.
+
+Usage:
+    python benchmarks/bench_error_distiller.py --output_dir output --show 2
+"""
+import os
+import sys
+import glob
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.error_distiller import distill_error, error_cache_key
+
+CHARS_PER_TOKEN = 4
+
+
+def summarize(name: str, values) -> None:
+    """Print total, mean and median of a token count."""
+    print(f"{name:<18} total {sum(values):7d}  mean {statistics.mean(values):6.0f}  median {statistics.median(values):6.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the token reduction of distilled render errors")
+    parser.add_argument("--output_dir", default="output", help="Output directory of generated topics")
+    parser.add_argument("--show", type=int, default=0, help="Print this many distilled errors")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.output_dir, "**", "*_error.log"), recursive=True))
+    if not paths:
+        print(f"No error logs found under {args.output_dir}")
+        return
+
+    raw, distilled, keys = [], [], set()
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            error = f.read()
+        result = distill_error(error)
+        raw.append(len(error) // CHARS_PER_TOKEN)
+        distilled.append(len(result) // CHARS_PER_TOKEN)
+        keys.add((os.path.dirname(path), error_cache_key(result)))
+        if len(distilled) <= args.show:
+            print(f"--- {os.path.basename(path)}\n{result}\n")
+
+    print(f"{len(paths)} errors, {len(keys)} distinct error-fix query cache entries")
+    summarize("Raw (tokens)", raw)
+    summarize("Distilled (tokens)", distilled)
+    print(f"Error tokens saved per fix: {statistics.mean(r - d for r, d in zip(raw, distilled)):.0f} "
+          f"({1 - sum(distilled) / sum(raw):.1%})")
+
+
+if __name__ == "__main__":
+    main()
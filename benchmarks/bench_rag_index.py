@@ -0,0 +1,113 @@
+"""Benchmark the NumPy index backend against Chroma queries on the core documentation store.
+
+Loads the existing core store, builds (or loads) its exact and IVF NumPy indexes and
+searches all three with the same query vectors: stored chunk embeddings plus Gaussian
+noise, so no embedding requests are made. Queries are sent in batches, like
+``find_relevant_docs`` does. Reports the start-up time of each backend, the latency per
+batch, the recall@k of the top k against an exact brute-force search, and how often the
+results kept by ``score_threshold=0.5`` agree with Chroma.
+
+Usage:
+    python benchmarks/bench_rag_index.py --queries 200 --batch 8 --k 2
+"""
+import os
+import sys
+import math
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.config import Config
+from src.rag.vector_store import RAGVectorStore
+from src.rag.numpy_index import NumpyIndex
+
+
+def chroma_search(store, queries, k: int, relevance_score):
+    """Search the collection like find_relevant_docs and return (contents, scores) per query."""
+    results = store._collection.query(query_embeddings=queries.tolist(), n_results=k, include=["documents", "distances"])
+    return [(documents, [relevance_score(distance) for distance in distances])
+            for documents, distances in zip(results["documents"], results["distances"])]
+
+
+def numpy_search(index, queries, k: int, relevance_score, n_probes: int):
+    results = index.search(queries.tolist(), k, relevance_score, score_threshold=-math.inf, n_probes=n_probes)
+    return [([content for content, _, _ in query_results], [score for _, _, score in query_results])
+            for query_results in results]
+
+
+def run(name, search, query_batches, exact, k: int, reference=None):
+    """Time a backend over all batches and print its latency, recall and threshold agreement."""
+    latencies, results = [], []
+    for batch in query_batches:
+        start = time.perf_counter()
+        results.extend(search(batch))
+        latencies.append(time.perf_counter() - start)
+    recall = statistics.mean(len(set(found) & set(expected)) / len(expected)
+                             for (found, _), (expected, _) in zip(results, exact))
+    line = (f"{name:<14} mean {statistics.mean(latencies) * 1000:8.2f} ms  median {statistics.median(latencies) * 1000:8.2f} ms"
+            f"  recall@{k} {recall:.3f}")
+    if reference is not None:
+        agree = statistics.mean(
+            {c for c, s in zip(*result) if s >= 0.5} == {c for c, s in zip(*ref) if s >= 0.5}
+            for result, ref in zip(results, reference)
+        )
+        line += f"  same results as Chroma at 0.5: {agree:.1%}"
+    print(line)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare NumPy index and Chroma search latency and recall")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query vectors")
+    parser.add_argument("--batch", type=int, default=8, help="Queries per search call")
+    parser.add_argument("--k", type=int, default=2, help="Results per query, as used by the pipeline")
+    parser.add_argument("--noise", type=float, default=0.02, help="Standard deviation of the noise added to each query")
+    parser.add_argument("--ivf_lists", type=int, default=0, help="Inverted lists of the IVF index (default: sqrt of the chunks)")
+    parser.add_argument("--ivf_probes", type=int, default=8, help="Inverted lists searched per query")
+    parser.add_argument("--chroma_db_path", default=Config.CHROMA_DB_PATH, help="Path to an existing ChromaDB")
+    parser.add_argument("--manim_docs_path", default=Config.MANIM_DOCS_PATH, help="Path to the Manim documentation")
+    parser.add_argument("--embedding_model", default=Config.EMBEDDING_MODEL, help="Embedding model of the ChromaDB")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = RAGVectorStore(chroma_db_path=args.chroma_db_path, manim_docs_path=args.manim_docs_path,
+                           embedding_model=args.embedding_model, use_langfuse=False)
+    print(f"Chroma stores loaded in {time.perf_counter() - start:.2f}s")
+    core = store.core_vector_store
+    store_path = store.store_paths["manim_core"]
+    count = core._collection.count()
+    ivf_lists = args.ivf_lists or int(math.sqrt(count))
+
+    start = time.perf_counter()
+    exact_index = NumpyIndex.load_or_build(core._collection, store_path, 0)
+    print(f"Exact NumPy index ready in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    exact_index = NumpyIndex(exact_index.index_path)
+    print(f"Exact NumPy index loaded in {time.perf_counter() - start:.3f}s ({count} chunks)")
+    # The IVF index gets its own folder so that both can be compared
+    start = time.perf_counter()
+    ivf_index = NumpyIndex.build(core._collection, os.path.join(store_path, "numpy_index_bench_ivf"),
+                                 "benchmark", ivf_lists)
+    print(f"IVF NumPy index with {ivf_lists} lists built in {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(0)
+    rows = rng.choice(count, size=min(args.queries, count), replace=False)
+    queries = np.asarray(exact_index.vectors[rows] * exact_index.norms[rows, None], dtype=np.float32)
+    queries += rng.normal(scale=args.noise, size=queries.shape).astype(np.float32)
+    query_batches = [queries[i:i + args.batch] for i in range(0, len(queries), args.batch)]
+
+    relevance_score = core._select_relevance_score_fn()
+    exact = numpy_search(exact_index, queries, args.k, relevance_score, args.ivf_probes)
+    chroma = run("Chroma", lambda batch: chroma_search(core, batch, args.k, relevance_score), query_batches, exact, args.k)
+    run("NumPy exact", lambda batch: numpy_search(exact_index, batch, args.k, relevance_score, args.ivf_probes),
+        query_batches, exact, args.k, chroma)
+    run("NumPy IVF", lambda batch: numpy_search(ivf_index, batch, args.k, relevance_score, args.ivf_probes),
+        query_batches, exact, args.k, chroma)
+
+
+if __name__ == "__main__":
+    main()
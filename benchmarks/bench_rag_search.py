@@ -0,0 +1,99 @@
+"""Benchmark batched RAG searches against one embedding request and search per query.
+
+Replays the RAG queries stored with generated topics (``rag_queries_*.json``) against the
+documentation store, once the way ``find_relevant_docs`` used to search (one
+``similarity_search_with_relevance_scores`` call, hence one embedding request, per query)
+and once through the batched ``find_relevant_docs``. Reports the latency per call, the
+embedding requests made and whether both return the same documents. With
+``--embedding_cache_path`` the batched searches use the query embedding cache, and its
+hit rate is printed at the end; run twice to see a warm cache.
+
+Usage:
+    python benchmarks/bench_rag_search.py --output_dir output --limit 20
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.config import Config
+from src.rag.vector_store import get_vector_store
+from src.rag.embedding_cache import configure_embedding_cache, print_embedding_cache_stats
+
+
+def search_per_query(store, queries, k: int):
+    """Search like the unbatched find_relevant_docs and return the contents found."""
+    contents = set()
+    for query in queries:
+        if query["type"] == "manim-core":
+            vector_store = store.core_vector_store
+        elif query["type"] in store.plugin_stores:
+            vector_store = store.plugin_stores[query["type"]]
+        else:
+            continue
+        for document, _ in vector_store.similarity_search_with_relevance_scores(query=query["query"], k=k, score_threshold=0.5):
+            contents.add(document.page_content)
+    return contents
+
+
+def search_batched(store, queries, k: int):
+    """Search with find_relevant_docs and return the contents found."""
+    result = store.find_relevant_docs(queries, k=k)
+    return {block.split("\n````\nScore:")[0] for block in result.split("Content:\n````text\n")[1:]}
+
+
+def measure(store, search, query_sets, k: int):
+    """Run a search over every query set and return latencies, embedding requests and results."""
+    latencies, results = [], []
+    requests_before = store.embeddings.request_count
+    for queries in query_sets:
+        start = time.perf_counter()
+        results.append(search(store, queries, k))
+        latencies.append(time.perf_counter() - start)
+    return latencies, store.embeddings.request_count - requests_before, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batched and per-query RAG searches on stored queries")
+    parser.add_argument("--output_dir", default="output", help="Output directory of generated topics")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of stored query sets to replay")
+    parser.add_argument("--k", type=int, default=2, help="Results per query, as used by the pipeline")
+    parser.add_argument("--chroma_db_path", default=Config.CHROMA_DB_PATH, help="Path to an existing ChromaDB")
+    parser.add_argument("--manim_docs_path", default=Config.MANIM_DOCS_PATH, help="Path to the Manim documentation")
+    parser.add_argument("--embedding_model", default=Config.EMBEDDING_MODEL, help="Embedding model of the ChromaDB")
+    parser.add_argument("--embedding_cache_path", default=None, help="Directory of the query embedding cache (default: disabled)")
+    args = parser.parse_args()
+
+    query_sets = []
+    for path in sorted(glob.glob(os.path.join(args.output_dir, "**", "rag_queries_*.json"), recursive=True)):
+        with open(path, "r") as f:
+            queries = json.load(f)
+        if isinstance(queries, list) and queries and all(isinstance(q, dict) and "query" in q and "type" in q for q in queries):
+            query_sets.append(queries)
+    query_sets = query_sets[:args.limit]
+    if not query_sets:
+        print(f"No stored RAG queries found under {args.output_dir}")
+        return
+
+    if args.embedding_cache_path:
+        configure_embedding_cache(args.embedding_cache_path)
+    store = get_vector_store(args.chroma_db_path, args.manim_docs_path, args.embedding_model, use_langfuse=False)
+    print(f"{len(query_sets)} query sets, {sum(len(queries) for queries in query_sets)} queries")
+    per_query_latencies, per_query_requests, per_query_results = measure(store, search_per_query, query_sets, args.k)
+    batched_latencies, batched_requests, batched_results = measure(store, search_batched, query_sets, args.k)
+    for name, latencies, requests in (("Per query", per_query_latencies, per_query_requests),
+                                      ("Batched", batched_latencies, batched_requests)):
+        print(f"{name:<10} mean {statistics.mean(latencies):6.2f}s  median {statistics.median(latencies):6.2f}s  "
+              f"embedding requests {requests:5d}")
+    same = sum(a == b for a, b in zip(per_query_results, batched_results))
+    print(f"Identical documents for {same}/{len(query_sets)} query sets")
+    print_embedding_cache_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark cold ``manim`` subprocess renders against the warm render server.
+
+Writes a trivial scene that imports the same modules as generated scenes, then
+renders it N times with a fresh ``manim -ql`` process and N times through
+``WarmRenderClient``. The difference is the per-render start-up overhead.
+
+Usage:
+    python benchmarks/bench_render_server.py --renders 5
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.render_server import WarmRenderClient
+
+SCENE_CODE = '''from manim import *
+from manim_voiceover import VoiceoverScene
+
+
+class BenchScene(Scene):
+    def construct(self):
+        self.add(Square())
+'''
+
+
+def render_cold(scene_file: str, media_dir: str) -> float:
+    """Render once in a fresh manim process and return the latency."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        ["manim", "-ql", scene_file, "--media_dir", media_dir, "--progress_bar", "none", "-s"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return time.perf_counter() - start
+
+
+async def render_warm(client: WarmRenderClient, scene_file: str, media_dir: str) -> float:
+    """Render once on the warm server and return the latency."""
+    start = time.perf_counter()
+    result = await client.run(["-ql", scene_file, "--media_dir", media_dir, "--progress_bar", "none", "-s"])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return time.perf_counter() - start
+
+
+def summarize(name: str, latencies) -> None:
+    """Print mean and median latency of a run."""
+    print(f"{name:<12} mean {statistics.mean(latencies):6.2f}s  median {statistics.median(latencies):6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold manim processes vs. the warm render server")
+    parser.add_argument("--renders", type=int, default=5, help="Number of renders per backend")
+    parser.add_argument("--socket", type=str, default=os.path.join(tempfile.gettempdir(), "tea_render_bench.sock"),
+                        help="Socket for the benchmark render server")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        scene_file = os.path.join(work_dir, "bench_scene.py")
+        with open(scene_file, "w") as f:
+            f.write(SCENE_CODE)
+        media_dir = os.path.join(work_dir, "media")
+
+        cold = [render_cold(scene_file, media_dir) for _ in range(args.renders)]
+
+        client = WarmRenderClient(args.socket)
+        client.ensure_server()
+        warm = [asyncio.run(render_warm(client, scene_file, media_dir)) for _ in range(args.renders)]
+
+    summarize("Cold", cold)
+    summarize("Warm", warm)
+    print(f"Speedup: {statistics.mean(cold) / statistics.mean(warm):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
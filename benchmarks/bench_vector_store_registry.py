@@ -0,0 +1,87 @@
+"""Measure the start-up time and memory of per-consumer documentation stores against the shared one.
+
+With RAG enabled, every topic builds a planner (``RAGIntegration``) and a code generator,
+which used to open a ``RAGVectorStore`` each. Both modes are run in a fresh interpreter:
+``separate`` constructs one store per consumer, ``shared`` asks ``get_vector_store`` for
+each consumer. The existing ChromaDB is loaded, so no embedding requests are made.
+
+Usage:
+    python benchmarks/bench_vector_store_registry.py --topics 4 --chroma_db_path data/rag/chroma_db
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.config import Config
+
+
+def rss_mb() -> float:
+    """Return the current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Peak RSS, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def run_mode(args) -> dict:
+    """Construct the stores of all consumers in this process and return the measurements."""
+    from src.rag.vector_store import RAGVectorStore, get_vector_store
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    stores = []
+    for _ in range(args.topics * 2):
+        if args.mode == "shared":
+            stores.append(get_vector_store(args.chroma_db_path, args.manim_docs_path, args.embedding_model,
+                                           use_langfuse=False))
+        else:
+            stores.append(RAGVectorStore(chroma_db_path=args.chroma_db_path, manim_docs_path=args.manim_docs_path,
+                                         embedding_model=args.embedding_model, use_langfuse=False))
+    return {
+        "seconds": time.perf_counter() - start,
+        "rss_mb": rss_mb() - baseline,
+        "instances": len({id(store) for store in stores}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-consumer and shared RAG vector stores")
+    parser.add_argument("--topics", type=int, default=4, help="Topics in the process, each with a planner and a code generator")
+    parser.add_argument("--chroma_db_path", default=Config.CHROMA_DB_PATH, help="Path to an existing ChromaDB")
+    parser.add_argument("--manim_docs_path", default=Config.MANIM_DOCS_PATH, help="Path to the Manim documentation")
+    parser.add_argument("--embedding_model", default=Config.EMBEDDING_MODEL, help="Embedding model of the ChromaDB")
+    parser.add_argument("--mode", choices=["separate", "shared"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: the store logs go to stderr so that stdout holds only the result
+        real_stdout, sys.stdout = sys.stdout, sys.stderr
+        result = run_mode(args)
+        sys.stdout = real_stdout
+        print(json.dumps(result))
+        return
+
+    print(f"{args.topics} topics, {args.topics * 2} consumers")
+    for mode in ("separate", "shared"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--mode", mode, "--topics", str(args.topics),
+             "--chroma_db_path", args.chroma_db_path, "--manim_docs_path", args.manim_docs_path,
+             "--embedding_model", args.embedding_model],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<9} {result['instances']:3d} stores  start-up {result['seconds']:7.2f}s  "
+              f"RSS +{result['rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Bump when evaluation prompts are assembled differently, so that cached model responses are not reused
+PROMPT_TEMPLATE_VERSION = "2"
@@ -10,6 +10,8 @@ from moviepy import VideoFileClip
 
 from mllm_tools.litellm import LiteLLMWrapper
 from mllm_tools.gemini import GeminiWrapper
+from mllm_tools.response_cache import configure_response_cache
+from eval_suite import PROMPT_TEMPLATE_VERSION
 from eval_suite.utils import calculate_geometric_mean
 from eval_suite.text_utils import parse_srt_to_text, fix_transcript, evaluate_text
 from eval_suite.video_utils import evaluate_video_chunk_new
@@ -377,9 +379,15 @@ def main():
     parser.add_argument('--target_fps', type=int, help='Target FPS for video processing. If not set, original video FPS will be used', required=False)
     parser.add_argument('--use_parent_folder_as_topic', action='store_true', help='Use parent folder name as topic name for single file evaluation', default=True)
     parser.add_argument('--max_workers', type=int, default=4, help='Maximum number of concurrent workers for parallel processing')
+    parser.add_argument('--llm_cache_path', type=str, default=None, help='SQLite cache of model responses; re-evaluating unchanged files is then free (default: disabled)')
+    parser.add_argument('--llm_cache_max_mb', type=float, default=1024, help='Size limit of the response cache in MiB')
 
     args = parser.parse_args()
 
+    response_cache = None
+    if args.llm_cache_path:
+        response_cache = configure_response_cache(args.llm_cache_path, args.llm_cache_max_mb, PROMPT_TEMPLATE_VERSION)
+
     # Initialize separate models
     text_model = LiteLLMWrapper(
         model_name=args.model_text,
@@ -469,6 +477,9 @@ def main():
     
     os.rmdir(moviepy_temp_dir)
 
+    if response_cache is not None:
+        response_cache.print_stats()
+
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,7 @@
 import os
 import json
 import random
-from typing import Union, List, Dict, Optional
+from typing import Callable, Union, List, Dict, Optional
 import subprocess
 import argparse
 import glob
@@ -9,15 +9,29 @@ from PIL import Image
 import re
 from dotenv import load_dotenv
 import asyncio
+import time
 import uuid # Import uuid for generating trace_id
 
 from mllm_tools.litellm import LiteLLMWrapper
 from mllm_tools.utils import _prepare_text_inputs # Keep _prepare_text_inputs if still used directly in main
+from mllm_tools.usage import track_usage
+from mllm_tools.rate_limiter import load_rate_limits, print_rate_limit_stats
+from mllm_tools.response_cache import configure_response_cache, get_response_cache
 
 # Import new modules
 from src.core.video_planner import VideoPlanner
 from src.core.code_generator import CodeGenerator
-from src.core.video_renderer import VideoRenderer
+from src.core.video_renderer import VideoRenderer, RENDER_QUALITY_FLAGS
+from src.core.stage_scheduler import StageScheduler
+from src.core.render_executor import RenderExecutor
+from src.core.render_server import WarmRenderClient, DEFAULT_SOCKET_PATH
+from src.core.code_validator import CodeValidator
+from src.rag.scene_library import SceneLibrary
+from src.rag.vector_store import configure_vector_stores, print_vector_store_stats
+from src.rag.embedding_cache import configure_embedding_cache, print_embedding_cache_stats
+from src.utils.state_store import StateStore
+from src.utils.job_queue import JobQueue
+from src.core.job_runner import JobWorker, enqueue_theorems
 from src.utils.utils import _print_response, _extract_code, extract_xml # Import utility functions
 from src.config.config import Config # Import Config class
 
@@ -26,7 +40,7 @@ from src.core.parse_video import (
     get_images_from_video,
     image_with_most_non_black_space
 )
-from task_generator import get_banned_reasonings
+from task_generator import get_banned_reasonings, PROMPT_TEMPLATE_VERSION
 from task_generator.prompts_raw import (_code_font_size, _code_disable, _code_limit, _prompt_manim_cheatsheet)
 
 # Load allowed models list from JSON file
@@ -60,6 +74,28 @@ class VideoGenerator:
         use_langfuse (bool): Whether to enable Langfuse logging
         trace_id (str, optional): Trace ID for logging
         max_scene_concurrency (int): Maximum number of scenes to process concurrently
+        max_planner_concurrency (int, optional): Size of the scene plan and, separately, the scene outline worker pools (defaults to max_scene_concurrency)
+        max_code_concurrency (int, optional): Code LLM worker pool size (defaults to max_scene_concurrency)
+        max_render_concurrency (int, optional): Manim render worker pool size (defaults to the number of CPU cores)
+        max_combine_concurrency (int): ffmpeg combine worker pool size
+        render_timeout (float, optional): Seconds before a runaway render is killed
+        render_cpu_limit (int, optional): Per-render CPU seconds limit
+        render_memory_limit_mb (int, optional): Per-render memory limit in MB
+        render_backend (str): "subprocess" to launch manim per render, or "warm" to use the warm render server
+        render_server_socket (str): Unix socket of the warm render server
+        render_server_preload_tts (bool): Whether a warm render server started by the pipeline also loads the Kokoro model
+        validate_quality (str): Render tier used to check each code version for errors
+        visual_quality (str): Render tier used for visual self-reflection
+        final_quality (str): Render tier of the videos that are combined
+        use_static_validation (bool): Whether to check code statically before rendering it
+        num_code_candidates (int): Code candidates generated and rendered in parallel per scene; the first to render wins
+        candidate_temperatures (List[float], optional): Sampling temperature of each candidate (defaults to a spread from 0.2 to 1.0)
+        state_db_path (str, optional): SQLite state database (defaults to state.db in output_dir)
+        use_streaming (bool): Whether to stream code completions and stop at the end of the code block
+        use_diff_fixes (bool): Whether code fixes ask for SEARCH/REPLACE edits instead of the full code
+        scene_library_path (str, optional): ChromaDB directory of the library of rendered scenes used as code examples
+        scene_library_k (int): Library examples added to each code generation prompt
+        use_streaming_outline (bool): Whether to stream scene outlines and start planning each scene once its outline is complete
 
     Attributes:
         output_dir (str): Directory for output files
@@ -67,6 +103,10 @@ class VideoGenerator:
         use_visual_fix_code (bool): Visual code fixing flag
         session_id (str): Unique session identifier
         scene_semaphore (asyncio.Semaphore): Controls concurrent scene processing
+        scheduler (StageScheduler): Per-stage worker pools shared by all topics
+        render_executor (RenderExecutor): Render worker pool shared by all topics
+        code_validator (CodeValidator): Static checker run before each render, or None if disabled; created on first use
+        state_store (StateStore): Records the progress of every topic and scene; opened on first use
         banned_reasonings (list): List of banned reasoning patterns
         planner (VideoPlanner): Handles scene planning
         code_generator (CodeGenerator): Handles code generation
@@ -88,13 +128,68 @@ class VideoGenerator:
                  use_visual_fix_code=False,
                  use_langfuse=True,
                  trace_id=None,
-                 max_scene_concurrency: int = 5):
+                 max_scene_concurrency: int = 5,
+                 max_planner_concurrency: Optional[int] = None,
+                 max_code_concurrency: Optional[int] = None,
+                 max_render_concurrency: Optional[int] = None,
+                 max_combine_concurrency: int = 1,
+                 render_timeout: Optional[float] = None,
+                 render_cpu_limit: Optional[int] = None,
+                 render_memory_limit_mb: Optional[int] = None,
+                 render_backend: str = "subprocess",
+                 render_server_socket: str = DEFAULT_SOCKET_PATH,
+                 render_server_preload_tts: bool = False,
+                 validate_quality: str = "low",
+                 visual_quality: str = "low",
+                 final_quality: str = "high",
+                 use_static_validation: bool = True,
+                 num_code_candidates: int = 1,
+                 candidate_temperatures: Optional[List[float]] = None,
+                 state_db_path: Optional[str] = None,
+                 use_streaming: bool = False,
+                 use_diff_fixes: bool = False,
+                 scene_library_path: Optional[str] = None,
+                 scene_library_k: int = 2,
+                 use_streaming_outline: bool = False):
         self.output_dir = output_dir
         self.verbose = verbose
         self.use_visual_fix_code = use_visual_fix_code
         self.session_id = self._load_or_create_session_id()  # Modified to load existing or create new
+        # The state store, static validator and scene library index are set up on first use,
+        # so that status checks and idle workers do not pay for them
+        self.state_db_path = state_db_path or os.path.join(output_dir, "state.db")
+        self._state_store: Optional[StateStore] = None
         self.scene_semaphore = asyncio.Semaphore(max_scene_concurrency)
+        self.scheduler = StageScheduler(
+            plan_workers=max_planner_concurrency or max_scene_concurrency,
+            code_workers=max_code_concurrency or max_scene_concurrency,
+            combine_workers=max_combine_concurrency
+        )
+        render_client = None
+        if render_backend == "warm":
+            # The client starts the server on the first render
+            render_client = WarmRenderClient(render_server_socket, preload_tts=render_server_preload_tts)
+        self.render_executor = RenderExecutor(
+            max_workers=max_render_concurrency,
+            timeout=render_timeout,
+            cpu_time_limit=render_cpu_limit,
+            memory_limit_mb=render_memory_limit_mb,
+            render_client=render_client
+        )
+        self.use_static_validation = use_static_validation
+        self._code_validator: Optional[CodeValidator] = None
+        self.num_code_candidates = max(1, num_code_candidates)
+        self.candidate_temperatures = candidate_temperatures
         self.banned_reasonings = get_banned_reasonings()
+        self.scene_library = None
+        if scene_library_path:
+            # Rendered scenes are indexed on the library's first search or insert
+            self.scene_library = SceneLibrary(scene_library_path, embedding_model, source_dirs=[output_dir])
+        # Fix attempts of finished code candidates, by whether library examples were in their prompt
+        self.library_outcomes = {"with_examples": [], "without_examples": []}
+        # Seconds from the start of a topic's pipeline to its first implementation plan
+        self._topic_started_at: Dict[str, float] = {}
+        self.first_plan_seconds: Dict[str, float] = {}
 
         # Initialize separate modules
         self.planner = VideoPlanner(
@@ -109,7 +204,8 @@ class VideoGenerator:
             chroma_db_path=chroma_db_path,
             manim_docs_path=manim_docs_path,
             embedding_model=embedding_model,
-            use_langfuse=use_langfuse
+            use_langfuse=use_langfuse,
+            use_streaming=use_streaming_outline
         )
         self.code_generator = CodeGenerator(
             scene_model=scene_model if scene_model is not None else planner_model,
@@ -124,14 +220,38 @@ class VideoGenerator:
             embedding_model=embedding_model,
             use_visual_fix_code=use_visual_fix_code,
             use_langfuse=use_langfuse,
-            session_id=self.session_id
+            session_id=self.session_id,
+            use_streaming=use_streaming,
+            use_diff_fixes=use_diff_fixes,
+            scene_library=self.scene_library,
+            scene_library_k=scene_library_k
         )
         self.video_renderer = VideoRenderer(
             output_dir=output_dir,
             print_response=verbose,
-            use_visual_fix_code=use_visual_fix_code
+            use_visual_fix_code=use_visual_fix_code,
+            scheduler=self.scheduler,
+            render_executor=self.render_executor,
+            validate_quality=validate_quality,
+            visual_quality=visual_quality,
+            final_quality=final_quality,
+            video_input=self.code_generator.accepts_video()
         )
 
+    @property
+    def state_store(self) -> StateStore:
+        """The progress database, opened on first use."""
+        if self._state_store is None:
+            self._state_store = StateStore(self.state_db_path, self.output_dir)
+        return self._state_store
+
+    @property
+    def code_validator(self) -> Optional[CodeValidator]:
+        """The static checker, created on first use, or None if static validation is disabled."""
+        if self.use_static_validation and self._code_validator is None:
+            self._code_validator = CodeValidator()
+        return self._code_validator
+
     def _load_or_create_session_id(self) -> str:
         """
         Load existing session ID from file or create a new one.
@@ -191,7 +311,7 @@ class VideoGenerator:
                 return f.read().strip()
         return None
 
-    def generate_scene_outline(self,
+    async def generate_scene_outline(self,
                             topic: str,
                             description: str,
                             session_id: str) -> str:
@@ -206,7 +326,7 @@ class VideoGenerator:
         Returns:
             str: Generated scene outline
         """
-        return self.planner.generate_scene_outline(topic, description, session_id)
+        return await self.planner.generate_scene_outline(topic, description, session_id)
 
     async def generate_scene_implementation(self,
                                       topic: str,
@@ -246,6 +366,32 @@ class VideoGenerator:
         """
         return await self.planner.generate_scene_implementation_concurrently(topic, description, plan, session_id, self.scene_semaphore) # Pass semaphore
 
+    def print_scene_library_stats(self) -> None:
+        """Print fix attempts and first-try render success of code generated with and without library examples."""
+        if self.scene_library is None:
+            return
+        print("\nScene library:")
+        means = {}
+        for name, outcomes in self.library_outcomes.items():
+            if not outcomes:
+                continue
+            attempts = [attempt for attempt, _ in outcomes]
+            means[name] = sum(attempts) / len(attempts)
+            first_try = sum(1 for attempt, succeeded in outcomes if succeeded and attempt == 0)
+            print(f"  {name.replace('_', ' '):<18} {len(outcomes)} candidates, {means[name]:.2f} fix attempts on average, "
+                  f"{first_try}/{len(outcomes)} rendered on the first try")
+        if len(means) == 2:
+            saved = (means["without_examples"] - means["with_examples"]) * len(self.library_outcomes["with_examples"])
+            print(f"  Fix attempts (and renders) saved by the examples: {saved:.1f}")
+
+    def print_first_plan_stats(self) -> None:
+        """Print the time from the start of each topic to its first implementation plan."""
+        if not self.first_plan_seconds:
+            return
+        seconds = sorted(self.first_plan_seconds.values())
+        print(f"\nTime to first scene plan ({'streamed' if self.planner.use_streaming else 'complete'} outline): "
+              f"mean {sum(seconds) / len(seconds):.1f}s, median {seconds[len(seconds) // 2]:.1f}s over {len(seconds)} topics")
+
     def load_implementation_plans(self, topic: str) -> Dict[int, Optional[str]]:
         """
         Load implementation plans for each scene.
@@ -257,28 +403,17 @@ class VideoGenerator:
             Dict[int, Optional[str]]: Dictionary mapping scene numbers to their plans.
                                     If a scene's plan is missing, its value will be None.
         """
-        file_prefix = topic.lower()
-        file_prefix = re.sub(r'[^a-z0-9_]+', '_', file_prefix)
-
-        # Load scene outline from file
-        scene_outline_path = os.path.join(self.output_dir, file_prefix, f"{file_prefix}_scene_outline.txt")
-        if not os.path.exists(scene_outline_path):
+        self.state_store.ensure_topics([topic])
+        plan_paths = self.state_store.implementation_plan_paths(topic)
+        if not plan_paths:
             return {}
-        
-        with open(scene_outline_path, "r") as f:
-            scene_outline = f.read()
-
-        # Extract scene outline to get number of scenes
-        scene_outline_content = extract_xml(scene_outline)
-        scene_number = len(re.findall(r'<SCENE_(\d+)>[^<]', scene_outline_content))
-        print(f"Number of scenes: {scene_number}")
+        print(f"Number of scenes: {len(plan_paths)}")
 
         implementation_plans = {}
 
         # Check each scene's implementation plan
-        for i in range(1, scene_number + 1):
-            plan_path = os.path.join(self.output_dir, file_prefix, f"scene{i}", f"{file_prefix}_scene{i}_implementation_plan.txt")
-            if os.path.exists(plan_path):
+        for i, plan_path in sorted(plan_paths.items()):
+            if plan_path is not None and os.path.exists(plan_path):
                 with open(plan_path, "r") as f:
                     implementation_plans[i] = f.read()
                 print(f"Found existing implementation plan for scene {i}")
@@ -312,30 +447,46 @@ class VideoGenerator:
         # Create tasks for each scene
         tasks = []
         for i, implementation_plan in enumerate(implementation_plans):
-            # Try to load scene trace id, or generate new one if it doesn't exist
-            scene_dir = os.path.join(self.output_dir, file_prefix, f"scene{i+1}")
-            subplan_dir = os.path.join(scene_dir, "subplans")
-            os.makedirs(subplan_dir, exist_ok=True)  # Create directories if they don't exist
-            
-            scene_trace_id_path = os.path.join(subplan_dir, "scene_trace_id.txt")
-            try:
-                with open(scene_trace_id_path, 'r') as f:
-                    scene_trace_id = f.read().strip()
-            except FileNotFoundError:
-                scene_trace_id = str(uuid.uuid4())
-                with open(scene_trace_id_path, 'w') as f:
-                    f.write(scene_trace_id)
-
+            scene_trace_id = self._load_or_create_scene_trace_id(file_prefix, i + 1)
             task = self.process_scene(i, scene_outline, implementation_plan, topic, description, max_retries, file_prefix, session_id, scene_trace_id)
             tasks.append(task)
 
         # Execute all tasks concurrently
         await asyncio.gather(*tasks)
 
+    def _load_or_create_scene_trace_id(self, file_prefix: str, scene_number: int) -> str:
+        """
+        Load the trace ID of a scene, or create and save a new one if it doesn't exist.
+
+        Args:
+            file_prefix (str): Prefix for file naming
+            scene_number (int): Scene number (1-based)
+
+        Returns:
+            str: The scene trace ID
+        """
+        subplan_dir = os.path.join(self.output_dir, file_prefix, f"scene{scene_number}", "subplans")
+        os.makedirs(subplan_dir, exist_ok=True)  # Create directories if they don't exist
+
+        scene_trace_id_path = os.path.join(subplan_dir, "scene_trace_id.txt")
+        try:
+            with open(scene_trace_id_path, 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            scene_trace_id = str(uuid.uuid4())
+            with open(scene_trace_id_path, 'w') as f:
+                f.write(scene_trace_id)
+            return scene_trace_id
+
     async def process_scene(self, i: int, scene_outline: str, scene_implementation: str, topic: str, description: str, max_retries: int, file_prefix: str, session_id: str, scene_trace_id: str): # added scene_trace_id
         """
         Process a single scene using CodeGenerator and VideoRenderer.
 
+        With num_code_candidates > 1, that many code candidates are generated at different
+        temperatures and fixed and rendered in parallel. The first candidate that renders
+        wins and the others are cancelled, which also kills their manim processes.
+        Wall clock time, LLM usage and cost of the scene are written to scene{n}/scene_stats.json.
+
         Args:
             i (int): Scene index
             scene_outline (str): Overall scene outline
@@ -348,80 +499,225 @@ class VideoGenerator:
             scene_trace_id (str): Trace identifier for this scene
         """
         curr_scene = i + 1
-        curr_version = 0
         # scene_trace_id = str(uuid.uuid4()) # Remove uuid generation
-        rag_queries_cache = {}  # Initialize RAG queries cache
+        rag_queries_cache = {}  # Initialize RAG queries cache, shared by all candidates
 
         # Create necessary directories
         code_dir = os.path.join(self.output_dir, file_prefix, f"scene{curr_scene}", "code")
         os.makedirs(code_dir, exist_ok=True)
         media_dir = os.path.join(self.output_dir, file_prefix, "media") # Define media_dir here
 
-        async with self.scene_semaphore:
-            # Step 3A: Generate initial manim code
-            code, log = self.code_generator.generate_manim_code(
-                topic=topic,
-                description=description,
-                scene_outline=scene_outline,
-                scene_implementation=scene_implementation,
-                scene_number=curr_scene,
-                additional_context=[_prompt_manim_cheatsheet, _code_font_size, _code_limit, _code_disable],
-                scene_trace_id=scene_trace_id, # Use passed scene_trace_id
-                session_id=session_id,
-                rag_queries_cache=rag_queries_cache  # Pass the cache
-            )
+        temperatures = self._candidate_temperatures()
+        candidates = [{"candidate": j, "temperature": temperature, "status": "pending", "versions": []}
+                      for j, temperature in enumerate(temperatures)]
+        start_time = time.monotonic()
+        winner = None
+
+        with track_usage() as scene_usage:
+            # Candidate j writes versions j, j + K, j + 2K, ... so that file names never collide
+            tasks = {
+                asyncio.create_task(self._run_code_candidate(
+                    candidate, len(candidates), curr_scene, scene_outline, scene_implementation, topic, description,
+                    max_retries, file_prefix, session_id, scene_trace_id, code_dir, media_dir, rag_queries_cache
+                )): candidate
+                for candidate in candidates
+            }
+            pending = set(tasks)
+            errors = []
+            try:
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is not None:
+                            errors.append(task.exception())
+                        elif task.result() is None:
+                            # Among candidates finishing together keep the highest version, which combine picks up
+                            if winner is None or tasks[task]["versions"][-1] > winner["versions"][-1]:
+                                winner = tasks[task]
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            if winner is None and len(errors) == len(candidates):
+                raise errors[0]
+
+        stats = {
+            "num_candidates": len(candidates),
+            "succeeded": winner is not None,
+            "winner": winner["candidate"] if winner is not None else None,
+            "winner_version": winner["versions"][-1] if winner is not None else None,
+            "wall_clock_seconds": time.monotonic() - start_time,
+            **scene_usage.to_dict(),
+            "candidates": candidates
+        }
+        with open(os.path.join(self.output_dir, file_prefix, f"scene{curr_scene}", "scene_stats.json"), "w") as f:
+            json.dump(stats, f, indent=2)
+        if winner is not None and self.scene_library is not None:
+            # Later topics of this run can already learn from the scene
+            try:
+                await asyncio.to_thread(self.scene_library.add_scene, os.path.join(self.output_dir, file_prefix), curr_scene,
+                                        stats["winner_version"], winner["fix_attempts"])
+            except Exception as e:
+                print(f"Could not add scene {curr_scene} to the scene library: {e}")
+        print(f"Scene {curr_scene} {'rendered' if winner is not None else 'failed'} in {stats['wall_clock_seconds']:.1f}s "
+              f"with {len(candidates)} candidate(s): {scene_usage.calls} LLM calls, "
+              f"{scene_usage.cached_prompt_tokens}/{scene_usage.prompt_tokens} prompt tokens cached, ${scene_usage.cost:.4f}")
+
+    def _candidate_temperatures(self) -> List[Optional[float]]:
+        """
+        Return the sampling temperature of each speculative code candidate.
+
+        Returns:
+            List[Optional[float]]: One temperature per candidate; None keeps the scene model's temperature
+        """
+        k = self.num_code_candidates
+        if self.candidate_temperatures:
+            return [self.candidate_temperatures[j % len(self.candidate_temperatures)] for j in range(k)]
+        if k == 1:
+            return [None]
+        return [round(0.2 + 0.8 * j / (k - 1), 2) for j in range(k)]
+
+    async def _run_code_candidate(self, candidate: Dict, version_step: int, curr_scene: int, scene_outline: str, scene_implementation: str, topic: str, description: str, max_retries: int, file_prefix: str, session_id: str, scene_trace_id: str, code_dir: str, media_dir: str, rag_queries_cache: Dict) -> Optional[str]:
+        """
+        Generate one code candidate for a scene, then render and fix it until it renders or retries run out.
+
+        Args:
+            candidate (Dict): Candidate record; its status, versions, time and LLM usage are filled in
+            version_step (int): Distance between this candidate's code versions
+            curr_scene (int): Scene number
+            scene_outline (str): Overall scene outline
+            scene_implementation (str): Implementation plan for this scene
+            topic (str): The topic of the video
+            description (str): Description of the video content
+            max_retries (int): Maximum number of code fix attempts
+            file_prefix (str): Prefix for file naming
+            session_id (str): Session identifier for tracking
+            scene_trace_id (str): Trace identifier for this scene
+            code_dir (str): Directory for code files
+            media_dir (str): Directory for media output
+            rag_queries_cache (Dict): Cache for RAG queries
 
-            # Save initial code and log (file operations can be offloaded if needed)
-            with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_init_log.txt"), "w") as f:
-                f.write(log)
-            with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py"), "w") as f:
-                f.write(code)
-            print(f"Code saved to {code_dir}/{file_prefix}_scene{curr_scene}_v{curr_version}.py")
-
-            # Step 3B: Compile and fix code if needed
-            error_message = None
-            while True: # Retry loop controlled by break statements
-                code, error_message = await self.video_renderer.render_scene(
-                    code=code,
-                    file_prefix=file_prefix,
-                    curr_scene=curr_scene,
-                    curr_version=curr_version,
-                    code_dir=code_dir,
-                    media_dir=media_dir,
-                    max_retries=max_retries, # Pass max_retries here if needed in render_scene
-                    use_visual_fix_code=self.use_visual_fix_code,
-                    visual_self_reflection_func=self.code_generator.visual_self_reflection, # Pass visual_self_reflection function
-                    banned_reasonings=self.banned_reasonings, # Pass banned reasonings
-                    scene_trace_id=scene_trace_id,
-                    topic=topic,
-                    session_id=session_id
-                )
-                if error_message is None: # Render success if error_message is None
-                    break
-
-                if curr_version >= max_retries: # Max retries reached
-                    print(f"Max retries reached for scene {curr_scene}, error: {error_message}")
-                    break # Exit retry loop
-
-                curr_version += 1
-                # if program runs this, it means that the code is not rendered successfully
-                code, log = self.code_generator.fix_code_errors(
-                    implementation_plan=scene_implementation,
-                    code=code,
-                    error=error_message,
-                    scene_trace_id=scene_trace_id,
-                    topic=topic,
-                    scene_number=curr_scene,
-                    session_id=session_id,
-                    rag_queries_cache=rag_queries_cache
-                )
-
-                with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_fix_log.txt"), "w") as f:
+        Returns:
+            Optional[str]: None if the candidate rendered, otherwise the last error message
+        """
+        curr_version = candidate["candidate"]
+        candidate["status"] = "running"
+        start_time = time.monotonic()
+        attempt = 0
+
+        with track_usage() as usage:
+            try:
+                # Step 3A: Generate initial manim code
+                async with self.scheduler.slot("code"):
+                    code, log = await self.code_generator.generate_manim_code(
+                        topic=topic,
+                        description=description,
+                        scene_outline=scene_outline,
+                        scene_implementation=scene_implementation,
+                        scene_number=curr_scene,
+                        static_context=[_prompt_manim_cheatsheet, _code_font_size, _code_limit, _code_disable],
+                        scene_trace_id=scene_trace_id, # Use passed scene_trace_id
+                        session_id=session_id,
+                        rag_queries_cache=rag_queries_cache,  # Pass the cache
+                        temperature=candidate["temperature"]
+                    )
+
+                # Save initial code and log (file operations can be offloaded if needed)
+                with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_init_log.txt"), "w") as f:
                     f.write(log)
                 with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py"), "w") as f:
                     f.write(code)
-
                 print(f"Code saved to {code_dir}/{file_prefix}_scene{curr_scene}_v{curr_version}.py")
+                self.state_store.record_code(topic, curr_scene, curr_version, os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py"), started_at=start_time)
+
+                # Step 3B: Compile and fix code if needed
+                while True: # Retry loop controlled by break statements
+                    candidate["versions"].append(curr_version)
+                    error_message = None
+                    # Code that fails the static check goes straight back to the fix step without a render
+                    if self.code_validator is not None:
+                        file_path = os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py")
+                        error_message = await asyncio.to_thread(self.code_validator.validate, code, file_path)
+                        if error_message is not None:
+                            print(f"Static check failed for scene {curr_scene} v{curr_version}, skipping render")
+                            with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_error.log"), "a") as f:
+                                f.write(f"\nError in static check:\n{error_message}\n")
+                            self.state_store.record_render(topic, curr_scene, curr_version, error_message, stage="static_check")
+
+                    # manim runs on the render pool; retries of scenes already in flight go first
+                    if error_message is None:
+                        render_started_at = time.time()
+                        code, error_message, rendered_version = await self.video_renderer.render_scene(
+                            code=code,
+                            file_prefix=file_prefix,
+                            curr_scene=curr_scene,
+                            curr_version=curr_version,
+                            code_dir=code_dir,
+                            media_dir=media_dir,
+                            max_retries=max_retries, # Pass max_retries here if needed in render_scene
+                            use_visual_fix_code=self.use_visual_fix_code,
+                            visual_self_reflection_func=self.code_generator.visual_self_reflection, # Pass visual_self_reflection function
+                            banned_reasonings=self.banned_reasonings, # Pass banned reasonings
+                            scene_trace_id=scene_trace_id,
+                            topic=topic,
+                            session_id=session_id,
+                            priority=-attempt,
+                            version_step=version_step
+                        )
+                        # Visual fixes write further versions of this candidate inside render_scene
+                        for version in range(curr_version + version_step, rendered_version + 1, version_step):
+                            candidate["versions"].append(version)
+                            self.state_store.record_code(topic, curr_scene, version, os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{version}.py"))
+                        curr_version = rendered_version
+                        self.state_store.record_render(topic, curr_scene, curr_version, error_message, started_at=render_started_at)
+                    if error_message is None: # Render success if error_message is None
+                        break
+
+                    if attempt >= max_retries: # Max retries reached
+                        print(f"Max retries reached for scene {curr_scene}, error: {error_message}")
+                        break # Exit retry loop
+
+                    attempt += 1
+                    curr_version += version_step
+                    fix_started_at = time.time()
+                    # if program runs this, it means that the code is not rendered successfully
+                    async with self.scheduler.slot("code"):
+                        code, log = await self.code_generator.fix_code_errors(
+                            implementation_plan=scene_implementation,
+                            code=code,
+                            error=error_message,
+                            scene_trace_id=scene_trace_id,
+                            topic=topic,
+                            scene_number=curr_scene,
+                            session_id=session_id,
+                            rag_queries_cache=rag_queries_cache
+                        )
+
+                    with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_fix_log.txt"), "w") as f:
+                        f.write(log)
+                    with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py"), "w") as f:
+                        f.write(code)
+
+                    print(f"Code saved to {code_dir}/{file_prefix}_scene{curr_scene}_v{curr_version}.py")
+                    self.state_store.record_code(topic, curr_scene, curr_version, os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py"), started_at=fix_started_at)
+
+                candidate["status"] = "succeeded" if error_message is None else "failed"
+                return error_message
+            except asyncio.CancelledError:
+                candidate["status"] = "cancelled"
+                raise
+            except Exception as e:
+                candidate["status"] = "failed"
+                candidate["error"] = str(e)
+                raise
+            finally:
+                candidate["seconds"] = time.monotonic() - start_time
+                candidate["fix_attempts"] = attempt
+                candidate.update(usage.to_dict())
+                if self.scene_library is not None and candidate["status"] in ("succeeded", "failed"):
+                    candidate["library_examples"] = self.code_generator.library_examples.get((topic, curr_scene), 0)
+                    outcome = "with_examples" if candidate["library_examples"] else "without_examples"
+                    self.library_outcomes[outcome].append((attempt, candidate["status"] == "succeeded"))
 
     def run_manim_process(self,
                           topic: str):
@@ -455,9 +751,14 @@ class VideoGenerator:
         Args:
             topic (str): The topic to combine videos for
         """
+        started_at = time.time()
         self.video_renderer.combine_videos(topic)
+        file_prefix = re.sub(r'[^a-z0-9_]+', '_', topic.lower())
+        combined_video_path = os.path.join(self.output_dir, file_prefix, f"{file_prefix}_combined.mp4")
+        if os.path.exists(combined_video_path):
+            self.state_store.record_combined(topic, combined_video_path, started_at=started_at)
 
-    async def _generate_scene_implementation_single(self, topic: str, description: str, scene_outline_i: str, i: int, file_prefix: str, session_id: str, scene_trace_id: str) -> str:
+    async def _generate_scene_implementation_single(self, topic: str, description: str, scene_outline_i: str, i: int, file_prefix: str, session_id: str, scene_trace_id: str, relevant_plugins: Optional[List[str]] = None) -> str:
         """
         Generate detailed implementation plan for a single scene using VideoPlanner.
 
@@ -469,26 +770,32 @@ class VideoGenerator:
             file_prefix (str): Prefix for file naming
             session_id (str): Session identifier for tracking
             scene_trace_id (str): Trace identifier for this scene
+            relevant_plugins (List[str], optional): Plugins relevant to the topic. Defaults to the
+                plugins the planner detected for the topic.
 
         Returns:
             str: Generated implementation plan
         """
-        return await self.planner._generate_scene_implementation_single(topic, description, scene_outline_i, i, file_prefix, session_id, scene_trace_id)
+        return await self.planner._generate_scene_implementation_single(topic, description, scene_outline_i, i, file_prefix, session_id, scene_trace_id, relevant_plugins)
 
-    async def generate_video_pipeline(self, topic: str, description: str, max_retries: int, only_plan: bool = False, specific_scenes: List[int] = None):
+    async def prepare_topic(self, topic: str, description: str, session_id: str,
+                            on_scene: Optional[Callable[[int, str], None]] = None) -> str:
         """
-        Modified pipeline to handle partial scene completions and option to only generate plans for specific scenes.
+        Load the scene outline of a topic, generating it if it does not exist yet.
+
+        When RAG is enabled and the outline already exists, the relevant plugins are detected again
+        so that the later planning and code stages can use them.
 
         Args:
             topic (str): The topic of the video
             description (str): Description of the video content
-            max_retries (int): Maximum number of code fix attempts
-            only_plan (bool, optional): Whether to only generate plans without rendering. Defaults to False.
-            specific_scenes (List[int], optional): List of specific scenes to process. Defaults to None.
+            session_id (str): Session identifier for tracking
+            on_scene (Callable[[int, str], None], optional): Called with each scene's number and outline
+                while a new outline is generated. Defaults to None.
+
+        Returns:
+            str: The scene outline
         """
-        session_id = self._load_or_create_session_id()
-        self._save_topic_session_id(topic, session_id)
-        
         file_prefix = topic.lower()
         file_prefix = re.sub(r'[^a-z0-9_]+', '_', file_prefix)
         
@@ -499,90 +806,172 @@ class VideoGenerator:
                 scene_outline = f.read()
             print(f"Loaded existing scene outline for topic: {topic}")
             if self.planner.use_rag:
-                self.planner.relevant_plugins = self.planner.rag_integration.detect_relevant_plugins(topic, description) or []
-                self.planner.rag_integration.set_relevant_plugins(self.planner.relevant_plugins)
-                print(f"Detected relevant plugins: {self.planner.relevant_plugins}")
+                async with self.scheduler.slot("outline"):
+                    await self.planner.detect_topic_plugins(topic, description)
         else:
             print(f"Generating new scene outline for topic: {topic}")
-            scene_outline = self.planner.generate_scene_outline(topic, description, session_id)
+            started_at = time.time()
+            # The outline has its own pool: with a streamed outline, the plans started by on_scene
+            # take plan slots while the outline is still being generated
+            async with self.scheduler.slot("outline"):
+                scene_outline = await self.planner.generate_scene_outline(topic, description, session_id, on_scene=on_scene)
             os.makedirs(os.path.join(self.output_dir, file_prefix), exist_ok=True)
             with open(scene_outline_path, "w") as f:
                 f.write(scene_outline)
+            num_scenes = len(re.findall(r'<SCENE_(\d+)>[^<]', extract_xml(scene_outline)))
+            self.state_store.record_outline(topic, num_scenes, scene_outline_path, started_at=started_at)
+        return scene_outline
+
+    async def _plan_scene(self, topic: str, description: str, scene_outline_i: str, scene_num: int, session_id: str,
+                          relevant_plugins: Optional[List[str]] = None) -> str:
+        """
+        Generate and record the implementation plan of one scene on the plan pool.
+
+        Args:
+            topic (str): The topic of the video
+            description (str): Description of the video content
+            scene_outline_i (str): Outline of this scene
+            scene_num (int): Scene number
+            session_id (str): Session identifier for tracking
+            relevant_plugins (List[str], optional): Plugins relevant to the topic. Defaults to the
+                plugins the planner detected for the topic.
+
+        Returns:
+            str: The implementation plan
+        """
+        file_prefix = re.sub(r'[^a-z0-9_]+', '_', topic.lower())
+        scene_trace_id = str(uuid.uuid4())
+        started_at = time.time()
+        async with self.scheduler.slot("plan"):
+            implementation_plan = await self._generate_scene_implementation_single(
+                topic, description, scene_outline_i, scene_num, file_prefix, session_id, scene_trace_id, relevant_plugins)
+        plan_path = os.path.join(self.output_dir, file_prefix, f"scene{scene_num}", f"{file_prefix}_scene{scene_num}_implementation_plan.txt")
+        self.state_store.record_plan(topic, scene_num, plan_path, started_at=started_at)
+        if topic in self._topic_started_at and topic not in self.first_plan_seconds:
+            self.first_plan_seconds[topic] = time.monotonic() - self._topic_started_at[topic]
+            print(f"First scene plan of topic '{topic}' ready after {self.first_plan_seconds[topic]:.1f}s")
+        return implementation_plan
+
+    async def run_scene_stages(self, topic: str, description: str, scene_outline: str, scene_num: int, implementation_plan: Optional[str], max_retries: int, session_id: str, generate_plan: bool = True, only_plan: bool = False, only_render: bool = False, relevant_plugins: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Run the plan, code and render stages of one scene, skipping the stages that are already done.
+
+        Args:
+            topic (str): The topic of the video
+            description (str): Description of the video content
+            scene_outline (str): Overall scene outline
+            scene_num (int): Scene number
+            implementation_plan (str, optional): Existing implementation plan, or None if it is missing
+            max_retries (int): Maximum number of code fix attempts
+            session_id (str): Session identifier for tracking
+            generate_plan (bool, optional): Whether to generate a missing implementation plan. Defaults to True.
+            only_plan (bool, optional): Stop after the implementation plan. Defaults to False.
+            only_render (bool, optional): Only process the scene if it has no code yet. Defaults to False.
+            relevant_plugins (List[str], optional): Plugins relevant to the topic, for planning. Defaults to
+                the plugins the planner detected for the topic.
+
+        Returns:
+            Optional[str]: The implementation plan of the scene
+        """
+        file_prefix = topic.lower()
+        file_prefix = re.sub(r'[^a-z0-9_]+', '_', file_prefix)
+
+        # Stage 1: implementation plan, only for missing scenes that were requested
+        if implementation_plan is None and generate_plan:
+            scene_outline_content = extract_xml(scene_outline)
+            scene_match = re.search(f'<SCENE_{scene_num}>(.*?)</SCENE_{scene_num}>', scene_outline_content, re.DOTALL)
+            if scene_match:
+                implementation_plan = await self._plan_scene(topic, description, scene_match.group(1), scene_num, session_id,
+                                                             relevant_plugins)
+
+        if only_plan or implementation_plan is None:
+            return implementation_plan
+
+        # Stages 2-3: code generation and rendering, as soon as this scene's plan exists
+        scene_state = self.state_store.scene_state(topic, scene_num)
+        if only_render:
+            # For only_render mode, only process scenes without code
+            if scene_state["has_code"]:
+                print(f"Scene {scene_num} already has code, skipping")
+                return implementation_plan
+            print(f"Scene {scene_num} has no code, will process")
+        elif scene_state["has_render"]:
+            # For normal mode, process scenes that haven't been successfully rendered
+            return implementation_plan
+
+        scene_trace_id = self._load_or_create_scene_trace_id(file_prefix, scene_num)
+        await self.process_scene(scene_num - 1, scene_outline, implementation_plan, topic, description,
+                                 max_retries, file_prefix, session_id, scene_trace_id)
+        return implementation_plan
+
+    async def generate_video_pipeline(self, topic: str, description: str, max_retries: int, only_plan: bool = False, specific_scenes: List[int] = None, only_render: bool = False, combine: bool = False):
+        """
+        Streaming pipeline that handles partial scene completions and the option to only generate plans for specific scenes.
+
+        Each scene runs plan -> code -> render on its own as soon as its inputs are ready,
+        instead of waiting for every scene of the topic at each step. Work is bounded by the
+        per-stage pools of ``self.scheduler``, which are shared by all topics.
+
+        Args:
+            topic (str): The topic of the video
+            description (str): Description of the video content
+            max_retries (int): Maximum number of code fix attempts
+            only_plan (bool, optional): Whether to only generate plans without rendering. Defaults to False.
+            specific_scenes (List[int], optional): List of specific scenes to process. Defaults to None.
+            only_render (bool, optional): Only process scenes that have no code yet, and never combine. Defaults to False.
+            combine (bool, optional): Whether to combine the scene videos once every scene is done. Defaults to False.
+        """
+        session_id = self._load_or_create_session_id()
+        self._save_topic_session_id(topic, session_id)
+        self._topic_started_at.setdefault(topic, time.monotonic())
+
+        # With a streamed outline, scenes start planning while the rest of the outline is generated
+        early_plans: Dict[int, asyncio.Task] = {}
+
+        def start_scene_plan(scene_num: int, scene_outline_i: str) -> None:
+            if specific_scenes is None or scene_num in specific_scenes:
+                print(f"Scene {scene_num} outline complete, starting its implementation plan")
+                early_plans[scene_num] = asyncio.create_task(self._plan_scene(topic, description, scene_outline_i, scene_num, session_id))
+
+        try:
+            scene_outline = await self.prepare_topic(topic, description, session_id,
+                                                      on_scene=start_scene_plan if self.planner.use_streaming else None)
+        except BaseException:
+            for task in early_plans.values():
+                task.cancel()
+            raise
 
-        # Load or generate implementation plans
+        # Load existing implementation plans
         implementation_plans_dict = self.load_implementation_plans(topic)
         if not implementation_plans_dict:
             scene_outline_content = extract_xml(scene_outline)
             scene_numbers = len(re.findall(r'<SCENE_(\d+)>[^<]', scene_outline_content))
             implementation_plans_dict = {i: None for i in range(1, scene_numbers + 1)}
 
-        # Generate missing implementation plans for specified scenes or all missing scenes
-        missing_scenes = []
-        for scene_num, plan in implementation_plans_dict.items():
-            if plan is None and (specific_scenes is None or scene_num in specific_scenes):
-                missing_scenes.append(scene_num)
-
+        missing_scenes = [scene_num for scene_num, plan in implementation_plans_dict.items()
+                          if plan is None and (specific_scenes is None or scene_num in specific_scenes)]
         if missing_scenes:
             print(f"Generating implementation plans for missing scenes: {missing_scenes}")
-            for scene_num in missing_scenes:
-                scene_outline_content = extract_xml(scene_outline)
-                scene_match = re.search(f'<SCENE_{scene_num}>(.*?)</SCENE_{scene_num}>', scene_outline_content, re.DOTALL)
-                if scene_match:
-                    scene_outline_i = scene_match.group(1)
-                    scene_trace_id = str(uuid.uuid4())
-                    implementation_plan = await self._generate_scene_implementation_single(
-                        topic, description, scene_outline_i, scene_num, file_prefix, session_id, scene_trace_id)
-                    implementation_plans_dict[scene_num] = implementation_plan
+
+        print(f"Starting scene pipeline for topic: {topic}")
+
+        async def scene_stages(scene_num: int, plan: Optional[str]) -> Optional[str]:
+            if scene_num in early_plans:
+                plan = await early_plans[scene_num]
+            return await self.run_scene_stages(topic, description, scene_outline, scene_num, plan, max_retries, session_id,
+                                               generate_plan=scene_num in missing_scenes, only_plan=only_plan, only_render=only_render)
+
+        await asyncio.gather(*[scene_stages(scene_num, plan) for scene_num, plan in sorted(implementation_plans_dict.items())])
 
         if only_plan:
             print(f"Only generating plans - skipping code generation and video rendering for topic: {topic}")
             return
 
-        # Convert dictionary to list maintaining scene order
-        sorted_scene_numbers = sorted(implementation_plans_dict.keys())
-        implementation_plans = [implementation_plans_dict[i] for i in sorted_scene_numbers]
-        
-        # Render scenes
-        print(f"Starting video rendering for topic: {topic}")
-        
-        # Check which scenes need processing
-        scenes_to_process = []
-        for i, implementation_plan in enumerate(implementation_plans):
-            scene_dir = os.path.join(self.output_dir, file_prefix, f"scene{i+1}")
-            code_dir = os.path.join(scene_dir, "code")
-            
-            # Check if scene has any code files
-            has_code = False
-            if os.path.exists(code_dir):
-                if any(f.endswith('.py') for f in os.listdir(code_dir)):
-                    has_code = True
-            
-            # For only_render mode, only process scenes without code
-            if args.only_render:
-                if not has_code:
-                    scenes_to_process.append((i+1, implementation_plan))
-                    print(f"Scene {i+1} has no code, will process")
-                else:
-                    print(f"Scene {i+1} already has code, skipping")
-            # For normal mode, process scenes that haven't been successfully rendered
-            elif not os.path.exists(os.path.join(scene_dir, "succ_rendered.txt")):
-                scenes_to_process.append((i+1, implementation_plan))
-        
-        if not scenes_to_process:
-            print(f"No scenes need processing for topic '{topic}'.")
-        else:
-            print(f"Rendering {len(scenes_to_process)} scenes that need processing...")
-            # Create a list of tuples with scene numbers and plans
-            scene_plans = [(scene_num, plan) for scene_num, plan in scenes_to_process]
-            # Sort by scene number to ensure correct order
-            scene_plans.sort(key=lambda x: x[0])
-            # Extract just the plans in the correct order
-            filtered_implementation_plans = [plan for _, plan in scene_plans]
-            await self.render_video_fix_code(topic, description, scene_outline, filtered_implementation_plans,
-                                           max_retries=max_retries, session_id=session_id)
-        
-        if not args.only_render:  # Skip video combination in only_render mode
+        if not only_render:  # Skip video combination in only_render mode
             print(f"Video rendering completed for topic '{topic}'.")
+            if combine:
+                # Stage 4: combine once every scene of this topic is ready
+                await self.scheduler.run_in_thread("combine", self.combine_videos, topic)
 
     def check_theorem_status(self, theorem: Dict) -> Dict[str, bool]:
         """
@@ -595,74 +984,8 @@ class VideoGenerator:
             Dict[str, bool]: Dictionary containing status information for the theorem
         """
         topic = theorem['theorem']
-        file_prefix = topic.lower()
-        file_prefix = re.sub(r'[^a-z0-9_]+', '_', file_prefix)
-        
-        # Check scene outline
-        scene_outline_path = os.path.join(self.output_dir, file_prefix, f"{file_prefix}_scene_outline.txt")
-        has_scene_outline = os.path.exists(scene_outline_path)
-        
-        # Get number of scenes if outline exists
-        num_scenes = 0
-        if has_scene_outline:
-            with open(scene_outline_path, "r") as f:
-                scene_outline = f.read()
-            scene_outline_content = extract_xml(scene_outline)
-            num_scenes = len(re.findall(r'<SCENE_(\d+)>[^<]', scene_outline_content))
-        
-        # Check implementation plans, code files, and rendered videos
-        implementation_plans = 0
-        code_files = 0
-        rendered_scenes = 0
-        
-        # Track status of individual scenes
-        scene_status = []
-        for i in range(1, num_scenes + 1):
-            scene_dir = os.path.join(self.output_dir, file_prefix, f"scene{i}")
-            
-            # Check implementation plan
-            plan_path = os.path.join(scene_dir, f"{file_prefix}_scene{i}_implementation_plan.txt")
-            has_plan = os.path.exists(plan_path)
-            if has_plan:
-                implementation_plans += 1
-            
-            # Check code files
-            code_dir = os.path.join(scene_dir, "code")
-            has_code = False
-            if os.path.exists(code_dir):
-                if any(f.endswith('.py') for f in os.listdir(code_dir)):
-                    has_code = True
-                    code_files += 1
-            
-            # Check rendered scene video
-            has_render = False
-            if os.path.exists(scene_dir):
-                succ_rendered_path = os.path.join(scene_dir, "succ_rendered.txt")
-                if os.path.exists(succ_rendered_path):
-                    has_render = True
-                    rendered_scenes += 1
-            
-            scene_status.append({
-                'scene_number': i,
-                'has_plan': has_plan,
-                'has_code': has_code,
-                'has_render': has_render
-            })
-
-        # Check combined video
-        combined_video_path = os.path.join(self.output_dir, file_prefix, f"{file_prefix}_combined.mp4")
-        has_combined_video = os.path.exists(combined_video_path)
-        
-        return {
-            'topic': topic,
-            'has_scene_outline': has_scene_outline,
-            'total_scenes': num_scenes,
-            'implementation_plans': implementation_plans,
-            'code_files': code_files,
-            'rendered_scenes': rendered_scenes,
-            'has_combined_video': has_combined_video,
-            'scene_status': scene_status
-        }
+        self.state_store.ensure_topics([topic])
+        return self.state_store.topic_statuses([topic])[0]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Generate Manim videos using AI')
@@ -676,7 +999,13 @@ if __name__ == "__main__":
     parser.add_argument('--only_combine', action='store_true', help='Only combine videos')
     parser.add_argument('--peek_existing_videos', '--peek', action='store_true', help='Peek at existing videos')
     parser.add_argument('--output_dir', type=str, default=Config.OUTPUT_DIR, help='Output directory') # Use Config
+    parser.add_argument('--state_db_path', type=str, default=None, help='SQLite state database (default: state.db in the output directory)')
     parser.add_argument('--theorems_path', type=str, default=None, help='Path to theorems json file')
+    parser.add_argument('--mode', type=str, default='local', choices=['local', 'coordinator', 'worker'],
+                        help='local: run all theorems in this process; coordinator: enqueue the theorems into the job queue; worker: run jobs from the queue')
+    parser.add_argument('--queue_path', type=str, default=None, help='SQLite job queue shared by the coordinator and workers (default: jobs.db in the output directory)')
+    parser.add_argument('--worker_id', type=str, default=None, help='Worker identifier (default: hostname:pid)')
+    parser.add_argument('--lease_seconds', type=float, default=300, help='Job lease duration in seconds; a crashed worker\'s jobs are reclaimed after it expires')
     parser.add_argument('--sample_size', '--sample', type=int, default=None, help='Number of theorems to sample')
     parser.add_argument('--verbose', action='store_true', help='Print verbose output')
     parser.add_argument('--max_retries', type=int, default=5, help='Maximum number of retries for code generation')
@@ -693,11 +1022,70 @@ if __name__ == "__main__":
     parser.add_argument('--context_learning_path', type=str,
                        default=Config.CONTEXT_LEARNING_PATH, # Use Config
                        help='Path to context learning examples')
+    parser.add_argument('--rate_limits', type=str, default=None,
+                        help='JSON file of per-model or per-provider limits, e.g. {"openai": {"rpm": 500, "tpm": 200000}}')
+    parser.add_argument('--llm_cache_path', type=str, default=None,
+                        help='SQLite cache of model responses; repeated temperature-0 calls are answered from it (default: disabled)')
+    parser.add_argument('--llm_cache_max_mb', type=float, default=1024, help='Size limit of the response cache in MiB')
+    parser.add_argument('--llm_cache_sampled', action='store_true',
+                        help='Also cache calls with temperature above 0, so that a rerun replays the same responses')
+    parser.add_argument('--rag_index', type=str, default='chroma', choices=['chroma', 'numpy'],
+                        help='Search the documentation with Chroma queries, or with an in-process NumPy index of each store')
+    parser.add_argument('--rag_ivf_lists', type=int, default=0,
+                        help='Inverted lists of the NumPy indexes; 0 searches every chunk')
+    parser.add_argument('--rag_ivf_probes', type=int, default=8,
+                        help='Inverted lists searched per query by the NumPy indexes')
+    parser.add_argument('--embedding_cache_path', type=str, default=None,
+                        help='Directory of an on-disk cache of RAG query embeddings shared by all runs (default: disabled)')
+    parser.add_argument('--embedding_cache_size', type=int, default=20000,
+                        help='Query embeddings kept per embedding model; the least recently used are replaced')
     parser.add_argument('--use_langfuse', action='store_true',
                        help='Enable Langfuse logging')
     parser.add_argument('--max_scene_concurrency', type=int, default=1, help='Maximum number of scenes to process concurrently')
     parser.add_argument('--max_topic_concurrency', type=int, default=1,
                        help='Maximum number of topics to process concurrently')
+    parser.add_argument('--max_planner_concurrency', type=int, default=None,
+                       help='Size of the scene plan and, separately, the scene outline LLM worker pools (defaults to --max_scene_concurrency)')
+    parser.add_argument('--max_code_concurrency', type=int, default=None,
+                       help='Code generation LLM worker pool size (defaults to --max_scene_concurrency)')
+    parser.add_argument('--max_render_concurrency', type=int, default=None,
+                       help='Manim render worker pool size (defaults to the number of CPU cores)')
+    parser.add_argument('--render_timeout', type=float, default=1800,
+                       help='Seconds before a runaway Manim render is killed')
+    parser.add_argument('--render_cpu_limit', type=int, default=None,
+                       help='Per-render CPU time limit in seconds')
+    parser.add_argument('--render_memory_limit_mb', type=int, default=None,
+                       help='Per-render memory limit in MB')
+    parser.add_argument('--render_backend', type=str, default='subprocess', choices=['subprocess', 'warm'],
+                       help='Launch a fresh manim process per render, or fork from a warm render server')
+    parser.add_argument('--render_server_socket', type=str, default=DEFAULT_SOCKET_PATH,
+                       help='Unix socket of the warm render server')
+    parser.add_argument('--render_server_preload_tts', action='store_true',
+                       help='Also load the Kokoro TTS model in a warm render server started by the pipeline')
+    parser.add_argument('--validate_quality', type=str, default='low', choices=list(RENDER_QUALITY_FLAGS),
+                       help='Render quality used to check each code version for errors')
+    parser.add_argument('--visual_quality', type=str, default='low', choices=[q for q in RENDER_QUALITY_FLAGS if q != 'dry_run'],
+                       help='Render quality used for visual self-reflection')
+    parser.add_argument('--num_code_candidates', type=int, default=1,
+                       help='Code candidates to generate and render in parallel per scene; the first to render wins')
+    parser.add_argument('--candidate_temperatures', type=float, nargs='+', default=None,
+                       help='Sampling temperature of each code candidate (default: spread from 0.2 to 1.0)')
+    parser.add_argument('--stream_code', action='store_true',
+                        help='Stream code completions and stop once the python block is closed or <LGTM> arrives')
+    parser.add_argument('--diff_fixes', action='store_true',
+                        help='Ask for SEARCH/REPLACE edits when fixing code and apply them locally, falling back to a full rewrite')
+    parser.add_argument('--stream_outline', action='store_true',
+                        help='Stream scene outlines and start planning each scene as soon as its outline is complete')
+    parser.add_argument('--scene_library', type=str, default=None,
+                        help='ChromaDB directory of a library of rendered scenes from output_dir, used as code generation examples')
+    parser.add_argument('--scene_library_k', type=int, default=2,
+                        help='Library examples added to each code generation prompt')
+    parser.add_argument('--skip_static_validation', action='store_true',
+                       help='Render every code version without the static pre-render check')
+    parser.add_argument('--final_quality', type=str, default='high', choices=[q for q in RENDER_QUALITY_FLAGS if q != 'dry_run'],
+                       help='Render quality of the final scene videos')
+    parser.add_argument('--max_combine_concurrency', type=int, default=1,
+                       help='ffmpeg combine worker pool size')
     parser.add_argument('--debug_combine_topic', type=str, help='Debug combine videos', default=None)
     parser.add_argument('--only_plan', action='store_true', help='Only generate scene outline and implementation plans')
     parser.add_argument('--check_status', action='store_true', 
@@ -706,6 +1094,14 @@ if __name__ == "__main__":
     parser.add_argument('--scenes', nargs='+', type=int, help='Specific scenes to process (if theorems_path is provided)')
     args = parser.parse_args()
 
+    if args.rate_limits:
+        load_rate_limits(args.rate_limits)
+    if args.llm_cache_path:
+        configure_response_cache(args.llm_cache_path, args.llm_cache_max_mb, PROMPT_TEMPLATE_VERSION, args.llm_cache_sampled)
+    if args.embedding_cache_path:
+        configure_embedding_cache(args.embedding_cache_path, args.embedding_cache_size)
+    configure_vector_stores(args.rag_index, args.rag_ivf_lists, args.rag_ivf_probes)
+
     # Initialize planner model using LiteLLM
     if args.verbose:
         verbose = True
@@ -735,7 +1131,77 @@ if __name__ == "__main__":
     print(f"Planner model: {args.model}, Helper model: {args.helper_model if args.helper_model else args.model}, Scene model: {args.model}") # Print all models
 
 
-    if args.theorems_path:
+    if args.mode == 'worker':
+        # Run jobs from the shared queue; the coordinator enqueued the theorems
+        video_generator = VideoGenerator(
+            planner_model=planner_model,
+            scene_model=scene_model, # Pass scene_model
+            helper_model=helper_model, # Pass helper_model
+            output_dir=args.output_dir,
+            verbose=args.verbose,
+            use_rag=args.use_rag,
+            use_context_learning=args.use_context_learning,
+            context_learning_path=args.context_learning_path,
+            chroma_db_path=args.chroma_db_path,
+            manim_docs_path=args.manim_docs_path,
+            embedding_model=args.embedding_model,
+            use_visual_fix_code=args.use_visual_fix_code,
+            use_langfuse=args.use_langfuse,
+            max_scene_concurrency=args.max_scene_concurrency,
+            max_planner_concurrency=args.max_planner_concurrency,
+            max_code_concurrency=args.max_code_concurrency,
+            max_render_concurrency=args.max_render_concurrency,
+            max_combine_concurrency=args.max_combine_concurrency,
+            render_timeout=args.render_timeout,
+            render_cpu_limit=args.render_cpu_limit,
+            render_memory_limit_mb=args.render_memory_limit_mb,
+            render_backend=args.render_backend,
+            render_server_socket=args.render_server_socket,
+            render_server_preload_tts=args.render_server_preload_tts,
+            validate_quality=args.validate_quality,
+            visual_quality=args.visual_quality,
+            final_quality=args.final_quality,
+            use_static_validation=not args.skip_static_validation,
+            num_code_candidates=args.num_code_candidates,
+            candidate_temperatures=args.candidate_temperatures,
+            state_db_path=args.state_db_path,
+            use_streaming=args.stream_code,
+            use_diff_fixes=args.diff_fixes,
+            scene_library_path=args.scene_library,
+            scene_library_k=args.scene_library_k,
+            use_streaming_outline=args.stream_outline
+        )
+
+        job_worker = JobWorker(
+            video_generator,
+            JobQueue(args.queue_path or os.path.join(args.output_dir, "jobs.db")),
+            worker_id=args.worker_id,
+            lease_seconds=args.lease_seconds,
+            max_jobs=args.max_topic_concurrency,
+            max_retries=args.max_retries,
+            only_plan=args.only_plan,
+            only_render=args.only_render
+        )
+
+        async def main():
+            await job_worker.run()
+            job_worker.queue.print_stats()
+            video_generator.scheduler.print_stats()
+            video_generator.render_executor.print_stats()
+            if video_generator.code_validator is not None:
+                video_generator.code_validator.print_stats()
+            video_generator.code_generator.print_extraction_stats()
+            video_generator.print_scene_library_stats()
+            video_generator.print_first_plan_stats()
+            print_vector_store_stats()
+            print_rate_limit_stats()
+            if get_response_cache() is not None:
+                get_response_cache().print_stats()
+            print_embedding_cache_stats()
+
+        asyncio.run(main())
+
+    elif args.theorems_path:
         # Load the sample theorems
         with open(args.theorems_path, "r") as f:
             theorems = json.load(f)
@@ -745,27 +1211,17 @@ if __name__ == "__main__":
 
         if args.peek_existing_videos:
             print(f"Here's the results of checking whether videos are rendered successfully in {args.output_dir}:")
-            # in output_dir, find all combined.mp4 files and print number of successful rendered videos out of total number of folders
-            successful_rendered_videos = 0
-            total_folders = 0
-            for item in os.listdir(args.output_dir):
-                if os.path.isdir(os.path.join(args.output_dir, item)):
-                    total_folders += 1
-                    if os.path.exists(os.path.join(args.output_dir, item, f"{item}_combined.mp4")):
-                        successful_rendered_videos += 1
-            print(f"Number of successful rendered videos: {successful_rendered_videos}/{total_folders}")
-
-            # also check whether any succ_rendered.txt in scene{i} folder, and then add up the number of successful rendered videos
-            successful_rendered_videos = 0
-            total_scenes = 0
-            for item in os.listdir(args.output_dir):
-                if os.path.isdir(os.path.join(args.output_dir, item)):
-                    for scene_folder in os.listdir(os.path.join(args.output_dir, item)):
-                        if "scene" in scene_folder and os.path.isdir(os.path.join(args.output_dir, item, scene_folder)):
-                            total_scenes += 1
-                            if os.path.exists(os.path.join(args.output_dir, item, scene_folder, "succ_rendered.txt")):
-                                successful_rendered_videos += 1
-            print(f"Number of successful rendered scenes: {successful_rendered_videos}/{total_scenes}")
+            state_store = StateStore(args.state_db_path or os.path.join(args.output_dir, "state.db"), args.output_dir)
+            state_store.backfill_output_dir()
+            summary = state_store.summary()
+            print(f"Number of successful rendered videos: {summary['combined_videos']}/{summary['topics']}")
+            print(f"Number of successful rendered scenes: {summary['rendered_scenes']}/{summary['scenes']}")
+            exit()
+
+        if args.mode == 'coordinator':
+            job_queue = JobQueue(args.queue_path or os.path.join(args.output_dir, "jobs.db"))
+            enqueue_theorems(job_queue, theorems)
+            job_queue.print_stats()
             exit()
 
         video_generator = VideoGenerator(
@@ -782,7 +1238,29 @@ if __name__ == "__main__":
             embedding_model=args.embedding_model,
             use_visual_fix_code=args.use_visual_fix_code,
             use_langfuse=args.use_langfuse,
-            max_scene_concurrency=args.max_scene_concurrency
+            max_scene_concurrency=args.max_scene_concurrency,
+            max_planner_concurrency=args.max_planner_concurrency,
+            max_code_concurrency=args.max_code_concurrency,
+            max_render_concurrency=args.max_render_concurrency,
+            max_combine_concurrency=args.max_combine_concurrency,
+            render_timeout=args.render_timeout,
+            render_cpu_limit=args.render_cpu_limit,
+            render_memory_limit_mb=args.render_memory_limit_mb,
+            render_backend=args.render_backend,
+            render_server_socket=args.render_server_socket,
+            render_server_preload_tts=args.render_server_preload_tts,
+            validate_quality=args.validate_quality,
+            visual_quality=args.visual_quality,
+            final_quality=args.final_quality,
+            use_static_validation=not args.skip_static_validation,
+            num_code_candidates=args.num_code_candidates,
+            candidate_temperatures=args.candidate_temperatures,
+            state_db_path=args.state_db_path,
+            use_streaming=args.stream_code,
+            use_diff_fixes=args.diff_fixes,
+            scene_library_path=args.scene_library,
+            scene_library_k=args.scene_library_k,
+            use_streaming_outline=args.stream_outline
         )
 
         if args.debug_combine_topic is not None:
@@ -823,10 +1301,35 @@ if __name__ == "__main__":
                 embedding_model=args.embedding_model,
                 use_visual_fix_code=args.use_visual_fix_code,
                 use_langfuse=args.use_langfuse,
-                max_scene_concurrency=args.max_scene_concurrency
+                max_scene_concurrency=args.max_scene_concurrency,
+                max_planner_concurrency=args.max_planner_concurrency,
+                max_code_concurrency=args.max_code_concurrency,
+                max_render_concurrency=args.max_render_concurrency,
+                max_combine_concurrency=args.max_combine_concurrency,
+                render_timeout=args.render_timeout,
+                render_cpu_limit=args.render_cpu_limit,
+                render_memory_limit_mb=args.render_memory_limit_mb,
+                render_backend=args.render_backend,
+                render_server_socket=args.render_server_socket,
+                render_server_preload_tts=args.render_server_preload_tts,
+                validate_quality=args.validate_quality,
+                visual_quality=args.visual_quality,
+                final_quality=args.final_quality,
+                use_static_validation=not args.skip_static_validation,
+                num_code_candidates=args.num_code_candidates,
+                candidate_temperatures=args.candidate_temperatures,
+                state_db_path=args.state_db_path,
+                use_streaming=args.stream_code,
+                use_diff_fixes=args.diff_fixes,
+                scene_library_path=args.scene_library,
+                scene_library_k=args.scene_library_k,
+                use_streaming_outline=args.stream_outline
             )
             
-            all_statuses = [video_generator.check_theorem_status(theorem) for theorem in theorems]
+            # One pass over the state database instead of probing the output tree per theorem
+            topics = [theorem['theorem'] for theorem in theorems]
+            video_generator.state_store.ensure_topics(topics)
+            all_statuses = video_generator.state_store.topic_statuses(topics)
             
             # Print combined status table
             print("\nTheorem Status:")
@@ -901,16 +1404,28 @@ if __name__ == "__main__":
                             description, 
                             max_retries=args.max_retries,
                             only_plan=args.only_plan,
-                            specific_scenes=args.scenes
+                            specific_scenes=args.scenes,
+                            only_render=args.only_render,
+                            combine=not args.only_plan and not args.only_render
                         )
-                        if not args.only_plan and not args.only_render:  # Add condition for only_render
-                            video_generator.combine_videos(topic)
 
             async def main():
                 # Use the command-line argument for topic concurrency
                 topic_semaphore = asyncio.Semaphore(args.max_topic_concurrency)
                 tasks = [process_theorem(theorem, topic_semaphore) for theorem in theorems]
                 await asyncio.gather(*tasks)
+                video_generator.scheduler.print_stats()
+                video_generator.render_executor.print_stats()
+                if video_generator.code_validator is not None:
+                    video_generator.code_validator.print_stats()
+                video_generator.code_generator.print_extraction_stats()
+                video_generator.print_scene_library_stats()
+                video_generator.print_first_plan_stats()
+                print_vector_store_stats()
+                print_rate_limit_stats()
+                if get_response_cache() is not None:
+                    get_response_cache().print_stats()
+                print_embedding_cache_stats()
 
             asyncio.run(main())
 
@@ -929,7 +1444,29 @@ if __name__ == "__main__":
             embedding_model=args.embedding_model,
             use_visual_fix_code=args.use_visual_fix_code,
             use_langfuse=args.use_langfuse,
-            max_scene_concurrency=args.max_scene_concurrency
+            max_scene_concurrency=args.max_scene_concurrency,
+            max_planner_concurrency=args.max_planner_concurrency,
+            max_code_concurrency=args.max_code_concurrency,
+            max_render_concurrency=args.max_render_concurrency,
+            max_combine_concurrency=args.max_combine_concurrency,
+            render_timeout=args.render_timeout,
+            render_cpu_limit=args.render_cpu_limit,
+            render_memory_limit_mb=args.render_memory_limit_mb,
+            render_backend=args.render_backend,
+            render_server_socket=args.render_server_socket,
+            render_server_preload_tts=args.render_server_preload_tts,
+            validate_quality=args.validate_quality,
+            visual_quality=args.visual_quality,
+            final_quality=args.final_quality,
+            use_static_validation=not args.skip_static_validation,
+            num_code_candidates=args.num_code_candidates,
+            candidate_temperatures=args.candidate_temperatures,
+            state_db_path=args.state_db_path,
+            use_streaming=args.stream_code,
+            use_diff_fixes=args.diff_fixes,
+            scene_library_path=args.scene_library,
+            scene_library_k=args.scene_library_k,
+            use_streaming_outline=args.stream_outline
         )
         # Process single topic with context
         print(f"Processing topic: {args.topic}")
@@ -946,9 +1483,9 @@ if __name__ == "__main__":
                 args.context,
                 max_retries=args.max_retries,
                 only_plan=args.only_plan,
+                only_render=args.only_render,
+                combine=not args.only_plan and not args.only_render
             ))
-            if not args.only_plan and not args.only_render:
-                video_generator.combine_videos(args.topic)
     else:
         print("Please provide either (--theorems_path) or (--topic and --context)")
         exit()
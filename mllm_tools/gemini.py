@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Callable
 import io
 import os
 import base64
@@ -7,9 +7,13 @@ import mimetypes
 import google.generativeai as genai
 import tempfile
 import time
+import asyncio
 from urllib.parse import urlparse
 import requests
 from io import BytesIO
+from mllm_tools.usage import record_usage, record_stream
+from mllm_tools.rate_limiter import get_rate_limiter, estimate_tokens, fairness_key
+from mllm_tools.response_cache import get_response_cache
 
 class GeminiWrapper:
     """Wrapper for Gemini to support multiple models and logging"""
@@ -32,7 +36,8 @@ class GeminiWrapper:
             verbose: Whether to print verbose output
             use_langfuse: Whether to enable Langfuse logging
         """
-        self.model_name = model_name.split('/')[-1] if '/' in model_name else model_name
+        # The full LiteLLM-style name keys rate limits and cached responses; the API takes the bare name
+        self.model_name = model_name if '/' in model_name else f"gemini/{model_name}"
         self.temperature = temperature
         self.print_cost = print_cost
         self.verbose = verbose
@@ -55,7 +60,7 @@ class GeminiWrapper:
             {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
         ]
         self.model = genai.GenerativeModel(
-            model_name=self.model_name,
+            model_name=self.model_name.split('/')[-1],
             safety_settings=safety_settings,
             generation_config=generation_config,
         )
@@ -122,16 +127,15 @@ class GeminiWrapper:
         """
         return genai.upload_file(file_path, mime_type=mime_type)
 
-    def __call__(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> str:
+    def _prepare_contents(self, messages: List[Dict[str, Any]]) -> List[Any]:
         """
-        Process messages and return completion
+        Convert messages to Gemini contents, uploading media files as needed
         
         Args:
             messages: List of message dictionaries with 'type' and 'content' keys
-            metadata: Optional metadata to pass to Gemini completion
         
         Returns:
-            Generated text response
+            List of Gemini content parts
         """
         contents = []
         for msg in messages:
@@ -163,8 +167,24 @@ class GeminiWrapper:
                 contents.append(uploaded_file)
             else:
                 raise ValueError("Unsupported message type")
+        return contents
 
-        response = self.model.generate_content(contents, request_options={"timeout": 600})
+    def _handle_response(self, response) -> str:
+        """
+        Extract the text of a Gemini response
+        
+        Args:
+            response: Gemini GenerateContentResponse
+        
+        Returns:
+            Generated text response, or the prompt feedback if the response was blocked
+        """
+        usage = getattr(response, "usage_metadata", None)
+        record_usage(
+            prompt_tokens=getattr(usage, "prompt_token_count", 0),
+            completion_tokens=getattr(usage, "candidates_token_count", 0),
+            cached_tokens=getattr(usage, "cached_content_token_count", 0)
+        )
         try:
             return response.text
         except Exception as e:
@@ -172,5 +192,188 @@ class GeminiWrapper:
             print(response.prompt_feedback)
             return str(response.prompt_feedback)
 
+    @staticmethod
+    def _settle(limiter, estimated_tokens: int, response) -> None:
+        """Correct the rate limiter's token estimate with the usage reported by Gemini."""
+        if limiter is not None:
+            usage = getattr(response, "usage_metadata", None)
+            limiter.settle(estimated_tokens, getattr(usage, "total_token_count", 0))
+
+    def _generation_config(self, temperature: Optional[float]) -> Optional[Dict[str, Any]]:
+        """
+        Return per-call generation settings, merged by the SDK with the model's defaults
+        
+        Args:
+            temperature: Optional temperature overriding the wrapper's for this call
+        """
+        return {"temperature": temperature} if temperature is not None else None
+
+    def __call__(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None) -> str:
+        """
+        Process messages and return completion
+        
+        Args:
+            messages: List of message dictionaries with 'type' and 'content' keys
+            metadata: Optional metadata to pass to Gemini completion
+            temperature: Optional temperature overriding the wrapper's for this call
+        
+        Returns:
+            Generated text response
+        """
+        cache = get_response_cache()
+        cache_key = cache.key(self.model_name, self.temperature if temperature is None else temperature, messages) if cache is not None else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+        contents = self._prepare_contents(messages)
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+        if limiter is not None:
+            limiter.acquire(estimated_tokens, fairness_key(metadata))
+        response = self.model.generate_content(
+            contents,
+            generation_config=self._generation_config(temperature),
+            request_options={"timeout": 600}
+        )
+        self._settle(limiter, estimated_tokens, response)
+        content = self._handle_response(response)
+        # Blocked responses carry no candidates and must be asked again next time
+        if cache_key is not None and response.candidates:
+            cache.put(cache_key, self.model_name, content)
+        return content
+
+    async def acall(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None) -> str:
+        """
+        Asynchronously process messages and return completion
+        
+        Media uploads are polled in a worker thread, and generation uses the
+        SDK's native ``generate_content_async``.
+        
+        Args:
+            messages: List of message dictionaries with 'type' and 'content' keys
+            metadata: Optional metadata to pass to Gemini completion
+            temperature: Optional temperature overriding the wrapper's for this call
+        
+        Returns:
+            Generated text response
+        """
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            # Media digests read whole files, so keep them off the event loop
+            cache_key = await asyncio.to_thread(cache.key, self.model_name, self.temperature if temperature is None else temperature, messages)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                return cached
+        contents = await asyncio.to_thread(self._prepare_contents, messages)
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+        if limiter is not None:
+            await limiter.aacquire(estimated_tokens, fairness_key(metadata))
+        response = await self.model.generate_content_async(
+            contents,
+            generation_config=self._generation_config(temperature),
+            request_options={"timeout": 600}
+        )
+        self._settle(limiter, estimated_tokens, response)
+        content = self._handle_response(response)
+        if cache_key is not None and response.candidates:
+            await asyncio.to_thread(cache.put, cache_key, self.model_name, content)
+        return content
+
+    async def astream(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None, stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Asynchronously stream a completion, optionally closing the stream early
+        
+        The text received so far is passed to ``stop_when`` after every chunk; once it
+        returns True the stream is closed. Time to first token and tokens per second
+        are recorded in the active usage trackers.
+        
+        Args:
+            messages: List of message dictionaries with 'type' and 'content' keys
+            metadata: Optional metadata to pass to Gemini completion
+            temperature: Optional temperature overriding the wrapper's for this call
+            stop_when: Optional predicate on the text received so far that ends the stream
+        
+        Returns:
+            Generated text response, up to the chunk where ``stop_when`` matched
+        """
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = await asyncio.to_thread(cache.key, self.model_name, self.temperature if temperature is None else temperature, messages)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                return cached
+        contents = await asyncio.to_thread(self._prepare_contents, messages)
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+        try:
+            if limiter is not None:
+                await limiter.aacquire(estimated_tokens, fairness_key(metadata))
+            started_at = time.monotonic()
+            first_token_at = None
+            text = ""
+            last_chunk = None
+            stopped_early = False
+            response = await self.model.generate_content_async(
+                contents,
+                generation_config=self._generation_config(temperature),
+                request_options={"timeout": 600},
+                stream=True
+            )
+            chunks = response.__aiter__()
+            try:
+                async for chunk in chunks:
+                    last_chunk = chunk
+                    try:
+                        delta = chunk.text
+                    except ValueError:
+                        # Chunks without text parts, e.g. the final one carrying the finish reason
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    text += delta
+                    if stop_when is not None and stop_when(text):
+                        stopped_early = True
+                        break
+            finally:
+                await chunks.aclose()
+                # Closing the SDK's iterator releases the gRPC call, which cancels the request
+                iterator = getattr(response, "_iterator", None)
+                if hasattr(iterator, "aclose"):
+                    await iterator.aclose()
+            finished_at = time.monotonic()
+
+            # Every chunk carries the usage so far, so the last one received covers the whole call
+            usage = getattr(last_chunk, "usage_metadata", None)
+            completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+            record_usage(
+                prompt_tokens=getattr(usage, "prompt_token_count", 0),
+                completion_tokens=completion_tokens,
+                cached_tokens=getattr(usage, "cached_content_token_count", 0)
+            )
+            record_stream(
+                ttft=(first_token_at or finished_at) - started_at,
+                seconds=finished_at - (first_token_at or finished_at),
+                completion_tokens=completion_tokens,
+                stopped_early=stopped_early
+            )
+            if limiter is not None:
+                limiter.settle(estimated_tokens, getattr(usage, "total_token_count", 0))
+            if not text and last_chunk is not None:
+                print(last_chunk.prompt_feedback)
+                return str(last_chunk.prompt_feedback)
+            if cache_key is not None:
+                await asyncio.to_thread(cache.put, cache_key, self.model_name, text)
+            return text
+
+        except Exception as e:
+            print(f"Error in model completion: {e}")
+            return str(e)
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -1,14 +1,19 @@
+import asyncio
 import json
 import re
-from typing import List, Dict, Any, Union, Optional
+import time
+from typing import List, Dict, Any, Union, Optional, Callable
 import io
 import os
 import base64
 from PIL import Image
 import mimetypes
 import litellm
-from litellm import completion, completion_cost
+from litellm import completion, acompletion, completion_cost, stream_chunk_builder
 from dotenv import load_dotenv
+from mllm_tools.usage import record_usage, record_stream
+from mllm_tools.rate_limiter import get_rate_limiter, estimate_tokens, fairness_key
+from mllm_tools.response_cache import get_response_cache
 
 load_dotenv()
 
@@ -80,28 +85,47 @@ class LiteLLMWrapper:
             raise ValueError(f"Unsupported file type: {file_path}")
         return mime_type
 
-    def __call__(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> str:
+    def _supports_cache_control(self, text: str) -> bool:
         """
-        Process messages and return completion
+        Whether to mark a stable prompt prefix with a cache_control hint for this model
+        
+        Anthropic models (directly or on Bedrock) cache up to the marked block. Gemini models
+        get an explicit context cache, which the API only accepts above a minimum size.
+        OpenAI-style providers cache long prefixes automatically and take no hint.
+        
+        Args:
+            text: The prefix to cache
+            
+        Returns:
+            True if the hint should be sent
+        """
+        model = self.model_name.lower()
+        if "anthropic" in model or "claude" in model:
+            return True
+        if "gemini" in model:
+            min_tokens = 32768 if "1.5" in model else 4096
+            return estimate_tokens([{"type": "text", "content": text}]) >= min_tokens
+        return False
+
+    def _format_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Convert messages to the LiteLLM chat format
         
         Args:
             messages: List of message dictionaries with 'type' and 'content' keys
-            metadata: Optional metadata to pass to litellm completion, e.g. for Langfuse tracking
         
         Returns:
-            Generated text response
+            List of LiteLLM formatted messages
         """
-        if metadata is None:
-            print("No metadata provided, using empty metadata")
-            metadata = {}
-        metadata["trace_name"] = f"litellm-completion-{self.model_name}"
-        # Convert messages to LiteLLM format
         formatted_messages = []
         for msg in messages:
             if msg["type"] == "text":
+                block = {"type": "text", "text": msg["content"]}
+                if msg.get("cache") and self._supports_cache_control(msg["content"]):
+                    block["cache_control"] = {"type": "ephemeral"}
                 formatted_messages.append({
                     "role": "user",
-                    "content": [{"type": "text", "text": msg["content"]}]
+                    "content": [block]
                 })
             elif msg["type"] in ["image", "audio", "video"]:
                 # Check if content is a local file path or PIL Image
@@ -150,44 +174,244 @@ class LiteLLMWrapper:
                         raise ValueError("For GPT, only text and image inferencing are supported")
                 else:
                     raise ValueError("Only support Gemini and Gpt for Multimodal capability now")
+        return formatted_messages
+
+    def _completion_kwargs(self, formatted_messages: List[Dict[str, Any]], metadata: Dict[str, Any], temperature: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Build the keyword arguments shared by completion and acompletion
+        
+        Args:
+            formatted_messages: Messages in LiteLLM format
+            metadata: Metadata to pass to litellm, e.g. for Langfuse tracking
+            temperature: Optional temperature overriding the wrapper's for this call
+        
+        Returns:
+            Keyword arguments for litellm completion
+        """
+        kwargs = {
+            "model": self.model_name,
+            "messages": formatted_messages,
+            "metadata": metadata,
+            "max_retries": 99
+        }
+        # if it's openai o series model, set temperature to None and reasoning_effort to "medium"
+        if (re.match(r"^o\d+.*$", self.model_name) or re.match(r"^openai/o.*$", self.model_name)):
+            self.temperature = None
+            self.reasoning_effort = "medium"
+            kwargs["reasoning_effort"] = self.reasoning_effort
+        kwargs["temperature"] = self.temperature if temperature is None or self.temperature is None else temperature
+        return kwargs
 
+    def _handle_response(self, response) -> str:
+        """
+        Track cost and extract the text content of a completion response
+        
+        Args:
+            response: LiteLLM completion response
+        
+        Returns:
+            Generated text response
+        """
         try:
-            # if it's openai o series model, set temperature to None and reasoning_effort to "medium"
-            if (re.match(r"^o\d+.*$", self.model_name) or re.match(r"^openai/o.*$", self.model_name)):
-                self.temperature = None
-                self.reasoning_effort = "medium"
-                response = completion(
-                    model=self.model_name,
-                    messages=formatted_messages,
-                    temperature=self.temperature,
-                    reasoning_effort=self.reasoning_effort,
-                    metadata=metadata,
-                    max_retries=99
-                )
-            else:
-                response = completion(
-                    model=self.model_name,
-                    messages=formatted_messages,
-                    temperature=self.temperature,
-                    metadata=metadata,
-                    max_retries=99
-                )
-            if self.print_cost:
-                # pass your response from completion to completion_cost
-                cost = completion_cost(completion_response=response)
-                formatted_string = f"Cost: ${float(cost):.10f}"
-                # print(formatted_string)
-                self.accumulated_cost += cost
-                print(f"Accumulated Cost: ${self.accumulated_cost:.10f}")
-                
-            content = response.choices[0].message.content
-            if content is None:
-                print(f"Got null response from model. Full response: {response}")
+            # pass your response from completion to completion_cost
+            cost = completion_cost(completion_response=response)
+        except Exception:
+            cost = 0.0
+        usage = getattr(response, "usage", None)
+        # OpenAI reports cache hits in the prompt token details; Anthropic as cache reads
+        cached_tokens = max(
+            getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0,
+            getattr(usage, "cache_read_input_tokens", 0) or 0
+        )
+        record_usage(
+            prompt_tokens=getattr(usage, "prompt_tokens", 0),
+            completion_tokens=getattr(usage, "completion_tokens", 0),
+            cost=cost,
+            cached_tokens=cached_tokens
+        )
+        if self.print_cost:
+            formatted_string = f"Cost: ${float(cost):.10f}"
+            # print(formatted_string)
+            self.accumulated_cost += cost
+            print(f"Accumulated Cost: ${self.accumulated_cost:.10f}")
+            
+        content = response.choices[0].message.content
+        if content is None:
+            print(f"Got null response from model. Full response: {response}")
+        return content
+
+    def __call__(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None) -> str:
+        """
+        Process messages and return completion
+        
+        Args:
+            messages: List of message dictionaries with 'type' and 'content' keys
+            metadata: Optional metadata to pass to litellm completion, e.g. for Langfuse tracking
+            temperature: Optional temperature overriding the wrapper's for this call
+        
+        Returns:
+            Generated text response
+        """
+        if metadata is None:
+            print("No metadata provided, using empty metadata")
+            metadata = {}
+        metadata["trace_name"] = f"litellm-completion-{self.model_name}"
+        formatted_messages = self._format_messages(messages)
+        completion_kwargs = self._completion_kwargs(formatted_messages, metadata, temperature)
+        cache = get_response_cache()
+        cache_key = cache.key(self.model_name, completion_kwargs["temperature"], messages) if cache is not None else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+
+        try:
+            if limiter is not None:
+                limiter.acquire(estimated_tokens, fairness_key(metadata))
+            response = completion(**completion_kwargs)
+            if limiter is not None:
+                limiter.settle(estimated_tokens, getattr(getattr(response, "usage", None), "total_tokens", 0))
+            content = self._handle_response(response)
+            if cache_key is not None and content is not None:
+                cache.put(cache_key, self.model_name, content)
             return content
         
         except Exception as e:
             print(f"Error in model completion: {e}")
             return str(e)
+
+    async def acall(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None) -> str:
+        """
+        Asynchronously process messages and return completion.
+
+        Uses litellm's native ``acompletion`` so that concurrent callers keep
+        several requests in flight instead of blocking the event loop.
+        
+        Args:
+            messages: List of message dictionaries with 'type' and 'content' keys
+            metadata: Optional metadata to pass to litellm completion, e.g. for Langfuse tracking
+            temperature: Optional temperature overriding the wrapper's for this call
+        
+        Returns:
+            Generated text response
+        """
+        if metadata is None:
+            print("No metadata provided, using empty metadata")
+            metadata = {}
+        metadata["trace_name"] = f"litellm-completion-{self.model_name}"
+        formatted_messages = self._format_messages(messages)
+        completion_kwargs = self._completion_kwargs(formatted_messages, metadata, temperature)
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            # Media digests read whole files, so keep them off the event loop
+            cache_key = await asyncio.to_thread(cache.key, self.model_name, completion_kwargs["temperature"], messages)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                return cached
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+
+        try:
+            if limiter is not None:
+                await limiter.aacquire(estimated_tokens, fairness_key(metadata))
+            response = await acompletion(**completion_kwargs)
+            if limiter is not None:
+                limiter.settle(estimated_tokens, getattr(getattr(response, "usage", None), "total_tokens", 0))
+            content = self._handle_response(response)
+            if cache_key is not None and content is not None:
+                await asyncio.to_thread(cache.put, cache_key, self.model_name, content)
+            return content
+
+        except Exception as e:
+            print(f"Error in model completion: {e}")
+            return str(e)
+
+
+    async def astream(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None, stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Asynchronously stream a completion, optionally closing the stream early.
+
+        The text received so far is passed to ``stop_when`` after every chunk; once it
+        returns True the stream is closed, so the remaining output is neither waited for
+        nor generated. Time to first token and tokens per second are recorded in the
+        active usage trackers.
+        
+        Args:
+            messages: List of message dictionaries with 'type' and 'content' keys
+            metadata: Optional metadata to pass to litellm completion, e.g. for Langfuse tracking
+            temperature: Optional temperature overriding the wrapper's for this call
+            stop_when: Optional predicate on the text received so far that ends the stream
+        
+        Returns:
+            Generated text response, up to the chunk where ``stop_when`` matched
+        """
+        if metadata is None:
+            print("No metadata provided, using empty metadata")
+            metadata = {}
+        metadata["trace_name"] = f"litellm-completion-{self.model_name}"
+        formatted_messages = self._format_messages(messages)
+        completion_kwargs = self._completion_kwargs(formatted_messages, metadata, temperature)
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            # Media digests read whole files, so keep them off the event loop
+            cache_key = await asyncio.to_thread(cache.key, self.model_name, completion_kwargs["temperature"], messages)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                return cached
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+
+        try:
+            if limiter is not None:
+                await limiter.aacquire(estimated_tokens, fairness_key(metadata))
+            started_at = time.monotonic()
+            first_token_at = None
+            chunks = []
+            text = ""
+            stopped_early = False
+            stream = await acompletion(**completion_kwargs, stream=True)
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    text += delta
+                    if stop_when is not None and stop_when(text):
+                        stopped_early = True
+                        break
+            finally:
+                if hasattr(stream, "aclose"):
+                    await stream.aclose()
+            finished_at = time.monotonic()
+
+            # Rebuild a response from the chunks; litellm counts the tokens when the provider did not report usage
+            response = stream_chunk_builder(chunks, messages=formatted_messages)
+            usage = getattr(response, "usage", None)
+            if limiter is not None:
+                limiter.settle(estimated_tokens, getattr(usage, "total_tokens", 0))
+            record_stream(
+                ttft=(first_token_at or finished_at) - started_at,
+                seconds=finished_at - (first_token_at or finished_at),
+                completion_tokens=getattr(usage, "completion_tokens", 0),
+                stopped_early=stopped_early
+            )
+            content = self._handle_response(response) if response is not None else text
+            if cache_key is not None and content is not None:
+                await asyncio.to_thread(cache.put, cache_key, self.model_name, content)
+            return content
+
+        except Exception as e:
+            print(f"Error in model completion: {e}")
+            return str(e)
         
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,276 @@
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+# Rough prompt size of media parts; the estimate is corrected with the reported usage after the call
+_MEDIA_TOKENS = 1000
+_CHARS_PER_TOKEN = 4
+# Upper bound on a waiter's sleep, so that waiters notice grants made by other threads
+_MAX_POLL_SECONDS = 1.0
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimate the prompt tokens of wrapper-format messages without calling a tokenizer."""
+    tokens = 0
+    for msg in messages:
+        if msg.get("type") == "text":
+            tokens += len(msg.get("content") or "") // _CHARS_PER_TOKEN + 1
+        else:
+            tokens += _MEDIA_TOKENS
+    return tokens
+
+
+def fairness_key(metadata: Optional[Dict[str, Any]]) -> str:
+    """Return the key callers are queued fairly by: the topic, i.e. the first Langfuse tag."""
+    tags = (metadata or {}).get("tags") or []
+    return str(tags[0]) if tags else "default"
+
+
+class _Waiter:
+    __slots__ = ("key", "tokens", "granted", "enqueued_at")
+
+    def __init__(self, key: str, tokens: int):
+        self.key = key
+        self.tokens = tokens
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+
+class RateLimiter:
+    """Token buckets for the requests and tokens per minute of one model or provider.
+
+    Both buckets hold up to one minute of quota and refill continuously. Callers wait in
+    one queue per fairness key (the topic), and the queues are served round-robin, so a
+    topic with many scenes in flight cannot starve the others. A request larger than the
+    whole token budget is let through once the bucket is full rather than waiting forever.
+
+    Works for threads and asyncio tasks alike: waiters poll the shared state, and
+    whichever waiter runs first grants every request the buckets can afford.
+
+    Args:
+        name (str): Model name or provider prefix the limits apply to
+        requests_per_minute (float, optional): Request limit. Defaults to None (unlimited).
+        tokens_per_minute (float, optional): Prompt plus completion token limit. Defaults to None (unlimited).
+    """
+
+    def __init__(self, name: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._available_requests = float(requests_per_minute or 0)
+        self._available_tokens = float(tokens_per_minute or 0)
+        self._updated_at = time.monotonic()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        # Metrics
+        self.requests = 0
+        self.delayed_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.wait_by_key: Dict[str, float] = {}
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.requests_per_minute:
+            self._available_requests = min(float(self.requests_per_minute),
+                                           self._available_requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._available_tokens = min(float(self.tokens_per_minute),
+                                         self._available_tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant queued requests round-robin while the buckets allow it.
+
+        Must be called with the lock held.
+
+        Returns:
+            Optional[float]: Seconds until the next queued request can be granted, or None if none is queued
+        """
+        self._refill(time.monotonic())
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            needed_tokens = min(waiter.tokens, self.tokens_per_minute or 0)
+            delays = [0.0]
+            if self.requests_per_minute and self._available_requests < 1:
+                delays.append((1 - self._available_requests) * 60 / self.requests_per_minute)
+            if self.tokens_per_minute and self._available_tokens < needed_tokens:
+                delays.append((needed_tokens - self._available_tokens) * 60 / self.tokens_per_minute)
+            if max(delays) > 0:
+                return max(delays)
+
+            if self.requests_per_minute:
+                self._available_requests -= 1
+            if self.tokens_per_minute:
+                self._available_tokens -= waiter.tokens
+            waiter.granted = True
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+        return None
+
+    def _enqueue(self, tokens: int, key: str) -> _Waiter:
+        waiter = _Waiter(key, tokens)
+        with self._lock:
+            self._queues.setdefault(key, deque()).append(waiter)
+        return waiter
+
+    def _poll(self, waiter: _Waiter) -> Optional[float]:
+        """Dispatch, then return None once the waiter is granted or the seconds to sleep otherwise."""
+        with self._lock:
+            delay = self._dispatch()
+            if waiter.granted:
+                return None
+            return min(delay if delay is not None else _MAX_POLL_SECONDS, _MAX_POLL_SECONDS)
+
+    def _withdraw(self, waiter: _Waiter) -> None:
+        """Remove a waiter that gave up, e.g. because its task was cancelled."""
+        with self._lock:
+            queue = self._queues.get(waiter.key)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.key]
+
+    def _record_wait(self, waiter: _Waiter) -> float:
+        waited = time.monotonic() - waiter.enqueued_at
+        with self._lock:
+            self.requests += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.wait_by_key[waiter.key] = self.wait_by_key.get(waiter.key, 0.0) + waited
+            if waited >= 0.01:
+                self.delayed_requests += 1
+        return waited
+
+    def acquire(self, tokens: int = 0, key: str = "default") -> float:
+        """Block the calling thread until a request of the given size fits the limits.
+
+        Args:
+            tokens (int, optional): Estimated prompt tokens of the request. Defaults to 0.
+            key (str, optional): Fairness key, e.g. the topic. Defaults to "default".
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waiter = self._enqueue(tokens, key)
+        try:
+            while (delay := self._poll(waiter)) is not None:
+                time.sleep(delay)
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+        return self._record_wait(waiter)
+
+    async def aacquire(self, tokens: int = 0, key: str = "default") -> float:
+        """Asynchronously wait until a request of the given size fits the limits.
+
+        Args:
+            tokens (int, optional): Estimated prompt tokens of the request. Defaults to 0.
+            key (str, optional): Fairness key, e.g. the topic. Defaults to "default".
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waiter = self._enqueue(tokens, key)
+        try:
+            while (delay := self._poll(waiter)) is not None:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+        return self._record_wait(waiter)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the token bucket once the provider reported the real usage of a request.
+
+        Args:
+            estimated_tokens (int): Tokens charged by acquire()
+            actual_tokens (int): Prompt plus completion tokens reported by the provider
+        """
+        if not self.tokens_per_minute or not actual_tokens:
+            return
+        with self._lock:
+            # The bucket may go negative, delaying later requests until the overrun is paid back
+            self._available_tokens -= actual_tokens - estimated_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the wait-time metrics of this limiter."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "delayed_requests": self.delayed_requests,
+                "total_wait": self.total_wait,
+                "mean_wait": self.total_wait / self.requests if self.requests else 0.0,
+                "max_wait": self.max_wait,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "wait_by_key": dict(self.wait_by_key),
+            }
+
+
+# Process-wide limits and limiters, keyed by model name or provider prefix
+_limits: Dict[str, Dict[str, Optional[float]]] = {}
+_limiters: Dict[str, RateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def configure_rate_limits(limits: Dict[str, Dict[str, Optional[float]]]) -> None:
+    """Set the limits used by every model wrapper in this process.
+
+    Args:
+        limits (Dict[str, Dict[str, Optional[float]]]): Limits keyed by full model name
+            (e.g. "openai/o3-mini") or provider prefix (e.g. "openai"), each a dict with
+            optional "rpm" and "tpm" entries. Models matched by a provider prefix share
+            one limiter, like a provider account quota.
+    """
+    with _registry_lock:
+        _limits.clear()
+        _limits.update(limits)
+        _limiters.clear()
+
+
+def load_rate_limits(path: str) -> None:
+    """Configure the rate limits from a JSON file in the format of configure_rate_limits()."""
+    with open(path, "r") as f:
+        configure_rate_limits(json.load(f))
+
+
+def get_rate_limiter(model_name: str) -> Optional[RateLimiter]:
+    """Return the shared limiter for a model, or None if no limit applies to it.
+
+    Args:
+        model_name (str): Model name as passed to the wrapper
+
+    Returns:
+        Optional[RateLimiter]: Limiter of the model, else of its provider prefix
+    """
+    with _registry_lock:
+        if model_name in _limits:
+            key = model_name
+        elif model_name.split("/")[0] in _limits:
+            key = model_name.split("/")[0]
+        else:
+            return None
+        if key not in _limiters:
+            limits = _limits[key]
+            _limiters[key] = RateLimiter(key, limits.get("rpm"), limits.get("tpm"))
+        return _limiters[key]
+
+
+def print_rate_limit_stats() -> None:
+    """Print the wait-time metrics of every limiter used in this process."""
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    if not limiters:
+        return
+    print("\nRate limiter stats:")
+    for limiter in limiters:
+        stats = limiter.stats()
+        print(f"  {limiter.name:<24} requests={stats['requests']} delayed={stats['delayed_requests']} "
+              f"mean_wait={stats['mean_wait']:.2f}s max_wait={stats['max_wait']:.2f}s total_wait={stats['total_wait']:.1f}s")
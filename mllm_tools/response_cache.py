@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used_at);
+"""
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _normalize_message(msg: Dict[str, Any]) -> Dict[str, str]:
+    """Return a JSON-serializable form of a wrapper-format message; media are replaced by digests."""
+    content = msg["content"]
+    if msg["type"] == "text":
+        # Trailing whitespace and line endings do not change what the model is asked
+        text = "\n".join(line.rstrip() for line in str(content).strip().splitlines())
+        return {"type": "text", "text": text}
+    if isinstance(content, Image.Image):
+        digest = hashlib.sha256(f"{content.mode}:{content.size}".encode())
+        digest.update(content.tobytes())
+        return {"type": msg["type"], "digest": digest.hexdigest()}
+    if isinstance(content, (bytes, bytearray)):
+        return {"type": msg["type"], "digest": hashlib.sha256(content).hexdigest()}
+    if isinstance(content, str) and os.path.isfile(content):
+        return {"type": msg["type"], "digest": _file_digest(content)}
+    # URLs and cloud storage URIs are identified by themselves
+    return {"type": msg["type"], "uri": str(content)}
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of model responses, shared by all wrappers and processes.
+
+    Keys hash the model, temperature, prompt template version and the normalized messages,
+    with media replaced by content digests. Responses are stored zlib-compressed in SQLite,
+    and the least recently used entries are evicted once the cache exceeds max_bytes.
+
+    Only deterministic calls (temperature 0) are cached unless cache_sampled is set. Keys also
+    count how often the same prompt was already sent in this process, so a rerun replays the
+    same sequence of responses while a repeated prompt within a run (a retry after an
+    unparsable answer, a parallel candidate) still reaches the model.
+
+    Args:
+        db_path (str): Path of the SQLite cache database
+        max_bytes (int, optional): Size limit of the stored responses. Defaults to 1 GiB.
+        template_version (str, optional): Version of the prompt templates; bump it to invalidate
+            responses whose prompts were built differently. Defaults to "".
+        cache_sampled (bool, optional): Also cache calls with temperature above 0. Defaults to False.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 1 << 30, template_version: str = "", cache_sampled: bool = False):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.template_version = template_version
+        self.cache_sampled = cache_sampled
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._occurrences: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def key(self, model: str, temperature: Optional[float], messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Return the cache key of a call, or None if the call should not be cached.
+
+        Args:
+            model (str): Model name
+            temperature (float, optional): Effective sampling temperature; None means the provider default
+            messages (List[Dict[str, Any]]): Messages in the wrappers' 'type'/'content' format
+
+        Returns:
+            Optional[str]: Hex digest identifying the call
+        """
+        deterministic = temperature is not None and temperature == 0
+        if not deterministic and not self.cache_sampled:
+            return None
+        payload = json.dumps({
+            "model": model,
+            "temperature": temperature,
+            "template_version": self.template_version,
+            "messages": [_normalize_message(msg) for msg in messages],
+        }, sort_keys=True)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        with self._lock:
+            occurrence = self._occurrences.get(key, 0)
+            self._occurrences[key] = occurrence + 1
+        return hashlib.sha256(f"{key}:{occurrence}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key and mark it recently used, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """Store a response, evicting least recently used entries beyond the size limit."""
+        value = zlib.compress(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, len(value), now, now)
+            )
+            self.writes += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete the least recently used responses until the cache fits max_bytes. Called with the lock held."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used_at"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the size of the cache."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def print_stats(self) -> None:
+        """Print hit/miss counters and the size of the cache."""
+        stats = self.stats()
+        print(f"\nLLM response cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%}), {stats['writes']} writes, {stats['evictions']} evictions, "
+              f"{stats['entries']} entries ({stats['bytes'] / (1 << 20):.1f} MiB)")
+
+
+# Process-wide cache used by the model wrappers; None until configured
+_response_cache: Optional[ResponseCache] = None
+
+
+def configure_response_cache(db_path: Optional[str], max_mb: float = 1024, template_version: str = "",
+                             cache_sampled: bool = False) -> Optional[ResponseCache]:
+    """Enable the response cache for every model wrapper in this process, or disable it with db_path=None.
+
+    Args:
+        db_path (str, optional): Path of the SQLite cache database
+        max_mb (float, optional): Size limit in MiB. Defaults to 1024.
+        template_version (str, optional): Version of the prompt templates. Defaults to "".
+        cache_sampled (bool, optional): Also cache calls with temperature above 0. Defaults to False.
+
+    Returns:
+        Optional[ResponseCache]: The active cache
+    """
+    global _response_cache
+    _response_cache = ResponseCache(db_path, int(max_mb * (1 << 20)), template_version, cache_sampled) if db_path else None
+    return _response_cache
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the active response cache, or None if caching is disabled."""
+    return _response_cache
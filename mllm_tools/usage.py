@@ -0,0 +1,100 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Trackers active in the current task; asyncio tasks and to_thread calls inherit them
+_active_trackers = contextvars.ContextVar("usage_trackers", default=())
+
+
+class UsageTracker:
+    """Accumulates LLM calls, tokens and cost recorded while it is active.
+
+    Trackers nest: a call made inside several ``track_usage`` blocks is recorded
+    by all of them, e.g. by a per-candidate and a per-scene tracker.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.cost = 0.0
+        self.streamed_calls = 0
+        self.early_stops = 0
+        self.total_ttft = 0.0
+        self.stream_seconds = 0.0
+        self.streamed_tokens = 0
+
+    def add(self, prompt_tokens: int = 0, completion_tokens: int = 0, cost: float = 0.0, cached_tokens: int = 0) -> None:
+        """Record one model call."""
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.cached_prompt_tokens += cached_tokens or 0
+        self.cost += cost or 0.0
+
+    def add_stream(self, ttft: float, seconds: float, completion_tokens: int, stopped_early: bool) -> None:
+        """Record the timing of one streamed model call."""
+        self.streamed_calls += 1
+        self.early_stops += int(stopped_early)
+        self.total_ttft += ttft
+        self.stream_seconds += seconds
+        self.streamed_tokens += completion_tokens or 0
+
+    def to_dict(self) -> Dict[str, float]:
+        """Return the counters as a JSON-serializable dict."""
+        return {
+            "llm_calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cost": self.cost,
+            "streamed_calls": self.streamed_calls,
+            "early_stops": self.early_stops,
+            "mean_ttft_seconds": self.total_ttft / self.streamed_calls if self.streamed_calls else None,
+            "stream_tokens_per_second": self.streamed_tokens / self.stream_seconds if self.stream_seconds else None,
+        }
+
+
+@contextmanager
+def track_usage(tracker: Optional[UsageTracker] = None):
+    """Record the usage of every model call made inside the block.
+
+    Args:
+        tracker (UsageTracker, optional): Tracker to record into. Defaults to a new one.
+
+    Yields:
+        UsageTracker: The active tracker
+    """
+    tracker = tracker if tracker is not None else UsageTracker()
+    token = _active_trackers.set(_active_trackers.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _active_trackers.reset(token)
+
+
+def record_usage(prompt_tokens: int = 0, completion_tokens: int = 0, cost: float = 0.0, cached_tokens: int = 0) -> None:
+    """Record a model call in all trackers active in the current context.
+
+    Args:
+        prompt_tokens (int, optional): Prompt tokens, including cached ones. Defaults to 0.
+        completion_tokens (int, optional): Completion tokens. Defaults to 0.
+        cost (float, optional): Cost in dollars. Defaults to 0.0.
+        cached_tokens (int, optional): Prompt tokens served from the provider's prompt cache. Defaults to 0.
+    """
+    for tracker in _active_trackers.get():
+        tracker.add(prompt_tokens, completion_tokens, cost, cached_tokens)
+
+
+def record_stream(ttft: float, seconds: float, completion_tokens: int, stopped_early: bool = False) -> None:
+    """Record the timing of a streamed model call in all trackers active in the current context.
+
+    Args:
+        ttft (float): Seconds from sending the request to the first generated token
+        seconds (float): Seconds from the first to the last received token
+        completion_tokens (int): Tokens received
+        stopped_early (bool, optional): Whether the caller closed the stream before the model finished. Defaults to False.
+    """
+    for tracker in _active_trackers.get():
+        tracker.add_stream(ttft, seconds, completion_tokens, stopped_early)
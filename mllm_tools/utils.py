@@ -28,6 +28,24 @@ def _prepare_text_inputs(texts: List[str]) -> List[Dict[str, str]]:
         })
     return inputs
 
+def _prepare_cached_text_inputs(prefix: Union[str, List[str]], texts: Union[str, List[str]]) -> List[Dict[str, Any]]:
+    """
+    Converts a stable prompt prefix and the variable text into the input format for the Agent model.
+
+    The prefix goes first and is marked with ``"cache": True``, so that wrappers can ask the
+    provider to cache it; it must be byte-identical across calls for the cache to hit.
+
+    Args:
+        prefix (Union[str, List[str]]): Static context shared by many calls, e.g. reference material.
+        texts (Union[str, List[str]]): Text string(s) that change from call to call.
+
+    Returns:
+        List[Dict[str, Any]]: A list of dictionaries formatted for the Agent model.
+    """
+    if isinstance(prefix, list):
+        prefix = "\n".join(prefix)
+    return [{"type": "text", "content": prefix, "cache": True}] + _prepare_text_inputs(texts)
+
 def _prepare_text_image_inputs(texts: Union[str, List[str]], images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> List[Dict[str, str]]:
     """
     Converts text strings and images into the input format for the Agent model.
@@ -148,9 +166,9 @@ def _upload_to_gemini(input, mime_type=None):
 def get_media_wrapper(model_name: str) -> Optional[Union[GeminiWrapper, VertexAIWrapper]]:
     """Get appropriate wrapper for media handling based on model name"""
     if model_name.startswith('gemini/'):
-        return GeminiWrapper(model_name=model_name.split('/')[-1])
+        return GeminiWrapper(model_name=model_name)
     elif model_name.startswith('vertex_ai/'):
-        return VertexAIWrapper(model_name=model_name.split('/')[-1])
+        return VertexAIWrapper(model_name=model_name)
     return None
 
 def prepare_media_messages(prompt: str, media_path: Union[str, Image.Image], model_name: str) -> List[Dict[str, Any]]:
@@ -1,9 +1,13 @@
+import asyncio
 import os
 from typing import List, Dict, Any, Optional
 import vertexai
 from vertexai.generative_models import GenerativeModel, Part
 from google.auth import default
 from google.auth.transport import requests
+from mllm_tools.usage import record_usage
+from mllm_tools.rate_limiter import get_rate_limiter, estimate_tokens, fairness_key
+from mllm_tools.response_cache import get_response_cache
 
 
 # TODO: check if this is the correct way to use Vertex AI
@@ -22,13 +26,14 @@ class VertexAIWrapper:
         """Initialize the Vertex AI wrapper.
         
         Args:
-            model_name: Name of the model to use (e.g. "gemini-1.5-pro")
+            model_name: Name of the model to use (e.g. "vertex_ai/gemini-1.5-pro" or "gemini-1.5-pro")
             temperature: Temperature for generation between 0 and 1
             print_cost: Whether to print the cost of the completion
             verbose: Whether to print verbose output
             use_langfuse: Whether to enable Langfuse logging
         """
-        self.model_name = model_name
+        # The full LiteLLM-style name keys rate limits and cached responses; the API takes the bare name
+        self.model_name = model_name if '/' in model_name else f"vertex_ai/{model_name}"
         self.temperature = temperature
         self.print_cost = print_cost
         self.verbose = verbose
@@ -40,20 +45,16 @@ class VertexAIWrapper:
             raise ValueError("No GOOGLE_CLOUD_PROJECT found in environment variables")
             
         vertexai.init(project=project_id, location=location)
-        self.model = GenerativeModel(model_name)
+        self.model = GenerativeModel(self.model_name.split('/')[-1])
         
-    def __call__(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Process messages and return completion.
+    def _prepare_parts(self, messages: List[Dict[str, Any]]) -> List[Part]:
+        """Convert messages to Vertex AI content parts.
         
         Args:
             messages: List of message dictionaries containing type and content
-            metadata: Optional metadata dictionary to pass to the model
             
         Returns:
-            Generated text response from the model
-            
-        Raises:
-            ValueError: If message type is not supported
+            List of Vertex AI Part objects
         """
         parts = []
         
@@ -74,13 +75,93 @@ class VertexAIWrapper:
                         msg["content"],
                         mime_type=mime_type
                     ))
-                    
+        return parts
+
+    def _generation_config(self, temperature: Optional[float] = None) -> Dict[str, Any]:
+        """Return the generation config shared by sync and async calls."""
+        return {
+            "temperature": self.temperature if temperature is None else temperature,
+            "top_p": 0.95,
+        }
+
+    @staticmethod
+    def _record_usage(response) -> None:
+        """Record the token counts of a response in the active usage trackers."""
+        usage = getattr(response, "usage_metadata", None)
+        record_usage(
+            prompt_tokens=getattr(usage, "prompt_token_count", 0),
+            completion_tokens=getattr(usage, "candidates_token_count", 0),
+            cached_tokens=getattr(usage, "cached_content_token_count", 0)
+        )
+
+    def __call__(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None) -> str:
+        """Process messages and return completion.
+        
+        Args:
+            messages: List of message dictionaries containing type and content
+            metadata: Optional metadata dictionary to pass to the model
+            temperature: Optional temperature overriding the wrapper's for this call
+            
+        Returns:
+            Generated text response from the model
+            
+        Raises:
+            ValueError: If message type is not supported
+        """
+        cache = get_response_cache()
+        cache_key = cache.key(self.model_name, self._generation_config(temperature)["temperature"], messages) if cache is not None else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+        if limiter is not None:
+            limiter.acquire(estimated_tokens, fairness_key(metadata))
         response = self.model.generate_content(
-            parts,
-            generation_config={
-                "temperature": self.temperature,
-                "top_p": 0.95,
-            }
+            self._prepare_parts(messages),
+            generation_config=self._generation_config(temperature)
+        )
+        self._record_usage(response)
+        if limiter is not None:
+            limiter.settle(estimated_tokens, getattr(getattr(response, "usage_metadata", None), "total_token_count", 0))
+        if cache_key is not None:
+            cache.put(cache_key, self.model_name, response.text)
+        
+        return response.text
+
+    async def acall(self, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None, temperature: Optional[float] = None) -> str:
+        """Asynchronously process messages and return completion.
+        
+        Args:
+            messages: List of message dictionaries containing type and content
+            metadata: Optional metadata dictionary to pass to the model
+            temperature: Optional temperature overriding the wrapper's for this call
+            
+        Returns:
+            Generated text response from the model
+        """
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            # Media digests read whole files, so keep them off the event loop
+            cache_key = await asyncio.to_thread(cache.key, self.model_name, self._generation_config(temperature)["temperature"], messages)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                return cached
+        limiter = get_rate_limiter(self.model_name)
+        estimated_tokens = estimate_tokens(messages)
+        if limiter is not None:
+            await limiter.aacquire(estimated_tokens, fairness_key(metadata))
+        response = await self.model.generate_content_async(
+            self._prepare_parts(messages),
+            generation_config=self._generation_config(temperature)
         )
+        self._record_usage(response)
+        if limiter is not None:
+            limiter.settle(estimated_tokens, getattr(getattr(response, "usage_metadata", None), "total_token_count", 0))
+        if cache_key is not None:
+            await asyncio.to_thread(cache.put, cache_key, self.model_name, response.text)
         
-        return response.text
\ No newline at end of file
+        return response.text
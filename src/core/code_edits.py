@@ -0,0 +1,161 @@
+import re
+import ast
+import difflib
+from typing import List, Optional, Tuple
+
+# <<<<<<< SEARCH / ======= / >>>>>>> REPLACE blocks, as requested by the diff fix prompts
+_SEARCH_REPLACE_PATTERN = re.compile(
+    r"^[ \t]*<{5,9}[ \t]*SEARCH[ \t]*\r?\n(.*?)^[ \t]*={5,9}[ \t]*\r?\n(.*?)^[ \t]*>{5,9}[ \t]*REPLACE[ \t]*$",
+    re.DOTALL | re.MULTILINE
+)
+_HUNK_HEADER_PATTERN = re.compile(r"^@@ .* @@")
+
+
+def parse_search_replace_blocks(text: str) -> List[Tuple[str, str]]:
+    """Return the (search, replace) pairs of the SEARCH/REPLACE blocks in a response."""
+    return [(search, replace) for search, replace in _SEARCH_REPLACE_PATTERN.findall(text)]
+
+
+def parse_unified_diff(text: str) -> List[Tuple[str, str]]:
+    """Convert the hunks of a unified diff in a response into (search, replace) pairs.
+
+    Line numbers in the hunk headers are ignored; the context and removed lines locate the hunk.
+    """
+    edits = []
+    search, replace = None, None
+    for line in text.splitlines():
+        if _HUNK_HEADER_PATTERN.match(line):
+            if search:
+                edits.append(("".join(search), "".join(replace)))
+            search, replace = [], []
+        elif search is None or line.startswith(("---", "+++")):
+            continue
+        elif line.startswith("```"):
+            if search:
+                edits.append(("".join(search), "".join(replace)))
+            search, replace = None, None
+        elif line.startswith("-"):
+            search.append(line[1:] + "\n")
+        elif line.startswith("+"):
+            replace.append(line[1:] + "\n")
+        elif line.startswith(" ") or not line:
+            search.append(line[1:] + "\n")
+            replace.append(line[1:] + "\n")
+    if search:
+        edits.append(("".join(search), "".join(replace)))
+    return edits
+
+
+def _locate(lines: List[str], search_lines: List[str]) -> Optional[Tuple[int, str]]:
+    """Find the search lines in the code, tolerating trailing whitespace and a shifted indentation.
+
+    Returns:
+        Optional[Tuple[int, str]]: Index of the first matching line and the indentation to add
+            to the replacement, or None unless there is exactly one match
+    """
+    n = len(search_lines)
+    stripped = [line.rstrip() for line in search_lines]
+    matches = [i for i in range(len(lines) - n + 1) if [line.rstrip() for line in lines[i:i + n]] == stripped]
+    if len(matches) == 1:
+        return matches[0], ""
+    if matches:
+        return None
+
+    # The model re-indented the snippet, e.g. dropped the method's indentation
+    dedented = [line.strip() for line in search_lines]
+    matches = [i for i in range(len(lines) - n + 1) if [line.strip() for line in lines[i:i + n]] == dedented]
+    if len(matches) != 1:
+        return None
+    first = next(j for j, line in enumerate(search_lines) if line.strip())
+    actual = lines[matches[0] + first]
+    expected = search_lines[first]
+    actual_indent = actual[:len(actual) - len(actual.lstrip())]
+    expected_indent = expected[:len(expected) - len(expected.lstrip())]
+    if not actual_indent.endswith(expected_indent):
+        return None
+    return matches[0], actual_indent[:len(actual_indent) - len(expected_indent)]
+
+
+def apply_edit(code: str, search: str, replace: str) -> Optional[str]:
+    """Apply one search/replace edit, or return None if the search text is not found exactly once.
+
+    Args:
+        code (str): Current code
+        search (str): Lines to replace, copied from the current code
+        replace (str): Replacement lines
+
+    Returns:
+        Optional[str]: The edited code
+    """
+    if not search.strip():
+        return None
+    lines = code.splitlines(keepends=True)
+    search_lines = search.strip("\n").splitlines()
+    located = _locate(lines, search_lines)
+    if located is None:
+        return None
+    start, indent = located
+    replacement = [(indent + line if line.strip() else line) + "\n" for line in replace.strip("\n").splitlines()]
+    return "".join(lines[:start] + replacement + lines[start + len(search_lines):])
+
+
+def apply_code_edits(code: str, response: str) -> Optional[str]:
+    """Apply the SEARCH/REPLACE blocks, or else the unified diff, of a model response to the code.
+
+    Edits are applied in order, each to the result of the previous one. The result must
+    parse with ast.parse, so that a half-applied or broken edit never reaches the renderer.
+
+    Args:
+        code (str): Code the model was asked to fix
+        response (str): Model response holding the edits
+
+    Returns:
+        Optional[str]: The edited code, or None if the response holds no edits, an edit does
+            not apply, or the edited code does not parse
+    """
+    edits = parse_search_replace_blocks(response) or parse_unified_diff(response)
+    if not edits:
+        return None
+    for search, replace in edits:
+        code = apply_edit(code, search, replace)
+        if code is None:
+            return None
+    try:
+        ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    return code
+
+
+def make_search_replace_blocks(old: str, new: str, context: int = 1) -> str:
+    """Write the minimal SEARCH/REPLACE blocks turning one version of the code into another.
+
+    Used to measure the size of diff-based fixes against full rewrites.
+
+    Args:
+        old (str): Code before the fix
+        new (str): Code after the fix
+        context (int, optional): Unchanged lines kept around each change to make it unique. Defaults to 1.
+
+    Returns:
+        str: The blocks, in the format requested by the diff fix prompts
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    blocks = []
+    for group in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_grouped_opcodes(context):
+        old_start, old_end = group[0][1], group[-1][2]
+        new_start, new_end = group[0][3], group[-1][4]
+        search = "".join(old_lines[old_start:old_end])
+        # Widen the block until the search text is unique
+        while old.count(search) != 1 and (old_start > 0 or old_end < len(old_lines)):
+            old_start, new_start = max(0, old_start - 1), max(0, new_start - 1)
+            old_end, new_end = min(len(old_lines), old_end + 1), min(len(new_lines), new_end + 1)
+            search = "".join(old_lines[old_start:old_end])
+        replace = "".join(new_lines[new_start:new_end])
+        blocks.append(f"<<<<<<< SEARCH\n{_terminated(search)}=======\n{_terminated(replace)}>>>>>>> REPLACE\n")
+    return "".join(blocks)
+
+
+def _terminated(text: str) -> str:
+    return text if not text or text.endswith("\n") else text + "\n"
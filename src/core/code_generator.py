@@ -1,12 +1,14 @@
 import os
 import re
+import ast
 import json
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Optional, Tuple
 from PIL import Image
 import glob
+import asyncio
 
 from src.utils.utils import extract_json
-from mllm_tools.utils import _prepare_text_inputs, _extract_code, _prepare_text_image_inputs
+from mllm_tools.utils import _prepare_text_inputs, _extract_code, _prepare_text_image_inputs, _prepare_cached_text_inputs
 from mllm_tools.gemini import GeminiWrapper
 from mllm_tools.vertex_ai import VertexAIWrapper
 from task_generator import (
@@ -16,7 +18,8 @@ from task_generator import (
     get_banned_reasonings,
     get_prompt_rag_query_generation_fix_error,
     get_prompt_context_learning_code,
-    get_prompt_rag_query_generation_code
+    get_prompt_rag_query_generation_code,
+    get_prompt_code_edits
 )
 from task_generator.prompts_raw import (
     _code_font_size,
@@ -24,12 +27,74 @@ from task_generator.prompts_raw import (
     _code_limit,
     _prompt_manim_cheatsheet
 )
-from src.rag.vector_store import RAGVectorStore # Import RAGVectorStore
+from src.rag.vector_store import get_vector_store
+from src.rag.scene_library import SceneLibrary
+from src.core.code_edits import apply_code_edits
+from src.core.error_distiller import distill_error, error_cache_key
+
+def _code_block_complete(text: str) -> bool:
+    """Return whether a partial response already holds a closed python code block or the <LGTM> marker."""
+    if "<LGTM>" in text:
+        return True
+    start = text.find("```python")
+    return start != -1 and text.find("\n```", start + len("```python")) != -1
+
+def _edits_complete(text: str) -> bool:
+    """Return whether a partial response already holds all of its SEARCH/REPLACE edits or the <LGTM> marker."""
+    return "<LGTM>" in text or "</CODE_EDITS>" in text or "</code>" in text
+
+# Opening fence with an optional python tag (```python, ```py, ```Python3, ...) up to the closing fence or the end
+_FENCE_PATTERN = re.compile(r"```[ \t]*(python3?|py)?[ \t]*\r?\n(.*?)(\n[ \t]*```|\Z)", re.DOTALL | re.IGNORECASE)
+
+# Tiers of _extract_code_with_retries, from the strict pattern to asking the model again
+EXTRACTION_TIERS = ("pattern", "fence", "unterminated", "bare", "model", "failed")
+
+def _parses(code: str) -> bool:
+    try:
+        ast.parse(code)
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+def extract_python_code(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """Find parseable python code in a response that the strict fence pattern missed.
+
+    Handles fences tagged ```py or ```Python or not at all, several blocks, an unterminated
+    last block, and responses that are bare code. Candidates must pass ast.parse.
+
+    Args:
+        text (str): Model response
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The code and the tier that found it, or (None, None)
+    """
+    blocks = []
+    unterminated = False
+    for match in _FENCE_PATTERN.finditer(text):
+        if match.group(2).strip():
+            blocks.append(match.group(2))
+            unterminated = unterminated or not match.group(3)
+    if blocks:
+        tier = "unterminated" if unterminated else "fence"
+        parsed = [block for block in blocks if _parses(block)]
+        # Prefer the fullest block that defines a class, i.e. the scene
+        scenes = [block for block in parsed if re.search(r"^class\s+\w+", block, re.MULTILINE)]
+        if scenes:
+            return max(scenes, key=len), tier
+        # Imports and scene split over several blocks
+        if len(blocks) > 1 and _parses("\n\n".join(blocks)):
+            return "\n\n".join(blocks), tier
+        if parsed:
+            return max(parsed, key=len), tier
+    bare = text.strip().strip("`")
+    if bare and re.search(r"^(from|import|class)\s", bare, re.MULTILINE) and _parses(bare):
+        return bare, "bare"
+    return None, None
 
 class CodeGenerator:
     """A class for generating and managing Manim code."""
 
-    def __init__(self, scene_model, helper_model, output_dir="output", print_response=False, use_rag=False, use_context_learning=False, context_learning_path="data/context_learning", chroma_db_path="rag/chroma_db", manim_docs_path="rag/manim_docs", embedding_model="azure/text-embedding-3-large", use_visual_fix_code=False, use_langfuse=True, session_id=None):
+    def __init__(self, scene_model, helper_model, output_dir="output", print_response=False, use_rag=False, use_context_learning=False, context_learning_path="data/context_learning", chroma_db_path="rag/chroma_db", manim_docs_path="rag/manim_docs", embedding_model="azure/text-embedding-3-large", use_visual_fix_code=False, use_langfuse=True, session_id=None, use_streaming=False, use_diff_fixes=False, scene_library=None, scene_library_k=2):
         """Initialize the CodeGenerator.
 
         Args:
@@ -46,6 +111,12 @@ class CodeGenerator:
             use_visual_fix_code (bool, optional): Whether to use visual code fixing. Defaults to False.
             use_langfuse (bool, optional): Whether to use Langfuse logging. Defaults to True.
             session_id (str, optional): Session identifier. Defaults to None.
+            use_streaming (bool, optional): Whether to stream completions and stop once the code block is closed. Defaults to False.
+            use_diff_fixes (bool, optional): Whether fixes ask for SEARCH/REPLACE edits instead of the full code,
+                falling back to a full rewrite when the edits do not apply. Defaults to False.
+            scene_library (SceneLibrary, optional): Library of verified scenes from other topics added to code
+                generation prompts as examples. Defaults to None.
+            scene_library_k (int, optional): Number of library examples per scene. Defaults to 2.
         """
         self.scene_model = scene_model
         self.helper_model = helper_model
@@ -60,18 +131,36 @@ class CodeGenerator:
         self.use_visual_fix_code = use_visual_fix_code
         self.banned_reasonings = get_banned_reasonings()
         self.session_id = session_id # Use session_id passed from VideoGenerator
+        self.use_streaming = use_streaming
+        self.extraction_stats = {tier: 0 for tier in EXTRACTION_TIERS}
+        self.use_diff_fixes = use_diff_fixes
+        self.diff_fix_stats = {"applied": 0, "fallback": 0}
+        # Estimated tokens of the errors sent to fix prompts, before and after distillation
+        self.error_distill_stats = {"fixes": 0, "raw_tokens": 0, "distilled_tokens": 0}
+        self.scene_library = scene_library
+        self.scene_library_k = scene_library_k
+        # Number of library examples each (topic, scene number) was generated with
+        self.library_examples: Dict[Tuple[str, int], int] = {}
 
         if use_rag:
-            self.vector_store = RAGVectorStore(
+            # Shared with the planner and every other topic of this process
+            self.vector_store = get_vector_store(
                 chroma_db_path=chroma_db_path,
                 manim_docs_path=manim_docs_path,
                 embedding_model=embedding_model,
-                session_id=self.session_id,
                 use_langfuse=use_langfuse
             )
         else:
             self.vector_store = None
 
+    def accepts_video(self) -> bool:
+        """Whether visual self-reflection sends the scene model the rendered video rather than a snapshot.
+
+        Returns:
+            bool: True for native Gemini and Vertex AI scene models
+        """
+        return isinstance(self.scene_model, (GeminiWrapper, VertexAIWrapper))
+
     def _load_context_examples(self) -> str:
         """Load all context learning examples from the specified directory.
 
@@ -91,7 +180,7 @@ class CodeGenerator:
             return formatted_examples
         return None
 
-    def _generate_rag_queries_code(self, implementation: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
+    async def _generate_rag_queries_code(self, implementation: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
         """Generate RAG queries from the implementation plan.
 
         Args:
@@ -126,7 +215,7 @@ class CodeGenerator:
         else:
             prompt = get_prompt_rag_query_generation_code(implementation, "No plugins are relevant.")
 
-        queries = self.helper_model(
+        queries = await self.helper_model.acall(
             _prepare_text_inputs(prompt),
             metadata={"generation_name": "rag_query_generation", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
         )
@@ -148,11 +237,11 @@ class CodeGenerator:
 
         return queries
 
-    def _generate_rag_queries_error_fix(self, error: str, code: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
+    async def _generate_rag_queries_error_fix(self, error: str, code: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
         """Generate RAG queries for fixing code errors.
 
         Args:
-            error (str): The error message to fix
+            error (str): The distilled error message to fix; it also keys the query cache
             code (str): The code containing the error
             scene_trace_id (str, optional): Trace ID for the scene. Defaults to None.
             topic (str, optional): Topic of the scene. Defaults to None.
@@ -163,13 +252,14 @@ class CodeGenerator:
         Returns:
             List[str]: List of generated RAG queries for error fixing
         """
-        # Create a cache key for this scene and error
-        cache_key = f"{topic}_scene{scene_number}_error_fix"
+        # Create a cache key for this scene and error; the same error in a later version reuses the queries
+        error_key = error_cache_key(error)
+        cache_key = f"{topic}_scene{scene_number}_error_fix_{error_key}"
 
         # Check if we already have a cache file for error fix queries
         cache_dir = os.path.join(self.output_dir, re.sub(r'[^a-z0-9_]+', '_', topic.lower()), f"scene{scene_number}", "rag_cache")
         os.makedirs(cache_dir, exist_ok=True)
-        cache_file = os.path.join(cache_dir, "rag_queries_error_fix.json")
+        cache_file = os.path.join(cache_dir, f"rag_queries_error_fix_{error_key}.json")
 
         # If cache file exists, load and return cached queries
         if os.path.exists(cache_file):
@@ -185,7 +275,7 @@ class CodeGenerator:
             relevant_plugins=", ".join(relevant_plugins) if relevant_plugins else "No plugins are relevant."
         )
 
-        queries = self.helper_model(
+        queries = await self.helper_model.acall(
             _prepare_text_inputs(prompt),
             metadata={"generation_name": "rag-query-generation-fix-error", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
         )
@@ -205,7 +295,24 @@ class CodeGenerator:
 
         return queries
 
-    def _extract_code_with_retries(self, response_text: str, pattern: str, generation_name: str = None, trace_id: str = None, session_id: str = None, max_retries: int = 10) -> str:
+    async def _generate_code_response(self, messages: List[Dict], metadata: Dict, temperature: float = None, stop_when=_code_block_complete) -> str:
+        """Call the scene model for code, streaming and stopping at the end of the code block when enabled.
+
+        Args:
+            messages (List[Dict]): Model input messages
+            metadata (Dict): Tracing metadata
+            temperature (float, optional): Sampling temperature overriding the scene model's. Defaults to None.
+            stop_when (Callable[[str], bool], optional): Predicate on the partial response that ends the stream.
+                Defaults to the end of the python code block.
+
+        Returns:
+            str: The response text
+        """
+        if self.use_streaming and hasattr(self.scene_model, "astream"):
+            return await self.scene_model.astream(messages, metadata=metadata, temperature=temperature, stop_when=stop_when)
+        return await self.scene_model.acall(messages, metadata=metadata, temperature=temperature)
+
+    async def _extract_code_with_retries(self, response_text: str, pattern: str, generation_name: str = None, trace_id: str = None, session_id: str = None, max_retries: int = 10) -> str:
         """Extract code from response text with retry logic.
 
         Args:
@@ -221,6 +328,9 @@ class CodeGenerator:
 
         Raises:
             ValueError: If code extraction fails after max retries
+
+        Before asking the model to reformat its response, the code is looked for locally
+        with extract_python_code; how often each tier succeeds is kept in self.extraction_stats.
         """
         retry_prompt = """
         Please extract the Python code in the correct format using the pattern: {pattern}. 
@@ -233,12 +343,18 @@ class CodeGenerator:
         for attempt in range(max_retries):
             code_match = re.search(pattern, response_text, re.DOTALL)
             if code_match:
+                self.extraction_stats["pattern" if attempt == 0 else "model"] += 1
                 return code_match.group(1)
+
+            code, tier = extract_python_code(response_text)
+            if code is not None:
+                self.extraction_stats[tier if attempt == 0 else "model"] += 1
+                return code
             
             if attempt < max_retries - 1:
                 print(f"Attempt {attempt + 1}: Failed to extract code pattern. Retrying...")
                 # Regenerate response with a more explicit prompt
-                response_text = self.scene_model(
+                response_text = await self.scene_model.acall(
                     _prepare_text_inputs(retry_prompt.format(pattern=pattern, response_text=response_text)),
                     metadata={
                         "generation_name": f"{generation_name}_format_retry_{attempt + 1}",
@@ -247,9 +363,39 @@ class CodeGenerator:
                     }
                 )
         
+        self.extraction_stats["failed"] += 1
         raise ValueError(f"Failed to extract code pattern after {max_retries} attempts. Pattern: {pattern}")
 
-    def generate_manim_code(self,
+    def print_extraction_stats(self) -> None:
+        """Print how code was extracted from responses, by tier, how much errors were distilled and how often diff fixes applied."""
+        print("Code extraction: " + ", ".join(f"{tier}: {count}" for tier, count in self.extraction_stats.items()))
+        stats = self.error_distill_stats
+        if stats["fixes"]:
+            print(f"Error distillation: {stats['fixes']} fixes, {stats['raw_tokens']} -> {stats['distilled_tokens']} error tokens "
+                  f"({1 - stats['distilled_tokens'] / max(1, stats['raw_tokens']):.1%} fewer)")
+        if self.use_diff_fixes:
+            print(f"Diff fixes: {self.diff_fix_stats['applied']} applied, {self.diff_fix_stats['fallback']} fell back to a full rewrite")
+
+    def _apply_diff_fix(self, code: str, response_text: str, generation_name: str) -> Optional[str]:
+        """Apply the edits of a diff fix response, counting whether they applied.
+
+        Args:
+            code (str): Code the model was asked to fix
+            response_text (str): Response holding SEARCH/REPLACE edits
+            generation_name (str): Name of the generation step, for logging
+
+        Returns:
+            Optional[str]: The fixed code, or None if a full rewrite is needed
+        """
+        fixed_code = apply_code_edits(code, response_text)
+        if fixed_code is None:
+            self.diff_fix_stats["fallback"] += 1
+            print(f"{generation_name}: edits did not apply cleanly, asking for the full code")
+        else:
+            self.diff_fix_stats["applied"] += 1
+        return fixed_code
+
+    async def generate_manim_code(self,
                             topic: str,
                             description: str,                            
                             scene_outline: str,
@@ -258,7 +404,9 @@ class CodeGenerator:
                             additional_context: Union[str, List[str]] = None,
                             scene_trace_id: str = None,
                             session_id: str = None,
-                            rag_queries_cache: Dict = None) -> str:
+                            rag_queries_cache: Dict = None,
+                            temperature: float = None,
+                            static_context: List[str] = None) -> str:
         """Generate Manim code from video plan.
 
         Args:
@@ -271,24 +419,31 @@ class CodeGenerator:
             scene_trace_id (str, optional): Trace identifier. Defaults to None.
             session_id (str, optional): Session identifier. Defaults to None.
             rag_queries_cache (Dict, optional): Cache for RAG queries. Defaults to None.
+            temperature (float, optional): Sampling temperature overriding the scene model's. Defaults to None.
+            static_context (List[str], optional): Context identical for every scene, e.g. the Manim cheatsheet.
+                It is sent as a prompt prefix the provider can cache. Defaults to None.
 
         Returns:
             Tuple[str, str]: Generated code and response text
         """
-        if self.use_context_learning:
-            # Add context examples to additional_context
-            if additional_context is None:
-                additional_context = []
-            elif isinstance(additional_context, str):
-                additional_context = [additional_context]
-            
-            # Now using the properly formatted code examples
-            if self.context_examples:
-                additional_context.append(self.context_examples)
+        if self.use_context_learning and self.context_examples:
+            # The code examples are the same for every scene, so they belong to the cached prefix
+            static_context = list(static_context or []) + [self.context_examples]
+
+        if self.scene_library is not None:
+            # Verified scenes of other topics with the closest plans; they differ per scene, so they are not cached
+            examples = await asyncio.to_thread(self.scene_library.find_examples, scene_implementation, self.scene_library_k, topic)
+            self.library_examples[(topic, scene_number)] = len(examples)
+            formatted_examples = SceneLibrary.format_examples(examples)
+            if formatted_examples:
+                print(f"Scene {scene_number}: using {len(examples)} library examples "
+                      f"({', '.join(example['topic'] + ' scene ' + str(example['scene_number']) for example in examples)})")
+                additional_context = [formatted_examples] + (
+                    [additional_context] if isinstance(additional_context, str) else list(additional_context or []))
 
         if self.use_rag:
             # Generate RAG queries (will use cache if available)
-            rag_queries = self._generate_rag_queries_code(
+            rag_queries = await self._generate_rag_queries_code(
                 implementation=scene_implementation,
                 scene_trace_id=scene_trace_id,
                 topic=topic,
@@ -296,12 +451,14 @@ class CodeGenerator:
                 session_id=session_id
             )
 
-            retrieved_docs = self.vector_store.find_relevant_docs(
+            retrieved_docs = await asyncio.to_thread(
+                self.vector_store.find_relevant_docs,
                 queries=rag_queries,
                 k=2, # number of documents to retrieve
                 trace_id=scene_trace_id,
                 topic=topic,
-                scene_number=scene_number
+                scene_number=scene_number,
+                session_id=session_id
             )
             # Format the retrieved documents into a string
             if additional_context is None:
@@ -318,14 +475,18 @@ class CodeGenerator:
             additional_context=additional_context
         )
 
+        # Static context goes first so that the provider can reuse its cached prefix across scenes
+        messages = _prepare_cached_text_inputs(static_context, prompt) if static_context else _prepare_text_inputs(prompt)
+
         # Generate code using model
-        response_text = self.scene_model(
-            _prepare_text_inputs(prompt),
-            metadata={"generation_name": "code_generation", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
+        response_text = await self._generate_code_response(
+            messages,
+            metadata={"generation_name": "code_generation", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id},
+            temperature=temperature
         )
 
         # Extract code with retries
-        code = self._extract_code_with_retries(
+        code = await self._extract_code_with_retries(
             response_text,
             r"```python(.*)```",
             generation_name="code_generation",
@@ -334,7 +495,7 @@ class CodeGenerator:
         )
         return code, response_text
 
-    def fix_code_errors(self, implementation_plan: str, code: str, error: str, scene_trace_id: str, topic: str, scene_number: int, session_id: str, rag_queries_cache: Dict = None) -> str:
+    async def fix_code_errors(self, implementation_plan: str, code: str, error: str, scene_trace_id: str, topic: str, scene_number: int, session_id: str, rag_queries_cache: Dict = None) -> str:
         """Fix errors in generated Manim code.
 
         Args:
@@ -350,12 +511,20 @@ class CodeGenerator:
         Returns:
             Tuple[str, str]: Fixed code and response text
         """
-        # Format error fix prompt
-        prompt = get_prompt_fix_error(implementation_plan=implementation_plan, manim_code=code, error=error)
-
+        # Rich tracebacks, framework frames and logs are reduced to the failing scene line and the exception
+        raw_error = error
+        error = distill_error(raw_error)
+        # Tokens estimated at four characters each, like the rate limiter does
+        raw_tokens, distilled_tokens = len(raw_error) // 4, len(error) // 4
+        self.error_distill_stats["fixes"] += 1
+        self.error_distill_stats["raw_tokens"] += raw_tokens
+        self.error_distill_stats["distilled_tokens"] += distilled_tokens
+        print(f"Scene {scene_number}: distilled error from ~{raw_tokens} to ~{distilled_tokens} tokens")
+
+        retrieved_docs = None
         if self.use_rag:
             # Generate RAG queries for error fixing
-            rag_queries = self._generate_rag_queries_error_fix(
+            rag_queries = await self._generate_rag_queries_error_fix(
                 error=error,
                 code=code,
                 scene_trace_id=scene_trace_id,
@@ -363,24 +532,37 @@ class CodeGenerator:
                 scene_number=scene_number,
                 session_id=session_id
             )
-            retrieved_docs = self.vector_store.find_relevant_docs(
+            retrieved_docs = await asyncio.to_thread(
+                self.vector_store.find_relevant_docs,
                 queries=rag_queries,
                 k=2, # number of documents to retrieve for error fixing
                 trace_id=scene_trace_id,
                 topic=topic,
-                scene_number=scene_number
+                scene_number=scene_number,
+                session_id=session_id
             )
-            # Format the retrieved documents into a string
-            prompt = get_prompt_fix_error(implementation_plan=implementation_plan, manim_code=code, error=error, additional_context=retrieved_docs)
+
+        metadata = {"generation_name": "code_fix_error", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
+        if self.use_diff_fixes:
+            # Ask for edits only; the unchanged bulk of the scene is not generated again
+            prompt = get_prompt_fix_error(implementation_plan=implementation_plan, manim_code=code, error=error, additional_context=retrieved_docs, diff=True)
+            response_text = await self._generate_code_response(
+                _prepare_text_inputs(prompt),
+                metadata={**metadata, "generation_name": "code_fix_error_diff"},
+                stop_when=_edits_complete
+            )
+            fixed_code = self._apply_diff_fix(code, response_text, "code_fix_error")
+            if fixed_code is not None:
+                return fixed_code, response_text
+
+        # Format error fix prompt
+        prompt = get_prompt_fix_error(implementation_plan=implementation_plan, manim_code=code, error=error, additional_context=retrieved_docs)
 
         # Get fixed code from model
-        response_text = self.scene_model(
-            _prepare_text_inputs(prompt),
-            metadata={"generation_name": "code_fix_error", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
-        )
+        response_text = await self._generate_code_response(_prepare_text_inputs(prompt), metadata=metadata)
 
         # Extract fixed code with retries
-        fixed_code = self._extract_code_with_retries(
+        fixed_code = await self._extract_code_with_retries(
             response_text,
             r"```python(.*)```",
             generation_name="code_fix_error",
@@ -389,7 +571,7 @@ class CodeGenerator:
         )
         return fixed_code, response_text
 
-    def visual_self_reflection(self, code: str, media_path: Union[str, Image.Image], scene_trace_id: str, topic: str, scene_number: int, session_id: str) -> str:
+    async def visual_self_reflection(self, code: str, media_path: Union[str, Image.Image], scene_trace_id: str, topic: str, scene_number: int, session_id: str) -> str:
         """Use snapshot image or mp4 video to fix code.
 
         Args:
@@ -415,36 +597,45 @@ class CodeGenerator:
         prompt = prompt_template.format(code=code)
         
         # Prepare input based on media type
-        if is_video and isinstance(self.scene_model, (GeminiWrapper, VertexAIWrapper)):
+        if is_video and self.accepts_video():
             # For video with Gemini models
-            messages = [
-                {"type": "text", "content": prompt},
-                {"type": "video", "content": media_path}
-            ]
+            media_message = {"type": "video", "content": media_path}
         else:
             # For images or non-Gemini models
             if isinstance(media_path, str):
                 media = Image.open(media_path)
             else:
                 media = media_path
-            messages = [
-                {"type": "text", "content": prompt},
-                {"type": "image", "content": media}
-            ]
-        
+            media_message = {"type": "image", "content": media}
+        messages = [{"type": "text", "content": prompt}, media_message]
+        metadata = {
+            "generation_name": "visual_self_reflection",
+            "trace_id": scene_trace_id,
+            "tags": [topic, f"scene{scene_number}"],
+            "session_id": session_id
+        }
+
+        if self.use_diff_fixes:
+            response_text = await self._generate_code_response(
+                [{"type": "text", "content": prompt + "\n\n" + get_prompt_code_edits()}, media_message],
+                metadata={**metadata, "generation_name": "visual_self_reflection_diff"},
+                stop_when=_edits_complete
+            )
+            if "<LGTM>" in response_text:
+                return response_text, response_text
+            fixed_code = self._apply_diff_fix(code, response_text, "visual_self_reflection")
+            if fixed_code is not None:
+                return fixed_code, response_text
+
         # Get model response
-        response_text = self.scene_model(
-            messages,
-            metadata={
-                "generation_name": "visual_self_reflection",
-                "trace_id": scene_trace_id,
-                "tags": [topic, f"scene{scene_number}"],
-                "session_id": session_id
-            }
-        )
+        response_text = await self._generate_code_response(messages, metadata=metadata)
+
+        # An approved scene has no code to extract; the renderer stops on the marker
+        if "<LGTM>" in response_text:
+            return response_text, response_text
         
         # Extract code with retries
-        fixed_code = self._extract_code_with_retries(
+        fixed_code = await self._extract_code_with_retries(
             response_text,
             r"```python(.*)```",
             generation_name="visual_self_reflection",
@@ -0,0 +1,282 @@
+import os
+import ast
+import inspect
+import builtins
+import threading
+import importlib
+import importlib.util
+from typing import Dict, List, Optional, Set, Tuple
+
+# Module-level cache so that the manim and plugin API is indexed once per process
+_module_index: Dict[str, Optional[Dict[str, object]]] = {}
+_index_lock = threading.Lock()
+
+# Globals every module has besides the builtins
+_MODULE_GLOBALS = {"__file__", "__name__", "__doc__", "__spec__", "__loader__", "__package__", "__builtins__", "__annotations__"}
+
+
+def _public_names(module) -> Dict[str, object]:
+    """Return the names a star import of the module would bind."""
+    names = getattr(module, "__all__", None)
+    if names is None:
+        names = [name for name in dir(module) if not name.startswith("_")]
+    return {name: getattr(module, name, None) for name in names}
+
+
+def get_module_index(module_name: str) -> Optional[Dict[str, object]]:
+    """Import a module once and index its public API.
+
+    Args:
+        module_name (str): Dotted module name
+
+    Returns:
+        Optional[Dict[str, object]]: Public names mapped to objects, or None if the module
+        cannot be imported in this process (the validator then skips checks that need it)
+    """
+    with _index_lock:
+        if module_name not in _module_index:
+            try:
+                module = importlib.import_module(module_name)
+                _module_index[module_name] = {name: getattr(module, name) for name in dir(module)}
+                _module_index[module_name]["__star__"] = _public_names(module)
+            except Exception:
+                _module_index[module_name] = None
+        return _module_index[module_name]
+
+
+def _module_exists(module_name: str) -> bool:
+    """Return whether a module can be found without importing it."""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class StaticCheckError(Exception):
+    """An error found by the static validator, located at a line of the scene code."""
+
+    def __init__(self, kind: str, message: str, lineno: int, scope: str = "<module>"):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+        self.lineno = lineno
+        self.scope = scope
+
+
+class CodeValidator:
+    """Fast in-process checks of generated Manim code before it is rendered.
+
+    Catches syntax errors, missing modules and imported names, undefined names and
+    unexpected keyword arguments to manim and plugin classes, and reports them as
+    the traceback manim would have printed, so that the scene goes straight back to
+    CodeGenerator.fix_code_errors without taking a render slot.
+
+    Checks that would need a module that cannot be imported here are skipped, so the
+    validator only rejects code that would certainly fail.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.rejected = 0
+        self.errors_by_kind: Dict[str, int] = {}
+
+    def validate(self, code: str, file_path: str = "<scene>") -> Optional[str]:
+        """Check a scene's code without running it.
+
+        Args:
+            code (str): Generated Manim code
+            file_path (str, optional): Path shown in the error message. Defaults to "<scene>".
+
+        Returns:
+            Optional[str]: A traceback-style error message, or None if no error was found
+        """
+        self.checked += 1
+        try:
+            tree = ast.parse(code, filename=file_path)
+            self._check(tree)
+        except SyntaxError as e:
+            self._count("SyntaxError")
+            return self._format_syntax_error(e, file_path)
+        except StaticCheckError as e:
+            self._count(e.kind)
+            return self._format_error(e, code, file_path)
+        return None
+
+    def _count(self, kind: str) -> None:
+        self.rejected += 1
+        self.errors_by_kind[kind] = self.errors_by_kind.get(kind, 0) + 1
+
+    def print_stats(self) -> None:
+        """Print how many scenes were rejected before rendering."""
+        kinds = ", ".join(f"{kind}: {count}" for kind, count in sorted(self.errors_by_kind.items()))
+        print(f"Static validation: {self.checked} checked, {self.rejected} rejected before rendering"
+              + (f" ({kinds})" if kinds else ""))
+
+    def _check(self, tree: ast.Module) -> None:
+        """Run all checks on a parsed module, raising StaticCheckError on the first problem."""
+        imported, star_complete = self._check_imports(tree)
+        bound = self._bound_names(tree)
+        if star_complete:
+            self._check_names(tree, bound | set(imported) | set(dir(builtins)) | _MODULE_GLOBALS)
+        self._check_kwargs(tree, imported, bound)
+
+    def _check_imports(self, tree: ast.Module) -> Tuple[Dict[str, object], bool]:
+        """Verify imports and collect the objects they bind.
+
+        Returns:
+            Tuple[Dict[str, object], bool]: Names bound by imports mapped to their objects
+            (None when unknown), and whether every star import could be indexed
+        """
+        imported: Dict[str, object] = {}
+        star_complete = True
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if not _module_exists(alias.name):
+                        raise StaticCheckError("ModuleNotFoundError", f"No module named '{alias.name}'", node.lineno)
+                    imported[alias.asname or alias.name.split(".")[0]] = None
+            elif isinstance(node, ast.ImportFrom):
+                if node.level or not node.module:
+                    star_complete = False
+                    continue
+                if not _module_exists(node.module):
+                    raise StaticCheckError("ModuleNotFoundError", f"No module named '{node.module}'", node.lineno)
+                index = get_module_index(node.module)
+                for alias in node.names:
+                    if alias.name == "*":
+                        if index is None:
+                            star_complete = False
+                        else:
+                            imported.update(index["__star__"])
+                        continue
+                    if index is None:
+                        imported[alias.asname or alias.name] = None
+                    elif alias.name in index:
+                        imported[alias.asname or alias.name] = index[alias.name]
+                    elif _module_exists(f"{node.module}.{alias.name}"):
+                        imported[alias.asname or alias.name] = None
+                    else:
+                        raise StaticCheckError(
+                            "ImportError", f"cannot import name '{alias.name}' from '{node.module}'", node.lineno
+                        )
+        return imported, star_complete
+
+    @staticmethod
+    def _bound_names(tree: ast.Module) -> Set[str]:
+        """Collect every name the code binds anywhere.
+
+        Scoping is deliberately ignored: a name bound in any scope counts as defined,
+        which keeps the check free of false positives.
+        """
+        bound = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                bound.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                bound.add(node.name)
+            elif isinstance(node, ast.arg):
+                bound.add(node.arg)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                bound.add(node.name)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                bound.update(node.names)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    if alias.name != "*":
+                        bound.add(alias.asname or alias.name.split(".")[0])
+            elif hasattr(ast, "MatchAs") and isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+                bound.add(node.name)
+        return bound
+
+    def _check_names(self, tree: ast.Module, known: Set[str]) -> None:
+        """Report the first name that is loaded but never defined."""
+        for scope, node in self._walk_with_scope(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known:
+                raise StaticCheckError("NameError", f"name '{node.id}' is not defined", node.lineno, scope)
+
+    def _check_kwargs(self, tree: ast.Module, imported: Dict[str, object], bound: Set[str]) -> None:
+        """Report keyword arguments that an imported class or function does not accept."""
+        for scope, node in self._walk_with_scope(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+                continue
+            name = node.func.id
+            # Names rebound by the scene itself may no longer refer to the imported object
+            if name in bound or imported.get(name) is None:
+                continue
+            accepted = self._accepted_keywords(imported[name])
+            if accepted is None:
+                continue
+            for keyword in node.keywords:
+                if keyword.arg is not None and keyword.arg not in accepted:
+                    target = f"{name}.__init__()" if inspect.isclass(imported[name]) else f"{name}()"
+                    raise StaticCheckError(
+                        "TypeError", f"{target} got an unexpected keyword argument '{keyword.arg}'", node.lineno, scope
+                    )
+
+    @staticmethod
+    def _accepted_keywords(obj) -> Optional[Set[str]]:
+        """Return the keyword arguments a callable accepts, or None if it accepts any.
+
+        For classes, keyword arguments forwarded through **kwargs are followed up the MRO
+        until an __init__ that does not take **kwargs, as manim mobjects do.
+        """
+        if inspect.isclass(obj):
+            functions = [cls.__dict__["__init__"] for cls in obj.__mro__
+                         if cls is not object and "__init__" in cls.__dict__]
+        elif callable(obj):
+            functions = [obj]
+        else:
+            return None
+        accepted = set()
+        for function in functions:
+            try:
+                parameters = inspect.signature(function).parameters.values()
+            except (TypeError, ValueError):
+                return None
+            accepted.update(p.name for p in parameters
+                            if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY))
+            if not any(p.kind == p.VAR_KEYWORD for p in parameters):
+                return accepted
+        return None
+
+    @staticmethod
+    def _walk_with_scope(tree: ast.Module) -> List[Tuple[str, ast.AST]]:
+        """Return all nodes in source order, each with the name of its enclosing function."""
+        nodes = []
+
+        def visit(node, scope):
+            for child in ast.iter_child_nodes(node):
+                child_scope = child.name if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) else scope
+                nodes.append((child_scope, child))
+                visit(child, child_scope)
+
+        visit(tree, "<module>")
+        nodes.sort(key=lambda item: (getattr(item[1], "lineno", 0), getattr(item[1], "col_offset", 0)))
+        return nodes
+
+    @staticmethod
+    def _format_error(error: StaticCheckError, code: str, file_path: str) -> str:
+        """Format an error as the Python traceback manim prints."""
+        lines = code.splitlines()
+        source = lines[error.lineno - 1].strip() if 0 < error.lineno <= len(lines) else ""
+        return (
+            "Traceback (most recent call last):\n"
+            f"  File \"{os.path.abspath(file_path) if file_path != '<scene>' else file_path}\", line {error.lineno}, in {error.scope}\n"
+            f"    {source}\n"
+            f"{error.kind}: {error.message}\n"
+        )
+
+    @staticmethod
+    def _format_syntax_error(error: SyntaxError, file_path: str) -> str:
+        """Format a syntax error as Python reports it."""
+        source = (error.text or "").rstrip("\n")
+        caret = ""
+        if source and error.offset:
+            stripped = source.lstrip()
+            caret = "\n    " + " " * max(error.offset - 1 - (len(source) - len(stripped)), 0) + "^"
+            source = stripped
+        return (
+            f"  File \"{os.path.abspath(file_path) if file_path != '<scene>' else file_path}\", line {error.lineno}\n"
+            f"    {source}{caret}\n"
+            f"SyntaxError: {error.msg}\n"
+        )
@@ -0,0 +1,182 @@
+import os
+import re
+import hashlib
+from typing import List, Optional, Tuple
+
+# Colour/cursor escape sequences and terminal hyperlinks
+_ANSI_PATTERN = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(\x07|\x1b\\)")
+# Borders of rich's boxed tracebacks
+_BOX_EDGE_PATTERN = re.compile(r"^\s*[╭╰][─━ ]*.*[╮╯]\s*$")
+_BOX_LINE_PATTERN = re.compile(r"^\s*│(.*)$")
+_RICH_CODE_PATTERN = re.compile(r"^\s*(❱)?\s*(\d+)\s*│(.*)$")
+_RICH_FRAME_PATTERN = re.compile(r"^(.+?):(\d+)\s+in\s+(\S+)$")
+_PLAIN_FRAME_PATTERN = re.compile(r'^\s*File "(.+?)", line (\d+), in (.+)$')
+_EXCEPTION_PATTERN = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Iteration|Warning))(?:: ?(.*))?$")
+_CHAIN_PATTERN = re.compile(r"^(During handling of the above exception, another exception occurred|"
+                            r"The above exception was the direct cause of the following exception):\s*$", re.MULTILINE)
+# Paths of frames that belong to Python, manim or another installed package rather than the scene
+_FRAMEWORK_MARKERS = ("site-packages", "dist-packages", "<frozen", f"{os.sep}lib{os.sep}python")
+
+_MAX_MESSAGE_LINES = 8
+_MAX_FALLBACK_LINES = 40
+
+
+def strip_terminal_formatting(text: str) -> str:
+    """Remove ANSI escape sequences and carriage-return progress updates from captured output."""
+    text = _ANSI_PATTERN.sub("", text)
+    # Progress bars redraw the line with \r; keep what was drawn last
+    return "\n".join(line.rsplit("\r", 1)[-1] for line in text.split("\n"))
+
+
+def _is_framework(path: str) -> bool:
+    return any(marker in path for marker in _FRAMEWORK_MARKERS) or not path.endswith(".py")
+
+
+def _short_path(path: str) -> str:
+    """Shorten a frame path to the scene file name or the package-relative module path."""
+    for marker in ("site-packages", "dist-packages"):
+        if marker in path:
+            return path.split(marker, 1)[1].lstrip("/\\")
+    return os.path.basename(path) if path.endswith(".py") else path
+
+
+def _parse_rich_frames(lines: List[str]) -> List[Tuple[str, int, str, str]]:
+    """Parse the frames of a rich boxed traceback into (path, line, function, code) tuples."""
+    frames = []
+    header: List[str] = []
+    for line in lines:
+        match = _BOX_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        inner = match.group(1).rstrip()
+        inner = inner[:-1] if inner.endswith("│") else inner
+        code_match = _RICH_CODE_PATTERN.match(inner)
+        if code_match:
+            if header:
+                frame = _RICH_FRAME_PATTERN.match(_join_wrapped(header))
+                header = []
+                if frame:
+                    frames.append([frame.group(1), int(frame.group(2)), frame.group(3), ""])
+            if code_match.group(1) and frames:
+                # Indentation guides are drawn with box characters
+                frames[-1][3] = code_match.group(3).replace("│", " ").strip()
+        elif inner.strip():
+            header.append(inner)
+    if header:
+        frame = _RICH_FRAME_PATTERN.match(_join_wrapped(header))
+        if frame:
+            frames.append([frame.group(1), int(frame.group(2)), frame.group(3), ""])
+    return [tuple(frame) for frame in frames]
+
+
+def _join_wrapped(parts: List[str]) -> str:
+    """Join the lines of a wrapped frame header; a line filling the box up to its padding was cut mid-word."""
+    if not parts:
+        return ""
+    text = parts[0].strip()
+    for previous, part in zip(parts, parts[1:]):
+        if text:
+            text += "" if len(previous.rstrip()) >= len(previous) - 1 else " "
+        text += part.strip()
+    return text
+
+
+def _parse_plain_frames(lines: List[str]) -> List[Tuple[str, int, str, str]]:
+    """Parse the frames of a standard Python traceback into (path, line, function, code) tuples."""
+    frames = []
+    for i, line in enumerate(lines):
+        match = _PLAIN_FRAME_PATTERN.match(line)
+        if not match:
+            continue
+        code = ""
+        if i + 1 < len(lines) and not _PLAIN_FRAME_PATTERN.match(lines[i + 1]) and lines[i + 1].startswith("    "):
+            code = lines[i + 1].strip()
+        frames.append((match.group(1), int(match.group(2)), match.group(3).strip(), code))
+    return frames
+
+
+def _parse_exception(lines: List[str]) -> Optional[str]:
+    """Return the last exception line of a traceback segment with its continuation lines."""
+    for i in range(len(lines) - 1, -1, -1):
+        line = lines[i]
+        if line[:1].isspace() or not _EXCEPTION_PATTERN.match(line):
+            continue
+        message = [line.rstrip()]
+        for following in lines[i + 1:i + _MAX_MESSAGE_LINES]:
+            if not following.strip() or _BOX_EDGE_PATTERN.match(following):
+                break
+            message.append(following.rstrip())
+        return "\n".join(message)
+    return None
+
+
+def _distill_segment(segment: str) -> Tuple[List[Tuple[str, int, str, str]], Optional[str]]:
+    lines = segment.split("\n")
+    frames = _parse_plain_frames(lines) or _parse_rich_frames(lines)
+    return frames, _parse_exception(lines)
+
+
+def distill_error(error: str) -> str:
+    """Reduce manim's stderr to what a fix needs: the failing scene lines and the exception.
+
+    Strips ANSI codes and rich box drawing, keeps the frames in the scene file plus the frame
+    that raised, and collapses the manim, click and library frames in between. For chained
+    exceptions the final one is kept in full and its causes are listed by their exception
+    line. Output without a traceback, e.g. a static check or a timeout, is returned with only
+    the formatting stripped, shortened to its head and tail if it is long.
+
+    Args:
+        error (str): Captured stderr of a failed render or an error message
+
+    Returns:
+        str: The distilled error
+    """
+    text = strip_terminal_formatting(error).strip()
+    segments = _CHAIN_PATTERN.split(text)[::2]
+    frames, exception = _distill_segment(segments[-1])
+    if not frames or exception is None:
+        return _shorten(text)
+
+    kept = [i for i, frame in enumerate(frames) if not _is_framework(frame[0])]
+    if len(frames) - 1 not in kept:
+        kept.append(len(frames) - 1)
+    lines = []
+    causes = [cause for _, cause in (_distill_segment(segment) for segment in segments[:-1]) if cause]
+    for cause in causes:
+        lines.append(f"Caused by: {cause.splitlines()[0]}")
+    omitted = len(frames) - len(kept)
+    lines.append(f"Traceback (scene frames and the raising frame{f'; {omitted} framework frames omitted' if omitted else ''}):")
+    for i in kept:
+        path, line_number, function, code = frames[i]
+        lines.append(f'  File "{_short_path(path)}", line {line_number}, in {function}')
+        if code:
+            lines.append(f"    {code}")
+    lines.append(exception)
+    latex_errors = [line for line in text.split("\n") if line.startswith("! ")][:3]
+    if latex_errors:
+        lines.append("LaTeX errors:\n" + "\n".join(latex_errors))
+    return "\n".join(lines)
+
+
+def _shorten(text: str) -> str:
+    """Drop box borders and blank runs, and keep the head and tail of long output."""
+    lines = [line.rstrip() for line in text.split("\n") if not _BOX_EDGE_PATTERN.match(line)]
+    lines = [line for i, line in enumerate(lines) if line or (i and lines[i - 1])]
+    if len(lines) <= _MAX_FALLBACK_LINES:
+        return "\n".join(lines)
+    head, tail = 5, _MAX_FALLBACK_LINES - 5
+    return "\n".join(lines[:head] + [f"... {len(lines) - head - tail} lines omitted ..."] + lines[-tail:])
+
+
+def error_cache_key(distilled_error: str) -> str:
+    """Return a short key identifying an error independent of the line numbers it occurred at.
+
+    Args:
+        distilled_error (str): Output of distill_error
+
+    Returns:
+        str: Hex digest usable in file names
+    """
+    normalized = re.sub(r"line \d+", "line N", distilled_error)
+    normalized = re.sub(r"_v\d+\.py", ".py", normalized)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,183 @@
+import re
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.job_queue import JobQueue, default_worker_id
+from src.utils.state_store import get_file_prefix
+from src.utils.utils import extract_xml
+
+
+def enqueue_theorems(queue: JobQueue, theorems: List[Dict], max_attempts: int = 3) -> int:
+    """
+    Enqueue one topic job per theorem. Topics that were enqueued before are left alone.
+
+    Args:
+        queue (JobQueue): Shared job queue
+        theorems (List[Dict]): Theorems with 'theorem' and 'description' keys
+        max_attempts (int, optional): Leases per job before it is marked failed. Defaults to 3.
+
+    Returns:
+        int: Number of topics added to the queue
+    """
+    added = 0
+    for theorem in theorems:
+        prefix = get_file_prefix(theorem['theorem'])
+        added += queue.enqueue(
+            "topic", f"topic:{prefix}",
+            {"topic": theorem['theorem'], "description": theorem['description']},
+            group_key=prefix, max_attempts=max_attempts
+        )
+    print(f"Enqueued {added} new topics ({len(theorems) - added} already queued)")
+    return added
+
+
+class JobWorker:
+    """
+    Worker that leases jobs from a shared JobQueue and runs them with a VideoGenerator.
+
+    A topic job produces the scene outline and enqueues one scene job per scene. A scene
+    job plans, codes and renders its scene; once every scene job of a topic has completed,
+    the queue enqueues the topic's combine job. A topic with a scene that failed for good
+    is not combined. Scenes of one topic can therefore run on several
+    machines at once, and a job whose worker dies is picked up again once its lease expires.
+
+    Args:
+        video_generator: VideoGenerator used to run the stages
+        queue (JobQueue): Shared job queue
+        worker_id (str, optional): Identifier of this worker. Defaults to hostname:pid.
+        lease_seconds (float, optional): Lease duration, renewed by heartbeats. Defaults to 300.
+        max_jobs (int, optional): Jobs run concurrently by this worker. Defaults to 1.
+        max_retries (int, optional): Maximum number of code fix attempts per scene. Defaults to 5.
+        only_plan (bool, optional): Stop after the implementation plans. Defaults to False.
+        only_render (bool, optional): Only process scenes without code and never combine. Defaults to False.
+        poll_interval (float, optional): Seconds between polls of an empty queue. Defaults to 5.
+    """
+
+    def __init__(self, video_generator, queue: JobQueue, worker_id: Optional[str] = None,
+                 lease_seconds: float = 300, max_jobs: int = 1, max_retries: int = 5,
+                 only_plan: bool = False, only_render: bool = False, poll_interval: float = 5):
+        self.video_generator = video_generator
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_jobs = max(1, max_jobs)
+        self.max_retries = max_retries
+        self.only_plan = only_plan
+        self.only_render = only_render
+        self.poll_interval = poll_interval
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        # Scene outlines and relevant plugins of the topics this worker already prepared,
+        # so plugin detection runs once per topic
+        self._outlines: Dict[str, asyncio.Future] = {}
+
+    async def run(self) -> None:
+        """Lease and run jobs until the queue has no queued or leased job left."""
+        print(f"Worker {self.worker_id} started on {self.queue.db_path}")
+        running = set()
+        while True:
+            while len(running) < self.max_jobs:
+                job = await asyncio.to_thread(self.queue.lease, self.worker_id, self.lease_seconds)
+                if job is None:
+                    break
+                running.add(asyncio.create_task(self._run_job(job)))
+
+            if running:
+                _, running = await asyncio.wait(running, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            elif await asyncio.to_thread(self.queue.has_pending_work):
+                # Other workers hold leases; their jobs may enqueue more work or expire
+                await asyncio.sleep(self.poll_interval)
+            else:
+                break
+        print(f"Worker {self.worker_id} finished: {self.jobs_done} jobs done, {self.jobs_failed} failed")
+
+    async def _run_job(self, job: Dict) -> None:
+        """Run one leased job while renewing its lease, then report the outcome to the queue."""
+        print(f"Worker {self.worker_id} running {job['job_key']} (attempt {job['attempts']}/{job['max_attempts']})")
+        task = asyncio.create_task(self._handle(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, task))
+        try:
+            follow_ups = await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            print(f"Worker {self.worker_id} lost the lease of {job['job_key']}, abandoning it")
+            self.jobs_failed += 1
+            return
+        except Exception as e:
+            print(f"Job {job['job_key']} failed: {e}")
+            await asyncio.to_thread(self.queue.fail, job['id'], self.worker_id, str(e))
+            self.jobs_failed += 1
+            return
+        finally:
+            heartbeat.cancel()
+        if await asyncio.to_thread(self.queue.complete, job['id'], self.worker_id, follow_ups):
+            self.jobs_done += 1
+        else:
+            print(f"Worker {self.worker_id} finished {job['job_key']} after its lease expired")
+
+    async def _heartbeat(self, job: Dict, task: asyncio.Task) -> None:
+        """Extend the job's lease periodically; cancel the job if another worker took it over."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, job['id'], self.worker_id, self.lease_seconds):
+                task.cancel()
+                return
+
+    def _combine_job(self, job: Dict) -> Optional[Dict]:
+        """Return the combine job of a topic job's scenes, or None if this worker does not combine."""
+        if self.only_plan or self.only_render:
+            return None
+        return {"kind": "combine", "job_key": f"combine:{job['group_key']}",
+                "payload": {"topic": job['payload']['topic']}, "group_key": job['group_key']}
+
+    async def _prepare_topic(self, topic: str, description: str, session_id: str) -> Tuple[str, Optional[List[str]]]:
+        """Prepare a topic and return its scene outline with the plugins detected for it."""
+        scene_outline = await self.video_generator.prepare_topic(topic, description, session_id)
+        return scene_outline, self.video_generator.planner.topic_plugins.get(topic)
+
+    async def _scene_outline(self, topic: str, description: str, session_id: str) -> Tuple[str, Optional[List[str]]]:
+        """Prepare a topic at most once per worker, sharing its outline and plugins between its scene jobs."""
+        if topic not in self._outlines:
+            self._outlines[topic] = asyncio.ensure_future(self._prepare_topic(topic, description, session_id))
+        try:
+            return await asyncio.shield(self._outlines[topic])
+        except Exception:
+            self._outlines.pop(topic, None)
+            raise
+
+    async def _handle(self, job: Dict) -> Optional[List[Dict]]:
+        """Run a job and return the follow-up jobs it produces."""
+        payload = job['payload']
+        topic = payload['topic']
+        video_generator = self.video_generator
+
+        if job['kind'] == "combine":
+            await video_generator.scheduler.run_in_thread("combine", video_generator.combine_videos, topic)
+            return None
+
+        session_id = video_generator._load_topic_session_id(topic) or video_generator._load_or_create_session_id()
+        video_generator._save_topic_session_id(topic, session_id)
+        scene_outline, relevant_plugins = await self._scene_outline(topic, payload['description'], session_id)
+
+        if job['kind'] == "topic":
+            num_scenes = len(re.findall(r'<SCENE_(\d+)>[^<]', extract_xml(scene_outline)))
+            return [
+                {"kind": "scene", "job_key": f"scene:{job['group_key']}:{scene_num}",
+                 "payload": {"topic": topic, "description": payload['description'], "scene_num": scene_num},
+                 "group_key": job['group_key'], "max_attempts": job['max_attempts'],
+                 "group_follow_up": self._combine_job(job)}
+                for scene_num in range(1, num_scenes + 1)
+            ]
+
+        if job['kind'] == "scene":
+            scene_num = payload['scene_num']
+            implementation_plan = video_generator.load_implementation_plans(topic).get(scene_num)
+            await video_generator.run_scene_stages(
+                topic, payload['description'], scene_outline, scene_num, implementation_plan,
+                self.max_retries, session_id, only_plan=self.only_plan, only_render=self.only_render,
+                relevant_plugins=relevant_plugins
+            )
+            return None
+
+        raise ValueError(f"Unknown job kind: {job['kind']}")
@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import itertools
+import subprocess
+from typing import List, Optional, Dict
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class RenderExecutor:
+    """Dedicated worker pool for CPU-bound Manim renders.
+
+    Render jobs are kept separate from LLM concurrency: they wait in a priority queue
+    and run on a fixed number of workers (one per core by default), each job in its
+    own process session so that a timed out or cancelled render can be killed together
+    with any ffmpeg/LaTeX children it spawned.
+
+    Args:
+        max_workers (int, optional): Number of concurrent renders. Defaults to the number of CPU cores.
+        timeout (float, optional): Wall clock seconds before a render is killed. Defaults to None (no timeout).
+        cpu_time_limit (int, optional): Per-job CPU seconds limit (RLIMIT_CPU). Defaults to None.
+        memory_limit_mb (int, optional): Per-job address space limit in MB (RLIMIT_AS). Defaults to None.
+        render_client (WarmRenderClient, optional): When set, manim commands are rendered by the warm
+            render server instead of a fresh subprocess. Defaults to None.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None,
+                 cpu_time_limit: Optional[int] = None, memory_limit_mb: Optional[int] = None,
+                 render_client=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.render_client = render_client
+        self._queue = None
+        self._workers = []
+        self._loop = None
+        self._counter = itertools.count()
+        self._active = 0
+        self._busy_seconds = 0.0
+        self._completed = 0
+        self._timed_out = 0
+        self._cancelled = 0
+        self._start_time = time.monotonic()
+
+    def _ensure_workers(self) -> None:
+        """Start the worker tasks on the running event loop if they are not running yet."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    def _has_limits(self) -> bool:
+        """Whether renders run with rlimits that must be applied in the child process."""
+        return resource is not None and bool(self.cpu_time_limit or self.memory_limit_mb)
+
+    def _apply_limits(self) -> None:
+        """Apply rlimits in the child process before exec."""
+        if resource is None:
+            return
+        if self.cpu_time_limit:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_time_limit, self.cpu_time_limit))
+        if self.memory_limit_mb:
+            limit = self.memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    @staticmethod
+    def _kill(process) -> None:
+        """Kill a render process together with its process group."""
+        if process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, AttributeError):
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    async def submit(self, cmd: List[str], priority: int = 0, cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        """Queue a render command and wait for it to finish.
+
+        Cancelling the awaiting task kills the render if it is already running.
+
+        Args:
+            cmd (List[str]): Command line to execute, e.g. ["manim", "-qh", ...]
+            priority (int, optional): Lower values run first. Defaults to 0.
+            cwd (str, optional): Working directory for the command. Defaults to None.
+
+        Returns:
+            subprocess.CompletedProcess: Result with text stdout/stderr. A timed out render
+            has returncode -9 and an explanatory message appended to stderr.
+        """
+        self._ensure_workers()
+        future = self._loop.create_future()
+        await self._queue.put((priority, next(self._counter), cmd, cwd, future))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._cancelled += 1
+            raise
+
+    async def _worker(self) -> None:
+        """Take jobs from the priority queue and run them one at a time."""
+        while True:
+            priority, _, cmd, cwd, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                self._active += 1
+                start = time.monotonic()
+                try:
+                    result = await self._run(cmd, cwd, future)
+                    if not future.done():
+                        future.set_result(result)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                finally:
+                    self._active -= 1
+                    self._completed += 1
+                    self._busy_seconds += time.monotonic() - start
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, cmd: List[str], cwd: Optional[str], future: asyncio.Future) -> subprocess.CompletedProcess:
+        """Run a single command with limits, timeout and cancellation support."""
+        if self.render_client is not None and cmd and cmd[0] == "manim":
+            return await self._run_warm(cmd, cwd, future)
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            # A preexec_fn is not thread safe and rules out the faster spawn path, so only use it for limits
+            preexec_fn=self._apply_limits if self._has_limits() else None,
+            start_new_session=sys.platform != "win32"
+        )
+        # Kill the render as soon as the submitter gives up on it
+        future.add_done_callback(lambda f: self._kill(process) if f.cancelled() else None)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            self._kill(process)
+            stdout, stderr = await process.communicate()
+            message = f"\nRender timed out after {self.timeout} seconds and was killed."
+            return subprocess.CompletedProcess(cmd, -signal.SIGKILL, stdout.decode(errors="replace"), stderr.decode(errors="replace") + message)
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+    async def _run_warm(self, cmd: List[str], cwd: Optional[str], future: asyncio.Future) -> subprocess.CompletedProcess:
+        """Render a manim command on the warm render server, which enforces the same limits."""
+        task = asyncio.ensure_future(self.render_client.run(
+            cmd[1:],
+            cwd=cwd,
+            timeout=self.timeout,
+            cpu_time_limit=self.cpu_time_limit,
+            memory_limit_mb=self.memory_limit_mb
+        ))
+        # Closing the connection makes the server kill the render
+        future.add_done_callback(lambda f: task.cancel() if f.cancelled() else None)
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            return subprocess.CompletedProcess(cmd, -signal.SIGKILL, "", "Render cancelled")
+        if result.returncode == -signal.SIGKILL and "timed out" in result.stderr:
+            self._timed_out += 1
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        """Return queue depth and utilization of the render pool.
+
+        Returns:
+            Dict[str, float]: Counters including queue_depth, active and utilization
+        """
+        elapsed = max(time.monotonic() - self._start_time, 1e-9)
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "active": self._active,
+            "completed": self._completed,
+            "timed_out": self._timed_out,
+            "cancelled": self._cancelled,
+            "busy_seconds": self._busy_seconds,
+            "utilization": self._busy_seconds / (elapsed * self.max_workers),
+        }
+
+    def print_stats(self) -> None:
+        """Print a one-line summary of the render pool."""
+        stats = self.stats()
+        print(f"Render pool: {stats['workers']} workers, queue depth {stats['queue_depth']}, "
+              f"active {stats['active']}, completed {stats['completed']}, timed out {stats['timed_out']}, "
+              f"cancelled {stats['cancelled']}, utilization {stats['utilization']:.1%}")
@@ -0,0 +1,389 @@
+"""Warm Manim render server.
+
+A long-lived local daemon that imports manim and the plugins used by generated
+scenes once, then renders every scene file in a forked child. Each render skips
+the several seconds of interpreter and plugin start-up that a fresh
+``manim -qh`` process pays.
+
+Start it manually with:
+    python -m src.core.render_server --socket /tmp/tea_render_$UID/render_server.sock
+
+or let ``WarmRenderClient.ensure_server`` spawn it on first use. A spawned server
+exits after it has been idle for ``idle_timeout`` seconds and logs to
+``render_server.log`` next to its socket.
+"""
+import os
+import sys
+import json
+import stat
+import time
+import errno
+import select
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import importlib
+import subprocess
+from typing import List, Optional
+
+try:
+    import resource
+    import fcntl
+except ImportError:  # Not available on Windows
+    resource = None
+    fcntl = None
+
+# The socket lives in a directory only the current user can access, so no other
+# local user can bind it first or send render jobs to our server
+DEFAULT_SOCKET_PATH = os.path.join(
+    tempfile.gettempdir(),
+    f"tea_render_{os.getuid()}" if hasattr(os, "getuid") else "tea_render",
+    "render_server.sock"
+)
+DEFAULT_IDLE_TIMEOUT = 900
+
+# Modules imported by every generated scene
+PRELOAD_MODULES = [
+    "manim",
+    "manim.__main__",
+    "manim_voiceover",
+    "manim_physics",
+    "manim_chemistry",
+    "manim_dsa",
+    "manim_ml",
+    "manim_circuit",
+    "src.utils.kokoro_voiceover",
+]
+
+
+def _prepare_socket_dir(socket_path: str) -> None:
+    """Create the directory of a socket with mode 0700 and check that it is private to the current user.
+
+    Raises:
+        PermissionError: If the directory is a symlink, is owned by another user or is accessible by others
+    """
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    info = os.lstat(socket_dir)
+    if stat.S_ISLNK(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"Render server socket directory {socket_dir} must be a directory owned by the "
+                              f"current user with mode 0700")
+
+
+class RenderServer:
+    """Forkserver-style render daemon listening on a unix socket.
+
+    The server process only accepts connections and forks. For every request a
+    handler child reads the job, forks the render child from the warm interpreter,
+    enforces the timeout, kills the render if the client disconnects, and sends
+    back the exit code and captured output.
+
+    Args:
+        socket_path (str): Path of the unix socket to listen on
+        preload_modules (List[str], optional): Modules to import before serving. Defaults to PRELOAD_MODULES.
+        preload_tts (bool, optional): Whether to also load the Kokoro model. Off by default because
+            onnxruntime sessions with live thread pools are not always safe to use after fork.
+        idle_timeout (float, optional): Seconds without requests after which the server exits;
+            None serves until killed. Defaults to None.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, preload_modules: Optional[List[str]] = None,
+                 preload_tts: bool = False, idle_timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self.preload_modules = preload_modules if preload_modules is not None else PRELOAD_MODULES
+        self.preload_tts = preload_tts
+        self.idle_timeout = idle_timeout
+
+    def preload(self) -> None:
+        """Import the preload modules, skipping the ones that are not installed."""
+        start = time.perf_counter()
+        for module in self.preload_modules:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                print(f"Render server: could not preload {module}: {e}")
+        if self.preload_tts:
+            from src.config.config import Config
+            from src.utils.kokoro_voiceover import get_kokoro_model
+            if Config.KOKORO_MODEL_PATH and Config.KOKORO_VOICES_PATH:
+                get_kokoro_model(Config.KOKORO_MODEL_PATH, Config.KOKORO_VOICES_PATH)
+        print(f"Render server: preloaded {len(self.preload_modules)} modules in {time.perf_counter() - start:.2f}s")
+
+    def serve_forever(self) -> None:
+        """Preload modules and serve render requests until killed or idle for idle_timeout seconds."""
+        self.preload()
+        _prepare_socket_dir(self.socket_path)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(64)
+        # SIGTERM unwinds through the finally below, so the socket file is removed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f"Render server listening on {self.socket_path}")
+        handlers = set()
+        last_active = time.monotonic()
+        try:
+            while True:
+                readable, _, _ = select.select([server], [], [], 1.0)
+                # Reap finished handler children
+                for pid in list(handlers):
+                    if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                        handlers.discard(pid)
+                if handlers:
+                    last_active = time.monotonic()
+                if not readable:
+                    if self.idle_timeout is not None and time.monotonic() - last_active > self.idle_timeout:
+                        print(f"Render server idle for {self.idle_timeout}s, shutting down")
+                        return
+                    continue
+                try:
+                    conn, _ = server.accept()
+                except InterruptedError:
+                    continue
+                last_active = time.monotonic()
+                pid = os.fork()
+                if pid == 0:
+                    server.close()
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    try:
+                        self._handle(conn)
+                    finally:
+                        os._exit(0)
+                handlers.add(pid)
+                conn.close()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def _handle(self, conn: socket.socket) -> None:
+        """Run one render request in a forked child and report the result."""
+        request = json.loads(_read_line(conn))
+        stdout_file = tempfile.TemporaryFile()
+        stderr_file = tempfile.TemporaryFile()
+
+        pid = os.fork()
+        if pid == 0:
+            _render_child(request, stdout_file.fileno(), stderr_file.fileno())
+
+        timeout = request.get("timeout")
+        deadline = time.monotonic() + timeout if timeout else None
+        timed_out = False
+        status = None
+        while status is None:
+            finished_pid, wait_status = os.waitpid(pid, os.WNOHANG)
+            if finished_pid == pid:
+                status = wait_status
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                timed_out = True
+                _kill_group(pid)
+                _, status = os.waitpid(pid, 0)
+                break
+            # A readable socket here means the client hung up: cancel the render
+            readable, _, _ = select.select([conn], [], [], 0.05)
+            if readable and not conn.recv(1, socket.MSG_PEEK):
+                _kill_group(pid)
+                os.waitpid(pid, 0)
+                return
+
+        returncode = os.waitstatus_to_exitcode(status)
+        stdout_file.seek(0)
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace")
+        if timed_out:
+            stderr += f"\nRender timed out after {timeout} seconds and was killed."
+        response = {
+            "returncode": returncode,
+            "stdout": stdout_file.read().decode(errors="replace"),
+            "stderr": stderr,
+        }
+        try:
+            conn.sendall(json.dumps(response).encode("utf-8") + b"\n")
+        except OSError as e:
+            if e.errno != errno.EPIPE:
+                raise
+        conn.close()
+
+
+def _read_line(conn: socket.socket) -> bytes:
+    """Read one newline-terminated message from a socket."""
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b"\n"):
+            break
+    return b"".join(chunks)
+
+
+def _kill_group(pid: int) -> None:
+    """Kill a render child and every process it started."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _render_child(request: dict, stdout_fd: int, stderr_fd: int) -> None:
+    """Body of the forked render child: apply limits, redirect output and run manim."""
+    returncode = 1
+    try:
+        os.setsid()
+        if resource is not None:
+            if request.get("cpu_time_limit"):
+                limit = int(request["cpu_time_limit"])
+                resource.setrlimit(resource.RLIMIT_CPU, (limit, limit))
+            if request.get("memory_limit_mb"):
+                limit = int(request["memory_limit_mb"]) * 1024 * 1024
+                resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        if request.get("cwd"):
+            os.chdir(request["cwd"])
+
+        from manim.__main__ import main as manim_main
+        sys.argv = ["manim"] + request["args"]
+        try:
+            manim_main(prog_name="manim", args=request["args"])
+            returncode = 0
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        returncode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(returncode)
+
+
+class WarmRenderClient:
+    """Asyncio client for RenderServer, returning results shaped like subprocess.run.
+
+    Args:
+        socket_path (str, optional): Path of the server's unix socket. Defaults to DEFAULT_SOCKET_PATH.
+        preload_tts (bool, optional): Whether a server started by this client also loads the Kokoro model. Defaults to False.
+        idle_timeout (float, optional): Seconds without requests after which a server started by this
+            client exits. Defaults to DEFAULT_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, preload_tts: bool = False,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.preload_tts = preload_tts
+        self.idle_timeout = idle_timeout
+
+    def is_available(self) -> bool:
+        """Return whether a server owned by the current user is accepting connections on the socket."""
+        try:
+            if os.stat(self.socket_path).st_uid != os.getuid():
+                return False
+        except OSError:
+            return False
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+                return True
+            except OSError:
+                return False
+
+    def ensure_server(self, startup_timeout: float = 120) -> None:
+        """Start a detached render server if none is running.
+
+        The server exits on its own after idle_timeout seconds without requests. A lock file
+        next to the socket keeps concurrent pipeline processes from starting two servers.
+
+        Args:
+            startup_timeout (float, optional): Seconds to wait for the server to accept connections. Defaults to 120.
+
+        Raises:
+            TimeoutError: If the server does not come up in time
+            PermissionError: If the socket directory is not private to the current user
+        """
+        if self.is_available():
+            return
+        _prepare_socket_dir(self.socket_path)
+        socket_dir = os.path.dirname(os.path.abspath(self.socket_path))
+        with open(os.path.join(socket_dir, "render_server.lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.is_available():
+                return
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            cmd = [sys.executable, "-m", "src.core.render_server", "--socket", self.socket_path,
+                   "--idle_timeout", str(self.idle_timeout)]
+            if self.preload_tts:
+                cmd.append("--preload_tts")
+            with open(os.path.join(socket_dir, "render_server.log"), "a") as log:
+                subprocess.Popen(
+                    cmd,
+                    cwd=project_root,
+                    start_new_session=True,
+                    stdout=log,
+                    stderr=subprocess.STDOUT
+                )
+            deadline = time.monotonic() + startup_timeout
+            while time.monotonic() < deadline:
+                if self.is_available():
+                    return
+                time.sleep(0.2)
+        raise TimeoutError(f"Render server did not start on {self.socket_path} within {startup_timeout}s "
+                           f"(see {os.path.join(socket_dir, 'render_server.log')})")
+
+    async def run(self, args: List[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+                  cpu_time_limit: Optional[int] = None, memory_limit_mb: Optional[int] = None) -> subprocess.CompletedProcess:
+        """Render with the warm server.
+
+        Cancelling the awaiting task closes the connection, which kills the render.
+
+        Args:
+            args (List[str]): manim arguments without the leading "manim"
+            cwd (str, optional): Working directory for the render. Defaults to the caller's cwd.
+            timeout (float, optional): Seconds before the render is killed. Defaults to None.
+            cpu_time_limit (int, optional): RLIMIT_CPU for the render. Defaults to None.
+            memory_limit_mb (int, optional): RLIMIT_AS for the render in MB. Defaults to None.
+
+        Returns:
+            subprocess.CompletedProcess: Exit code and captured text output
+        """
+        request = {
+            "args": args,
+            "cwd": cwd or os.getcwd(),
+            "timeout": timeout,
+            "cpu_time_limit": cpu_time_limit,
+            "memory_limit_mb": memory_limit_mb,
+        }
+        if not self.is_available():
+            # The server shut down after being idle: start a new one
+            await asyncio.to_thread(self.ensure_server)
+        reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=2 ** 26)
+        try:
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        if not line:
+            return subprocess.CompletedProcess(["manim"] + args, -1, "", "Render server closed the connection without a result")
+        response = json.loads(line)
+        return subprocess.CompletedProcess(["manim"] + args, response["returncode"], response["stdout"], response["stderr"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm Manim render server")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="Unix socket path to listen on")
+    parser.add_argument("--preload_tts", action="store_true", help="Also load the Kokoro TTS model before forking")
+    parser.add_argument("--idle_timeout", type=float, default=None,
+                        help="Exit after this many seconds without requests (default: serve until killed)")
+    args = parser.parse_args()
+    RenderServer(socket_path=args.socket, preload_tts=args.preload_tts, idle_timeout=args.idle_timeout).serve_forever()
@@ -0,0 +1,118 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class StageScheduler:
+    """Bounded worker pools for the stages of the video generation pipeline.
+
+    Every scene moves through the stages on its own (plan -> code -> render -> combine),
+    and each stage has its own concurrency limit. Scene outlines (and the plugin detection
+    of a topic) run on a separate outline pool, so that a streamed outline never holds the
+    plan slot its early scene plans are waiting for. Because the pools are shared by all
+    topics handled by one VideoGenerator, scenes from different topics interleave: a
+    scene can be rendering while others are still waiting on planner or code LLM calls.
+    Renders themselves are bounded by the RenderExecutor, not by this scheduler.
+
+    Args:
+        plan_workers (int): Maximum concurrent planner LLM jobs
+        outline_workers (int, optional): Maximum concurrent scene outline jobs. Defaults to plan_workers.
+        code_workers (int): Maximum concurrent code generation / fix LLM jobs
+        combine_workers (int): Maximum concurrent ffmpeg combine jobs
+    """
+
+    STAGES = ("outline", "plan", "code", "combine")
+
+    def __init__(self, plan_workers: int = 1, code_workers: int = 1, combine_workers: int = 1,
+                 outline_workers: Optional[int] = None):
+        self.limits = {
+            "outline": max(1, outline_workers if outline_workers is not None else plan_workers),
+            "plan": max(1, plan_workers),
+            "code": max(1, code_workers),
+            "combine": max(1, combine_workers),
+        }
+        self._semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()}
+        self._stats = {
+            stage: {"active": 0, "waiting": 0, "completed": 0, "busy_seconds": 0.0, "wait_seconds": 0.0}
+            for stage in self.STAGES
+        }
+        self._start_time = time.monotonic()
+
+    @asynccontextmanager
+    async def slot(self, stage: str):
+        """Hold one worker slot of a stage for the duration of the block.
+
+        Args:
+            stage (str): One of STAGES
+        """
+        stats = self._stats[stage]
+        stats["waiting"] += 1
+        wait_start = time.monotonic()
+        async with self._semaphores[stage]:
+            stats["waiting"] -= 1
+            stats["active"] += 1
+            busy_start = time.monotonic()
+            stats["wait_seconds"] += busy_start - wait_start
+            try:
+                yield
+            finally:
+                stats["active"] -= 1
+                stats["completed"] += 1
+                stats["busy_seconds"] += time.monotonic() - busy_start
+
+    async def run(self, stage: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await a coroutine function inside a worker slot of the given stage.
+
+        Args:
+            stage (str): One of STAGES
+            func (Callable): Coroutine function to run
+
+        Returns:
+            Any: The coroutine's result
+        """
+        async with self.slot(stage):
+            return await func(*args, **kwargs)
+
+    async def run_in_thread(self, stage: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking function in a thread inside a worker slot of the given stage.
+
+        Args:
+            stage (str): One of STAGES
+            func (Callable): Blocking function to run
+
+        Returns:
+            Any: The function's result
+        """
+        async with self.slot(stage):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return per-stage counters and utilization.
+
+        Utilization is busy worker time divided by the available worker time since
+        the scheduler was created.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Stage name mapped to its counters
+        """
+        elapsed = max(time.monotonic() - self._start_time, 1e-9)
+        result = {}
+        for stage in self.STAGES:
+            stats = dict(self._stats[stage])
+            stats["workers"] = self.limits[stage]
+            stats["utilization"] = stats["busy_seconds"] / (elapsed * self.limits[stage])
+            result[stage] = stats
+        return result
+
+    def print_stats(self, title: Optional[str] = None) -> None:
+        """Print a table of the per-stage statistics.
+
+        Args:
+            title (str, optional): Heading printed above the table
+        """
+        print(f"\n{title or 'Pipeline stage statistics'}:")
+        print(f"{'Stage':<10} {'Workers':<8} {'Done':<8} {'Busy (s)':<10} {'Wait (s)':<10} {'Util':<8}")
+        for stage, stats in self.stats().items():
+            print(f"{stage:<10} {stats['workers']:<8} {stats['completed']:<8} "
+                  f"{stats['busy_seconds']:<10.1f} {stats['wait_seconds']:<10.1f} {stats['utilization']:<8.1%}")
@@ -2,8 +2,9 @@ import os
 import re
 import json
 import glob
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 import uuid
+import time
 import asyncio
 
 from mllm_tools.utils import _prepare_text_inputs
@@ -40,10 +41,12 @@ class VideoPlanner:
         manim_docs_path (str): Path to Manim docs. Defaults to "data/rag/manim_docs"
         embedding_model (str): Name of embedding model. Defaults to "text-embedding-ada-002"
         use_langfuse (bool): Whether to use Langfuse logging. Defaults to True
+        use_streaming (bool): Whether to stream the scene outline and report each scene as soon as it is complete. Defaults to False
     """
 
-    def __init__(self, planner_model, helper_model=None, output_dir="output", print_response=False, use_context_learning=False, context_learning_path="data/context_learning", use_rag=False, session_id=None, chroma_db_path="data/rag/chroma_db", manim_docs_path="data/rag/manim_docs", embedding_model="text-embedding-ada-002", use_langfuse=True):
+    def __init__(self, planner_model, helper_model=None, output_dir="output", print_response=False, use_context_learning=False, context_learning_path="data/context_learning", use_rag=False, session_id=None, chroma_db_path="data/rag/chroma_db", manim_docs_path="data/rag/manim_docs", embedding_model="text-embedding-ada-002", use_langfuse=True, use_streaming=False):
         self.planner_model = planner_model
+        self.use_streaming = use_streaming
         self.helper_model = helper_model if helper_model is not None else planner_model
         self.output_dir = output_dir
         self.print_response = print_response
@@ -67,7 +70,10 @@ class VideoPlanner:
                 use_langfuse=use_langfuse,
                 session_id=session_id
             )
-        self.relevant_plugins = []  # Initialize as an empty list
+        self.relevant_plugins = []  # Plugins of the topic detected last
+        # Plugins detected for each topic, so that scenes of different topics planned by one
+        # planner each use their own
+        self.topic_plugins: Dict[str, List[str]] = {}
 
     def _load_context_examples(self, example_type: str) -> str:
         """Load context learning examples of a specific type from files.
@@ -132,39 +138,56 @@ class VideoPlanner:
             return template(examples="\n".join(examples))
         return None
 
-    def generate_scene_outline(self,
+    async def generate_scene_outline(self,
                             topic: str,
                             description: str,
-                            session_id: str) -> str:
+                            session_id: str,
+                            on_scene: Optional[Callable[[int, str], None]] = None) -> str:
         """Generate a scene outline based on the topic and description.
 
         Args:
             topic (str): The topic of the video
             description (str): Description of the video content
             session_id (str): Session identifier
+            on_scene (Callable[[int, str], None], optional): Called once per scene with its number and
+                outline as soon as its closing tag is generated (with streaming), or else once the
+                outline is complete. Defaults to None.
 
         Returns:
             str: Generated scene outline
         """
         # Detect relevant plugins upfront if RAG is enabled
         if self.use_rag:
-            self.relevant_plugins = self.rag_integration.detect_relevant_plugins(topic, description) or []
-            self.rag_integration.set_relevant_plugins(self.relevant_plugins)
-            print(f"Detected relevant plugins: {self.relevant_plugins}")
+            await self.detect_topic_plugins(topic, description)
 
         prompt = get_prompt_scene_plan(topic, description)
         
         if self.use_context_learning and self.scene_plan_examples:
             prompt += f"\n\nHere are some example scene plans for reference:\n{self.scene_plan_examples}"
 
+        reported_scenes = set()
+
+        def report_complete_scenes(text: str) -> bool:
+            """Report scenes whose closing tag arrived; the stream can stop at the end of the outline."""
+            start = text.find("<SCENE_OUTLINE>")
+            if on_scene is not None and start != -1:
+                for match in re.finditer(r'<SCENE_(\d+)>(.*?)</SCENE_\1>', text[start:], re.DOTALL):
+                    if int(match.group(1)) not in reported_scenes:
+                        reported_scenes.add(int(match.group(1)))
+                        on_scene(int(match.group(1)), match.group(2))
+            return "</SCENE_OUTLINE>" in text
+
         # Generate plan using planner model
-        response_text = self.planner_model(
-            _prepare_text_inputs(prompt),
-            metadata={"generation_name": "scene_outline", "tags": [topic, "scene-outline"], "session_id": session_id}
-        )
+        metadata = {"generation_name": "scene_outline", "tags": [topic, "scene-outline"], "session_id": session_id}
+        if self.use_streaming and hasattr(self.planner_model, "astream"):
+            response_text = await self.planner_model.astream(_prepare_text_inputs(prompt), metadata=metadata, stop_when=report_complete_scenes)
+        else:
+            response_text = await self.planner_model.acall(_prepare_text_inputs(prompt), metadata=metadata)
         # extract scene outline <SCENE_OUTLINE> ... </SCENE_OUTLINE>
         scene_outline_match = re.search(r'(<SCENE_OUTLINE>.*?</SCENE_OUTLINE>)', response_text, re.DOTALL)
         scene_outline = scene_outline_match.group(1) if scene_outline_match else response_text
+        # Scenes not reported while streaming, e.g. because the response came from the cache
+        report_complete_scenes(response_text)
 
         # replace all spaces and special characters with underscores for file path compatibility
         file_prefix = topic.lower()
@@ -177,9 +200,51 @@ class VideoPlanner:
 
         return scene_outline
 
-    async def _generate_scene_implementation_single(self, topic: str, description: str, scene_outline_i: str, i: int, file_prefix: str, session_id: str, scene_trace_id: str) -> str:
+    async def detect_topic_plugins(self, topic: str, description: str) -> List[str]:
+        """Detect and remember the plugins relevant to a topic.
+
+        Args:
+            topic (str): The topic of the video
+            description (str): Description of the video content
+
+        Returns:
+            List[str]: Names of the relevant plugins
+        """
+        plugins = await self.rag_integration.detect_relevant_plugins(topic, description) or []
+        self.topic_plugins[topic] = plugins
+        self.relevant_plugins = plugins
+        self.rag_integration.set_relevant_plugins(plugins)
+        print(f"Detected relevant plugins: {plugins}")
+        return plugins
+
+    async def _timed(self, timings: List[Dict], origin: float, step: str, awaitable):
+        """Await a planning step and record when it started and finished relative to origin."""
+        started = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            finished = time.monotonic()
+            timings.append({"step": step, "start": round(started - origin, 3), "end": round(finished - origin, 3),
+                            "seconds": round(finished - started, 3)})
+
+    async def _retrieve_docs(self, timings: List[Dict], origin: float, step: str, generate_queries, scene_trace_id: str, topic: str, i: int) -> str:
+        """Generate the RAG queries of a planning step, then retrieve their documentation."""
+        rag_queries = await self._timed(timings, origin, f"{step}_rag_queries", generate_queries)
+        return await self._timed(timings, origin, f"{step}_retrieval", self.rag_integration.get_relevant_docs(
+            rag_queries=rag_queries,
+            scene_trace_id=scene_trace_id,
+            topic=topic,
+            scene_number=i
+        ))
+
+    async def _generate_scene_implementation_single(self, topic: str, description: str, scene_outline_i: str, i: int, file_prefix: str, session_id: str, scene_trace_id: str, relevant_plugins: Optional[List[str]] = None) -> str:
         """Generate implementation plan for a single scene.
 
+        The steps form a small dependency graph: the technical and the narration RAG queries
+        only need the storyboard, so both are generated and retrieved concurrently while the
+        technical plan is written; the narration plan then waits for the technical plan.
+        When and how long each step ran is saved to subplans/planning_timings.json.
+
         Args:
             topic (str): The topic of the video
             description (str): Description of the video content
@@ -188,10 +253,14 @@ class VideoPlanner:
             file_prefix (str): Prefix for output files
             session_id (str): Session identifier
             scene_trace_id (str): Unique trace ID for this scene
+            relevant_plugins (List[str], optional): Plugins relevant to the topic. Defaults to the
+                plugins detected for the topic.
 
         Returns:
             str: Generated implementation plan for the scene
         """
+        if relevant_plugins is None:
+            relevant_plugins = self.topic_plugins.get(topic, [])
         # Initialize empty implementation plan
         implementation_plan = ""
         scene_dir = os.path.join(self.output_dir, file_prefix, f"scene{i}")
@@ -205,127 +274,109 @@ class VideoPlanner:
             f.write(scene_trace_id)
         print(f"Scene trace ID saved to {trace_id_file}")
 
-        # ===== Step 1: Generate Scene Vision and Storyboard =====
-        # ===================================================
-        prompt_vision_storyboard = get_prompt_scene_vision_storyboard(i, topic, description, scene_outline_i, self.relevant_plugins)
+        timings: List[Dict] = []
+        origin = time.monotonic()
+        pending_retrievals = []
 
-        # Add vision storyboard examples only for this stage if available
-        if self.use_context_learning and self.vision_storyboard_examples:
-            prompt_vision_storyboard += f"\n\nHere are some example storyboards:\n{self.vision_storyboard_examples}"
-        
-        if self.rag_integration:
-            # Use the already detected plugins instead of detecting again
-            # relevant_plugins = self.relevant_plugins # Removed redundant variable
-            # print(f"Using detected plugins: {relevant_plugins}") # Removed redundant print
-
-            # Generate RAG queries
-            rag_queries = self.rag_integration._generate_rag_queries_storyboard(
-                scene_plan=scene_outline_i,
-                scene_trace_id=scene_trace_id,
-                topic=topic,
-                scene_number=i,
-                session_id=session_id,
-                relevant_plugins=self.relevant_plugins # Use self.relevant_plugins directly
-            )
+        try:
+            # ===== Step 1: Generate Scene Vision and Storyboard =====
+            # ===================================================
+            prompt_vision_storyboard = get_prompt_scene_vision_storyboard(i, topic, description, scene_outline_i, relevant_plugins)
 
-            retrieved_docs = self.rag_integration.get_relevant_docs(
-                rag_queries=rag_queries,
-                scene_trace_id=scene_trace_id,
-                topic=topic,
-                scene_number=i
-            )
+            # Add vision storyboard examples only for this stage if available
+            if self.use_context_learning and self.vision_storyboard_examples:
+                prompt_vision_storyboard += f"\n\nHere are some example storyboards:\n{self.vision_storyboard_examples}"
             
-            # Add documentation to prompt
-            prompt_vision_storyboard += f"\n\n{retrieved_docs}"
-
-        vision_storyboard_plan = self.planner_model(
-            _prepare_text_inputs(prompt_vision_storyboard),
-            metadata={"generation_name": "scene_vision_storyboard", "trace_id": scene_trace_id, "tags": [topic, f"scene{i}"], "session_id": session_id}
-        )
-        # extract vision storyboard plan <SCENE_VISION_STORYBOARD_PLAN> ... </SCENE_VISION_STORYBOARD_PLAN>
-        vision_match = re.search(r'(<SCENE_VISION_STORYBOARD_PLAN>.*?</SCENE_VISION_STORYBOARD_PLAN>)', vision_storyboard_plan, re.DOTALL)
-        vision_storyboard_plan = vision_match.group(1) if vision_match else vision_storyboard_plan
-        implementation_plan += vision_storyboard_plan + "\n\n"
-        file_path_vs = os.path.join(subplan_dir, f"{file_prefix}_scene{i}_vision_storyboard_plan.txt")
-        with open(file_path_vs, "w") as f:
-            f.write(vision_storyboard_plan)
-        print(f"Scene {i} Vision and Storyboard Plan saved to {file_path_vs}")
-
-        # ===== Step 2: Generate Technical Implementation Plan =====
-        # =========================================================
-        prompt_technical_implementation = get_prompt_scene_technical_implementation(i, topic, description, scene_outline_i, vision_storyboard_plan, self.relevant_plugins)
-
-        # Add technical implementation examples only for this stage if available
-        if self.use_context_learning and self.technical_implementation_examples:
-            prompt_technical_implementation += f"\n\nHere are some example technical implementations:\n{self.technical_implementation_examples}"
-
-        if self.rag_integration:
-            # Use the already detected plugins instead of detecting again
-            # relevant_plugins = self.relevant_plugins # Removed redundant variable
-            # print(f"Using detected plugins: {relevant_plugins}") # Removed redundant print
-
-            # Generate RAG queries
-            rag_queries = self.rag_integration._generate_rag_queries_technical(
-                storyboard=vision_storyboard_plan,
-                scene_trace_id=scene_trace_id,
-                topic=topic,
-                scene_number=i,
-                session_id=session_id,
-                relevant_plugins=self.relevant_plugins # Use self.relevant_plugins directly
-            )
-
-            retrieved_docs = self.rag_integration.get_relevant_docs(
-                rag_queries=rag_queries,
-                scene_trace_id=scene_trace_id,
-                topic=topic,
-                scene_number=i
-            )
-
-            # Add documentation to prompt
-            prompt_technical_implementation += f"\n\n{retrieved_docs}"
-
-        technical_implementation_plan = self.planner_model(
-            _prepare_text_inputs(prompt_technical_implementation),
-            metadata={"generation_name": "scene_technical_implementation", "trace_id": scene_trace_id, "tags": [topic, f"scene{i}"], "session_id": session_id}
-        )
-        # extract technical implementation plan <SCENE_TECHNICAL_IMPLEMENTATION_PLAN> ... </SCENE_TECHNICAL_IMPLEMENTATION_PLAN>
-        technical_match = re.search(r'(<SCENE_TECHNICAL_IMPLEMENTATION_PLAN>.*?</SCENE_TECHNICAL_IMPLEMENTATION_PLAN>)', technical_implementation_plan, re.DOTALL)
-        technical_implementation_plan = technical_match.group(1) if technical_match else technical_implementation_plan
-        implementation_plan += technical_implementation_plan + "\n\n"
-        file_path_ti = os.path.join(subplan_dir, f"{file_prefix}_scene{i}_technical_implementation_plan.txt")
-        with open(file_path_ti, "w") as f:
-            f.write(technical_implementation_plan)
-        print(f"Scene {i} Technical Implementation Plan saved to {file_path_ti}")
-       
-        # ===== Step 3: Generate Animation and Narration Plan =====
-        # =========================================================
-        prompt_animation_narration = get_prompt_scene_animation_narration(i, topic, description, scene_outline_i, vision_storyboard_plan, technical_implementation_plan, self.relevant_plugins)
-        
-        # Add animation narration examples only for this stage if available
-        if self.use_context_learning and self.animation_narration_examples:
-            prompt_animation_narration += f"\n\nHere are some example animation and narration plans:\n{self.animation_narration_examples}"
-        
-        if self.rag_integration:
-            rag_queries = self.rag_integration._generate_rag_queries_narration(
-                storyboard=vision_storyboard_plan,
-                scene_trace_id=scene_trace_id,
-                topic=topic,
-                scene_number=i,
-                session_id=session_id,
-                relevant_plugins=self.relevant_plugins # Use self.relevant_plugins directly
-            )
-            retrieved_docs = self.rag_integration.get_relevant_docs(
-                rag_queries=rag_queries,
-                scene_trace_id=scene_trace_id,
-                topic=topic,
-                scene_number=i
-            )
-            prompt_animation_narration += f"\n\n{retrieved_docs}"
-
-        animation_narration_plan = self.planner_model(
-            _prepare_text_inputs(prompt_animation_narration),
-            metadata={"generation_name": "scene_animation_narration", "trace_id": scene_trace_id, "tags": [topic, f"scene{i}"], "session_id": session_id}
-        )
+            if self.rag_integration:
+                retrieved_docs = await self._retrieve_docs(timings, origin, "storyboard", self.rag_integration._generate_rag_queries_storyboard(
+                    scene_plan=scene_outline_i,
+                    scene_trace_id=scene_trace_id,
+                    topic=topic,
+                    scene_number=i,
+                    session_id=session_id,
+                    relevant_plugins=relevant_plugins
+                ), scene_trace_id, topic, i)
+                
+                # Add documentation to prompt
+                prompt_vision_storyboard += f"\n\n{retrieved_docs}"
+
+            vision_storyboard_plan = await self._timed(timings, origin, "storyboard_plan", self.planner_model.acall(
+                _prepare_text_inputs(prompt_vision_storyboard),
+                metadata={"generation_name": "scene_vision_storyboard", "trace_id": scene_trace_id, "tags": [topic, f"scene{i}"], "session_id": session_id}
+            ))
+            # extract vision storyboard plan <SCENE_VISION_STORYBOARD_PLAN> ... </SCENE_VISION_STORYBOARD_PLAN>
+            vision_match = re.search(r'(<SCENE_VISION_STORYBOARD_PLAN>.*?</SCENE_VISION_STORYBOARD_PLAN>)', vision_storyboard_plan, re.DOTALL)
+            vision_storyboard_plan = vision_match.group(1) if vision_match else vision_storyboard_plan
+            implementation_plan += vision_storyboard_plan + "\n\n"
+            file_path_vs = os.path.join(subplan_dir, f"{file_prefix}_scene{i}_vision_storyboard_plan.txt")
+            with open(file_path_vs, "w") as f:
+                f.write(vision_storyboard_plan)
+            print(f"Scene {i} Vision and Storyboard Plan saved to {file_path_vs}")
+
+            # The technical and narration queries only depend on the storyboard, so both retrievals start now
+            if self.rag_integration:
+                technical_retrieval = asyncio.create_task(self._retrieve_docs(timings, origin, "technical", self.rag_integration._generate_rag_queries_technical(
+                    storyboard=vision_storyboard_plan,
+                    scene_trace_id=scene_trace_id,
+                    topic=topic,
+                    scene_number=i,
+                    session_id=session_id,
+                    relevant_plugins=relevant_plugins
+                ), scene_trace_id, topic, i))
+                narration_retrieval = asyncio.create_task(self._retrieve_docs(timings, origin, "narration", self.rag_integration._generate_rag_queries_narration(
+                    storyboard=vision_storyboard_plan,
+                    scene_trace_id=scene_trace_id,
+                    topic=topic,
+                    scene_number=i,
+                    session_id=session_id,
+                    relevant_plugins=relevant_plugins
+                ), scene_trace_id, topic, i))
+                pending_retrievals = [technical_retrieval, narration_retrieval]
+
+            # ===== Step 2: Generate Technical Implementation Plan =====
+            # =========================================================
+            prompt_technical_implementation = get_prompt_scene_technical_implementation(i, topic, description, scene_outline_i, vision_storyboard_plan, relevant_plugins)
+
+            # Add technical implementation examples only for this stage if available
+            if self.use_context_learning and self.technical_implementation_examples:
+                prompt_technical_implementation += f"\n\nHere are some example technical implementations:\n{self.technical_implementation_examples}"
+
+            if self.rag_integration:
+                # Add documentation to prompt
+                prompt_technical_implementation += f"\n\n{await technical_retrieval}"
+
+            technical_implementation_plan = await self._timed(timings, origin, "technical_plan", self.planner_model.acall(
+                _prepare_text_inputs(prompt_technical_implementation),
+                metadata={"generation_name": "scene_technical_implementation", "trace_id": scene_trace_id, "tags": [topic, f"scene{i}"], "session_id": session_id}
+            ))
+            # extract technical implementation plan <SCENE_TECHNICAL_IMPLEMENTATION_PLAN> ... </SCENE_TECHNICAL_IMPLEMENTATION_PLAN>
+            technical_match = re.search(r'(<SCENE_TECHNICAL_IMPLEMENTATION_PLAN>.*?</SCENE_TECHNICAL_IMPLEMENTATION_PLAN>)', technical_implementation_plan, re.DOTALL)
+            technical_implementation_plan = technical_match.group(1) if technical_match else technical_implementation_plan
+            implementation_plan += technical_implementation_plan + "\n\n"
+            file_path_ti = os.path.join(subplan_dir, f"{file_prefix}_scene{i}_technical_implementation_plan.txt")
+            with open(file_path_ti, "w") as f:
+                f.write(technical_implementation_plan)
+            print(f"Scene {i} Technical Implementation Plan saved to {file_path_ti}")
+           
+            # ===== Step 3: Generate Animation and Narration Plan =====
+            # =========================================================
+            prompt_animation_narration = get_prompt_scene_animation_narration(i, topic, description, scene_outline_i, vision_storyboard_plan, technical_implementation_plan, relevant_plugins)
+            
+            # Add animation narration examples only for this stage if available
+            if self.use_context_learning and self.animation_narration_examples:
+                prompt_animation_narration += f"\n\nHere are some example animation and narration plans:\n{self.animation_narration_examples}"
+            
+            if self.rag_integration:
+                prompt_animation_narration += f"\n\n{await narration_retrieval}"
+
+            animation_narration_plan = await self._timed(timings, origin, "narration_plan", self.planner_model.acall(
+                _prepare_text_inputs(prompt_animation_narration),
+                metadata={"generation_name": "scene_animation_narration", "trace_id": scene_trace_id, "tags": [topic, f"scene{i}"], "session_id": session_id}
+            ))
+        finally:
+            # A failed step abandons the retrievals still running
+            for task in pending_retrievals:
+                task.cancel()
         # extract animation narration plan <SCENE_ANIMATION_NARRATION_PLAN> ... </SCENE_ANIMATION_NARRATION_PLAN>
         animation_match = re.search(r'(<SCENE_ANIMATION_NARRATION_PLAN>.*?</SCENE_ANIMATION_NARRATION_PLAN>)', animation_narration_plan, re.DOTALL)
         animation_narration_plan = animation_match.group(1) if animation_match else animation_narration_plan
@@ -343,6 +394,17 @@ class VideoPlanner:
             f.write(implementation_plan)
         print(f"Scene {i} Implementation Plan saved to {file_path_ti}")
 
+        # Sum of the step durations is what the steps would take one after another
+        wall_clock = time.monotonic() - origin
+        sequential = sum(timing["seconds"] for timing in timings)
+        with open(os.path.join(subplan_dir, "planning_timings.json"), "w") as f:
+            json.dump({
+                "wall_clock_seconds": round(wall_clock, 3),
+                "sequential_seconds": round(sequential, 3),
+                "steps": sorted(timings, key=lambda timing: timing["start"])
+            }, f, indent=2)
+        print(f"Scene {i} planned in {wall_clock:.1f}s ({sequential:.1f}s of steps)")
+
         return implementation_plan
 
     async def generate_scene_implementation(self,
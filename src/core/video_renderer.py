@@ -6,30 +6,107 @@ from PIL import Image
 from typing import Optional, List
 import traceback
 import sys
+from contextlib import nullcontext
 
 from src.core.parse_video import (
     get_images_from_video,
     image_with_most_non_black_space
 )
-from mllm_tools.vertex_ai import VertexAIWrapper
-from mllm_tools.gemini import GeminiWrapper
+from src.core.render_executor import RenderExecutor
+
+# manim flags for each render quality tier, and the folder manim writes the video to
+RENDER_QUALITY_FLAGS = {
+    "dry_run": ["-ql", "--dry_run"],
+    "low": ["-ql"],
+    "medium": ["-qm"],
+    "high": ["-qh"],
+    "production": ["-qp"],
+    "4k": ["-qk"],
+}
+RENDER_QUALITY_FOLDERS = {
+    "dry_run": None,
+    "low": "480p15",
+    "medium": "720p30",
+    "high": "1080p60",
+    "production": "1440p60",
+    "4k": "2160p60",
+}
 
 class VideoRenderer:
     """Class for rendering and combining Manim animation videos."""
 
-    def __init__(self, output_dir="output", print_response=False, use_visual_fix_code=False):
+    def __init__(self, output_dir="output", print_response=False, use_visual_fix_code=False, scheduler=None, render_executor=None,
+                 validate_quality="low", visual_quality="low", final_quality="high", video_input=False):
         """Initialize the VideoRenderer.
 
+        Every code version is first rendered at validate_quality to find errors cheaply.
+        Only a version that passes (and, with visual fix code, is accepted by the reviewer)
+        is rendered again at final_quality.
+
         Args:
             output_dir (str, optional): Directory for output files. Defaults to "output".
             print_response (bool, optional): Whether to print responses. Defaults to False.
             use_visual_fix_code (bool, optional): Whether to use visual fix code. Defaults to False.
+            scheduler (StageScheduler, optional): Stage pools used to bound LLM calls. Defaults to None.
+            render_executor (RenderExecutor, optional): Worker pool that runs manim. Defaults to a pool with one worker per core.
+            validate_quality (str, optional): Tier used to check each version for errors. Defaults to "low".
+            visual_quality (str, optional): Tier rendered for visual self-reflection. Defaults to "low", which reuses the validation render.
+            final_quality (str, optional): Tier of the video kept for combining. Defaults to "high".
+            video_input (bool, optional): Whether visual self-reflection takes the rendered video instead of
+                a snapshot. Defaults to False.
         """
+        for quality in (validate_quality, visual_quality, final_quality):
+            if quality not in RENDER_QUALITY_FLAGS:
+                raise ValueError(f"Unknown render quality '{quality}', expected one of {list(RENDER_QUALITY_FLAGS)}")
+        if RENDER_QUALITY_FOLDERS[visual_quality] is None or RENDER_QUALITY_FOLDERS[final_quality] is None:
+            raise ValueError("visual_quality and final_quality must produce a video")
         self.output_dir = output_dir
         self.print_response = print_response
         self.use_visual_fix_code = use_visual_fix_code
+        self.scheduler = scheduler
+        self.render_executor = render_executor if render_executor is not None else RenderExecutor()
+        self.validate_quality = validate_quality
+        self.visual_quality = visual_quality
+        self.final_quality = final_quality
+        self.video_input = video_input
+
+    def _stage_slot(self, stage: str):
+        """Return a context manager holding a worker slot of the given stage, if a scheduler is set.
+
+        Args:
+            stage (str): Pipeline stage name
+
+        Returns:
+            An async context manager
+        """
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(stage)
 
-    async def render_scene(self, code: str, file_prefix: str, curr_scene: int, curr_version: int, code_dir: str, media_dir: str, max_retries: int = 3, use_visual_fix_code=False, visual_self_reflection_func=None, banned_reasonings=None, scene_trace_id=None, topic=None, session_id=None):
+    async def _render(self, file_path: str, media_dir: str, quality: str, priority: int = 0) -> None:
+        """Render a scene file at the given quality tier on the render pool.
+
+        Args:
+            file_path (str): Scene code file
+            media_dir (str): Directory for media output
+            quality (str): Key of RENDER_QUALITY_FLAGS
+            priority (int, optional): Render queue priority, lower runs first. Defaults to 0.
+
+        Raises:
+            Exception: With manim's stderr if the render fails
+        """
+        result = await self.render_executor.submit(
+            ["manim", *RENDER_QUALITY_FLAGS[quality], file_path, "--media_dir", media_dir, "--progress_bar", "none"],
+            priority=priority
+        )
+        if result.returncode != 0:
+            raise Exception(result.stderr)
+
+    def _scene_video_folder(self, media_dir: str, file_prefix: str, scene_number: int, version_number: int, quality: str) -> str:
+        """Return the folder manim writes a scene version's video to at the given quality."""
+        return os.path.join(media_dir, "videos", f"{file_prefix}_scene{scene_number}_v{version_number}", RENDER_QUALITY_FOLDERS[quality])
+
+    async def render_scene(self, code: str, file_prefix: str, curr_scene: int, curr_version: int, code_dir: str, media_dir: str, max_retries: int = 3, use_visual_fix_code=False, visual_self_reflection_func=None, banned_reasonings=None, scene_trace_id=None, topic=None, session_id=None, priority: int = 0, version_step: int = 1):
         """Render a single scene and handle error retries and visual fixes.
 
         Args:
@@ -46,52 +123,50 @@ class VideoRenderer:
             scene_trace_id (str, optional): Scene trace identifier. Defaults to None.
             topic (str, optional): Topic name. Defaults to None.
             session_id (str, optional): Session identifier. Defaults to None.
+            priority (int, optional): Render queue priority, lower runs first. Defaults to 0.
+            version_step (int, optional): Increment between code versions written by visual fixes. Defaults to 1.
 
         Returns:
-            tuple: (code, error_message) where error_message is None on success
+            tuple: (code, error_message, version) where error_message is None on success and version is
+                the last code version rendered, which visual fixes may have advanced past curr_version
         """
         retries = 0
+        rendered_quality = None
         while retries < max_retries:
             try:
-                # Execute manim in a thread to prevent blocking
+                # Execute manim on the render pool, separate from LLM concurrency.
+                # A cheap validation pass finds errors before paying for the final quality render;
+                # if it fails, the code and the error message go back to the fix loop.
                 file_path = os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py")
-                result = await asyncio.to_thread(
-                    subprocess.run,
-                    ["manim", "-qh", file_path, "--media_dir", media_dir, "--progress_bar", "none"],
-                    capture_output=True,
-                    text=True
-                )
-
-                # if result.returncode != 0, it means that the code is not rendered successfully
-                # so we need to fix the code by returning the code and the error message
-                if result.returncode != 0:
-                    raise Exception(result.stderr)
+                await self._render(file_path, media_dir, self.validate_quality, priority)
+                rendered_quality = self.validate_quality
 
                 if use_visual_fix_code and visual_self_reflection_func and banned_reasonings:
-                    # Get the rendered video path
-                    video_path = os.path.join(
-                        media_dir,
-                        "videos",
-                        f"{file_prefix}_scene{curr_scene}_v{curr_version}.mp4"
-                    )
-                    
-                    # For Gemini/Vertex AI models, pass the video directly
-                    if self.scene_model.model_name.startswith(('gemini/', 'vertex_ai/')):
-                        media_input = video_path
+                    # Reuse the validation render when it is already at the visual tier
+                    if rendered_quality != self.visual_quality:
+                        await self._render(file_path, media_dir, self.visual_quality, priority)
+                        rendered_quality = self.visual_quality
+                    video_folder = self._scene_video_folder(media_dir, file_prefix, curr_scene, curr_version, self.visual_quality)
+
+                    # For models that accept video, pass the video directly
+                    if self.video_input:
+                        video_files = [f for f in os.listdir(video_folder) if f.endswith('.mp4')]
+                        media_input = os.path.join(video_folder, video_files[0])
                     else:
                         # For other models, use image snapshot
                         media_input = self.create_snapshot_scene(
-                            topic, curr_scene, curr_version, return_type="path"
+                            topic, curr_scene, curr_version, return_type="path", quality=self.visual_quality
                         )
                         
-                    new_code, log = visual_self_reflection_func(
-                        code,
-                        media_input,
-                        scene_trace_id=scene_trace_id,
-                        topic=topic,
-                        scene_number=curr_scene,
-                        session_id=session_id
-                    )
+                    async with self._stage_slot("code"):
+                        new_code, log = await visual_self_reflection_func(
+                            code,
+                            media_input,
+                            scene_trace_id=scene_trace_id,
+                            topic=topic,
+                            scene_number=curr_scene,
+                            session_id=session_id
+                        )
 
                     with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_vfix_log.txt"), "w") as f:
                         f.write(log)
@@ -101,7 +176,7 @@ class VideoRenderer:
                         break
 
                     code = new_code
-                    curr_version += 1
+                    curr_version += version_step
                     with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}.py"), "w") as f:
                         f.write(code)
                     print(f"Code saved to scene{curr_scene}/code/{file_prefix}_scene{curr_scene}_v{curr_version}.py")
@@ -117,13 +192,23 @@ class VideoRenderer:
                 with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_error.log"), "a") as f:
                     f.write(f"\nError in attempt {retries}:\n{str(e)}\n")
                 retries += 1
-                return code, str(e) # Indicate failure and return error message
-            
+                return code, str(e), curr_version # Indicate failure and return error message
+
+        # Full quality render only for the version that passed
+        if rendered_quality != self.final_quality:
+            try:
+                await self._render(file_path, media_dir, self.final_quality, priority)
+            except Exception as e:
+                print(f"Error: {e}")
+                with open(os.path.join(code_dir, f"{file_prefix}_scene{curr_scene}_v{curr_version}_error.log"), "a") as f:
+                    f.write(f"\nError in final quality render:\n{str(e)}\n")
+                return code, str(e), curr_version
+
         print(f"Successfully rendered {file_path}")
         with open(os.path.join(self.output_dir, file_prefix, f"scene{curr_scene}", "succ_rendered.txt"), "w") as f:
             f.write("")
 
-        return code, None # Indicate success
+        return code, None, curr_version # Indicate success
 
     def run_manim_process(self,
                           topic: str):
@@ -154,8 +239,7 @@ class VideoRenderer:
                 try:
                     media_dir = os.path.join(self.output_dir, file_prefix, "media")
                     result = subprocess.run(
-                        f"manim -qh {file_path} --media_dir {media_dir}",
-                        shell=True,
+                        ["manim", *RENDER_QUALITY_FLAGS[self.final_quality], file_path, "--media_dir", media_dir],
                         capture_output=True,
                         text=True
                     )
@@ -171,7 +255,7 @@ class VideoRenderer:
                     print(f"Error log saved to {error_log_path}")
         return result
 
-    def create_snapshot_scene(self, topic: str, scene_number: int, version_number: int, return_type: str = "image"):
+    def create_snapshot_scene(self, topic: str, scene_number: int, version_number: int, return_type: str = "image", quality: Optional[str] = None):
         """Create a snapshot of the video for a specific topic and scene.
 
         Args:
@@ -179,6 +263,7 @@ class VideoRenderer:
             scene_number (int): Scene number
             version_number (int): Version number
             return_type (str, optional): Type of return value - "path" or "image". Defaults to "image".
+            quality (str, optional): Render tier of the video to use. Defaults to the final quality.
 
         Returns:
             Union[str, PIL.Image]: Path to saved image or PIL Image object
@@ -188,8 +273,8 @@ class VideoRenderer:
         """
         file_prefix = topic.lower()
         file_prefix = re.sub(r'[^a-z0-9_]+', '_', file_prefix)
-        search_path = os.path.join(self.output_dir, file_prefix)
-        video_folder_path = os.path.join(search_path, "media", "videos", f"{file_prefix}_scene{scene_number}_v{version_number}", "1080p60")
+        media_dir = os.path.join(self.output_dir, file_prefix, "media")
+        video_folder_path = self._scene_video_folder(media_dir, file_prefix, scene_number, version_number, quality or self.final_quality)
         os.makedirs(video_folder_path, exist_ok=True)
         snapshot_path = os.path.join(video_folder_path, "snapshot.png")
         # Get the mp4 video file from the video folder path
@@ -246,9 +331,13 @@ class VideoRenderer:
 
         scene_videos = []
         scene_subtitles = []
+        quality_folder = RENDER_QUALITY_FOLDERS[self.final_quality]
 
         for scene_num in range(1, scene_count + 1):
-            folders = [f for f in scene_folders if int(f.split("scene")[-1].split("_")[0]) == scene_num]
+            # Versions that only got a preview render, or whose render was cancelled, have no final video
+            folders = [f for f in scene_folders
+                       if int(f.split("scene")[-1].split("_")[0]) == scene_num and os.path.isdir(os.path.join(f, quality_folder))
+                       and any(name.endswith('.mp4') for name in os.listdir(os.path.join(f, quality_folder)))]
             if not folders:
                 print(f"Warning: Missing scene {scene_num}")
                 continue
@@ -258,12 +347,12 @@ class VideoRenderer:
 
             video_found = False
             subtitles_found = False
-            for filename in os.listdir(os.path.join(folder, "1080p60")):
+            for filename in os.listdir(os.path.join(folder, quality_folder)):
                 if filename.endswith('.mp4'):
-                    scene_videos.append(os.path.join(folder, "1080p60", filename))
+                    scene_videos.append(os.path.join(folder, quality_folder, filename))
                     video_found = True
                 elif filename.endswith('.srt'):
-                    scene_subtitles.append(os.path.join(folder, "1080p60", filename))
+                    scene_subtitles.append(os.path.join(folder, quality_folder, filename))
                     subtitles_found = True
 
             if not video_found:
@@ -0,0 +1,242 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL UNIQUE,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used_at);
+"""
+
+
+class EmbeddingCache:
+    """On-disk cache of the query embeddings of one embedding model, shared by all threads and processes.
+
+    Vectors are stored in the rows of a memory-mapped matrix next to a SQLite index that maps
+    the sha256 of a text to its row. Once max_entries rows are in use, the least recently used
+    row is overwritten. The matrix is only read or written inside an IMMEDIATE transaction on
+    the index, so a process never reads a row while another one reuses it.
+
+    Args:
+        cache_dir (str): Directory of the cache files
+        embedding_model (str): Name of the embedding model whose vectors are cached
+        max_entries (int, optional): Number of rows of the matrix. Fixed when the cache is
+            created. Defaults to 20000.
+        dtype (str, optional): "float32", or "float16" to halve the size. Defaults to "float32".
+    """
+
+    def __init__(self, cache_dir: str, embedding_model: str, max_entries: int = 20000, dtype: str = "float32"):
+        self.embedding_model = embedding_model
+        self.dtype = np.dtype(dtype)
+        os.makedirs(cache_dir, exist_ok=True)
+        name = f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', embedding_model)}_{self.dtype.name}"
+        self.matrix_path = os.path.join(cache_dir, f"{name}.bin")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, f"{name}.sqlite"), timeout=60,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('max_entries', ?)", (str(max_entries),))
+        self.max_entries = int(self._conn.execute("SELECT value FROM meta WHERE key = 'max_entries'").fetchone()[0])
+        if self.max_entries != max_entries:
+            print(f"Embedding cache {self.matrix_path} was created with {self.max_entries} entries; keeping that size")
+        self._matrix: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.requests = 0
+        self.requests_saved = 0
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _open_matrix(self, dimension: Optional[int] = None) -> Optional[np.memmap]:
+        """Map the matrix, creating it for the given dimension if needed. Called inside a transaction."""
+        if self._matrix is not None:
+            return self._matrix
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dimension'").fetchone()
+        if row is None:
+            if dimension is None:
+                return None
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('dimension', ?)", (str(dimension),))
+            mode = "w+"
+        else:
+            dimension = int(row[0])
+            mode = "r+" if os.path.exists(self.matrix_path) else "w+"
+        self._matrix = np.memmap(self.matrix_path, dtype=self.dtype, mode=mode, shape=(self.max_entries, dimension))
+        return self._matrix
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector of each text, or None for texts not in the cache, and mark the hits as recently used."""
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                matrix = self._open_matrix()
+                if matrix is not None:
+                    now = time.time()
+                    for i, key in enumerate(keys):
+                        row = self._conn.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                        if row is not None:
+                            vectors[i] = np.array(matrix[row[0]], dtype=np.float32)
+                            self._conn.execute("UPDATE entries SET last_used_at = ? WHERE key = ?", (now, key))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Store vectors, overwriting the least recently used rows once the cache is full."""
+        if not texts:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                matrix = self._open_matrix(len(vectors[0]))
+                if matrix.shape[1] != len(vectors[0]):
+                    print(f"Embedding cache {self.matrix_path} holds vectors of dimension {matrix.shape[1]}, "
+                          f"not {len(vectors[0])}; not caching")
+                    texts = []
+                now = time.time()
+                for text, vector in zip(texts, vectors):
+                    key = self._key(text)
+                    if self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                        continue
+                    used = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                    if used < self.max_entries:
+                        slot = used
+                    else:
+                        victim, slot = self._conn.execute("SELECT key, slot FROM entries ORDER BY last_used_at LIMIT 1").fetchone()
+                        self._conn.execute("DELETE FROM entries WHERE key = ?", (victim,))
+                        self.evictions += 1
+                    matrix[slot] = vector
+                    self._conn.execute("INSERT INTO entries (key, slot, last_used_at) VALUES (?, ?, ?)", (key, slot, now))
+                    self.writes += 1
+                matrix.flush()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def record_request(self, saved: bool) -> None:
+        """Count an embedding call, saved if the cache answered all of its texts."""
+        with self._lock:
+            self.requests += 1
+            self.requests_saved += saved
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, the embedding requests saved and the number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "requests": self.requests,
+            "requests_saved": self.requests_saved,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+    def print_stats(self) -> None:
+        """Print hit/miss counters, the embedding requests saved and the number of entries."""
+        stats = self.stats()
+        print(f"\nEmbedding cache ({self.embedding_model}): {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%}), {stats['requests_saved']}/{stats['requests']} embedding requests saved, "
+              f"{stats['evictions']} evictions, {stats['entries']}/{self.max_entries} entries")
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings answered from an EmbeddingCache where possible; the missing texts are embedded in one request.
+
+    Args:
+        embeddings (Embeddings): Embedding function computing the vectors missing from the cache
+        cache (EmbeddingCache, optional): The cache; without one every text is embedded
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: Optional[EmbeddingCache]):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents_counted(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        """Embed texts and return the vectors with the number of embedding requests made (0 or 1)."""
+        if not texts:
+            return [], 0
+        if self.cache is None:
+            return self.embeddings.embed_documents(texts), 1
+        cached = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        computed = {}
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(missing, [computed[text] for text in missing])
+        self.cache.record_request(saved=not missing)
+        vectors = [vector.tolist() if vector is not None else computed[text] for text, vector in zip(texts, cached)]
+        return vectors, 1 if missing else 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents_counted(texts)[0]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# Process-wide cache settings and the caches opened under them, keyed by embedding model
+_cache_settings: Optional[Dict[str, Any]] = None
+_caches: Dict[str, EmbeddingCache] = {}
+_registry_lock = threading.Lock()
+
+
+def configure_embedding_cache(cache_dir: Optional[str], max_entries: int = 20000, dtype: str = "float32") -> None:
+    """Enable the query embedding cache for every documentation store in this process, or disable it with cache_dir=None.
+
+    Args:
+        cache_dir (str, optional): Directory of the cache files
+        max_entries (int, optional): Vectors kept per embedding model. Defaults to 20000.
+        dtype (str, optional): Storage type of the vectors, "float32" or "float16". Defaults to "float32".
+    """
+    global _cache_settings
+    with _registry_lock:
+        _cache_settings = {"cache_dir": cache_dir, "max_entries": max_entries, "dtype": dtype} if cache_dir else None
+        _caches.clear()
+
+
+def get_embedding_cache(embedding_model: str) -> Optional[EmbeddingCache]:
+    """Return the shared cache of an embedding model, or None if caching is disabled."""
+    with _registry_lock:
+        if _cache_settings is None:
+            return None
+        if embedding_model not in _caches:
+            _caches[embedding_model] = EmbeddingCache(embedding_model=embedding_model, **_cache_settings)
+        return _caches[embedding_model]
+
+
+def print_embedding_cache_stats() -> None:
+    """Print the stats of every embedding cache used in this process."""
+    with _registry_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.print_stats()
@@ -0,0 +1,230 @@
+import os
+import json
+import hashlib
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Rows read from Chroma per request when exporting a collection
+_EXPORT_BATCH = 4000
+_KMEANS_ITERATIONS = 20
+
+
+def collection_fingerprint(collection, store_path: str) -> str:
+    """Return a hash identifying the contents of a Chroma collection.
+
+    Uses the manifest written by the incremental indexer when there is one, since it changes
+    with every sync that changes the collection, and the sorted chunk IDs otherwise.
+    """
+    manifest_path = os.path.join(store_path, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    ids = sorted(collection.get(include=[])["ids"])
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_lists: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster normalized vectors by cosine similarity; returns the centroids and the list of each vector."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(_KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = vectors[assignments == i]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+            else:
+                # Re-seed an empty list with a random vector
+                centroids[i] = vectors[rng.integers(len(vectors))]
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class NumpyIndex:
+    """In-process search index over the chunks of a Chroma collection.
+
+    The embeddings are stored L2-normalized in a memory-mapped .npy matrix, next to their
+    norms and the text and source of every chunk. All queries of a search are scored with
+    one matrix product, and the top k rows are picked with argpartition. Distances are
+    computed in the space of the Chroma collection (squared L2, cosine or inner product), so
+    the relevance function of the Chroma store gives the same scores as a Chroma query.
+
+    With n_lists > 0 the rows are also partitioned into inverted lists by spherical k-means;
+    a query then only scores the rows of its n_probes nearest lists.
+
+    The index is a snapshot of the collection, rebuilt when the collection fingerprint changes.
+
+    Args:
+        index_path (str): Directory of the index files
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        with open(os.path.join(index_path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_path, "rows.json"), "r") as f:
+            rows = json.load(f)
+        self.ids: List[str] = rows["ids"]
+        self.documents: List[str] = rows["documents"]
+        self.sources: List[str] = rows["sources"]
+        self.space = self.meta["space"]
+        if self.ids:
+            self.vectors = np.load(os.path.join(index_path, "vectors.npy"), mmap_mode="r")
+            self.norms = np.load(os.path.join(index_path, "norms.npy"))
+        else:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+            self.norms = np.zeros(0, dtype=np.float32)
+        self.centroids = None
+        if self.meta.get("n_lists"):
+            self.centroids = np.load(os.path.join(index_path, "ivf_centroids.npy"))
+            self.list_order = np.load(os.path.join(index_path, "ivf_order.npy"))
+            self.list_offsets = np.load(os.path.join(index_path, "ivf_offsets.npy"))
+
+    @classmethod
+    def build(cls, collection, index_path: str, fingerprint: str, n_lists: int = 0) -> "NumpyIndex":
+        """Export a Chroma collection into a new index.
+
+        Args:
+            collection: The Chroma collection
+            index_path (str): Directory of the index files
+            fingerprint (str): Fingerprint of the collection contents
+            n_lists (int, optional): Number of inverted lists; 0 searches all rows. Defaults to 0.
+
+        Returns:
+            NumpyIndex: The loaded index
+        """
+        os.makedirs(index_path, exist_ok=True)
+        ids = collection.get(include=[])["ids"]
+        rows = {"ids": [], "documents": [], "sources": []}
+        vectors = None
+        for start in range(0, len(ids), _EXPORT_BATCH):
+            batch = collection.get(ids=ids[start:start + _EXPORT_BATCH], include=["embeddings", "documents", "metadatas"])
+            embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(index_path, "vectors.npy"), mode="w+",
+                                                    dtype=np.float32, shape=(len(ids), embeddings.shape[1]))
+                norms = np.zeros(len(ids), dtype=np.float32)
+            end = len(rows["ids"]) + len(embeddings)
+            norms[len(rows["ids"]):end] = np.linalg.norm(embeddings, axis=1)
+            vectors[len(rows["ids"]):end] = embeddings / np.maximum(norms[len(rows["ids"]):end, None], 1e-12)
+            rows["ids"].extend(batch["ids"])
+            rows["documents"].extend(batch["documents"])
+            rows["sources"].extend(metadata.get("source", "") for metadata in batch["metadatas"])
+
+        n_lists = min(n_lists, len(rows["ids"]))
+        if vectors is not None:
+            vectors.flush()
+            np.save(os.path.join(index_path, "norms.npy"), norms)
+            if n_lists:
+                centroids, assignments = _spherical_kmeans(np.asarray(vectors), n_lists)
+                order = np.argsort(assignments, kind="stable")
+                offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+                np.save(os.path.join(index_path, "ivf_centroids.npy"), centroids)
+                np.save(os.path.join(index_path, "ivf_order.npy"), order)
+                np.save(os.path.join(index_path, "ivf_offsets.npy"), offsets)
+        with open(os.path.join(index_path, "rows.json"), "w") as f:
+            json.dump(rows, f)
+        meta = {
+            "fingerprint": fingerprint,
+            "space": (collection.metadata or {}).get("hnsw:space", "l2"),
+            "n_lists": n_lists if vectors is not None else 0,
+        }
+        # The meta file is written last, so an interrupted build is never loaded
+        with open(os.path.join(index_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return cls(index_path)
+
+    @classmethod
+    def load_or_build(cls, collection, store_path: str, n_lists: int = 0) -> "NumpyIndex":
+        """Load the index of a Chroma store, rebuilding it if the collection or n_lists changed.
+
+        Args:
+            collection: The Chroma collection
+            store_path (str): Persist directory of the Chroma store; the index lives in its numpy_index folder
+            n_lists (int, optional): Number of inverted lists; 0 searches all rows. Defaults to 0.
+
+        Returns:
+            NumpyIndex: The up-to-date index
+        """
+        index_path = os.path.join(store_path, "numpy_index")
+        fingerprint = collection_fingerprint(collection, store_path)
+        meta_path = os.path.join(index_path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["fingerprint"] == fingerprint and meta["n_lists"] == min(n_lists, collection.count()):
+                return cls(index_path)
+            os.remove(meta_path)
+        print(f"Building NumPy index of {collection.name} ({collection.count()} chunks)")
+        return cls.build(collection, index_path, fingerprint, n_lists)
+
+    def _distances(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the distances of the queries to the given rows (all rows by default) in the collection's space."""
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        norms = self.norms if rows is None else self.norms[rows]
+        query_norms = np.linalg.norm(queries, axis=1)
+        cosine = (queries / np.maximum(query_norms[:, None], 1e-12)) @ vectors.T
+        if self.space == "cosine":
+            return 1.0 - cosine
+        dot = cosine * query_norms[:, None] * norms[None, :]
+        if self.space == "ip":
+            return 1.0 - dot
+        return query_norms[:, None] ** 2 + norms[None, :] ** 2 - 2.0 * dot
+
+    @staticmethod
+    def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+        """Return the column indices of the k smallest distances of each row, nearest first."""
+        k = min(k, distances.shape[1])
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        return np.take_along_axis(nearest, order, axis=1)
+
+    def search(self, query_embeddings: List[List[float]], k: int, relevance_score: Callable[[float], float],
+               score_threshold: float = 0.5, n_probes: int = 8) -> List[List[Tuple[str, str, float]]]:
+        """Find the k nearest chunks of each query.
+
+        Args:
+            query_embeddings (List[List[float]]): Query vectors
+            k (int): Number of results per query
+            relevance_score (Callable[[float], float]): Converts a distance into a relevance score,
+                e.g. the relevance function of the Chroma store
+            score_threshold (float, optional): Minimum relevance score. Defaults to 0.5.
+            n_probes (int, optional): Inverted lists searched per query if the index has them. Defaults to 8.
+
+        Returns:
+            List[List[Tuple[str, str, float]]]: For each query, (content, source, score) of its
+                results, best first
+        """
+        if not query_embeddings:
+            return []
+        if not self.ids or k <= 0:
+            return [[] for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.centroids is None:
+            distances = self._distances(queries)
+            nearest = self._top_k(distances, k)
+            candidates = [(row_indices, row_distances[row_indices])
+                          for row_indices, row_distances in zip(nearest, distances)]
+        else:
+            probes = self._top_k(-(queries @ self.centroids.T), n_probes)
+            candidates = []
+            for query, lists in zip(queries, probes):
+                rows = np.concatenate([self.list_order[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists])
+                if not len(rows):
+                    candidates.append((rows, np.zeros(0)))
+                    continue
+                distances = self._distances(query[None, :], rows)
+                nearest = self._top_k(distances, k)[0]
+                candidates.append((rows[nearest], distances[0, nearest]))
+
+        results = []
+        for row_indices, row_distances in candidates:
+            query_results = []
+            for row, distance in zip(row_indices, row_distances):
+                score = relevance_score(float(distance))
+                if score >= score_threshold:
+                    query_results.append((self.documents[row], self.sources[row], score))
+            results.append(query_results)
+        return results
@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import asyncio
 from typing import List, Dict
 
 from mllm_tools.utils import _prepare_text_inputs
@@ -12,7 +13,8 @@ from task_generator import (
     get_prompt_rag_query_generation_narration,
     get_prompt_rag_query_generation_code
 )
-from src.rag.vector_store import RAGVectorStore
+from src.rag.vector_store import get_vector_store
+from src.core.error_distiller import distill_error, error_cache_key
 
 class RAGIntegration:
     """Class for integrating RAG (Retrieval Augmented Generation) functionality.
@@ -37,11 +39,10 @@ class RAGIntegration:
         self.session_id = session_id
         self.relevant_plugins = None
 
-        self.vector_store = RAGVectorStore(
+        self.vector_store = get_vector_store(
             chroma_db_path=chroma_db_path,
             manim_docs_path=manim_docs_path,
             embedding_model=embedding_model,
-            session_id=self.session_id,
             use_langfuse=use_langfuse,
             helper_model=helper_model
         )
@@ -54,7 +55,7 @@ class RAGIntegration:
         """
         self.relevant_plugins = plugins
 
-    def detect_relevant_plugins(self, topic: str, description: str) -> List[str]:
+    async def detect_relevant_plugins(self, topic: str, description: str) -> List[str]:
         """Detect which plugins might be relevant based on topic and description.
 
         Args:
@@ -77,7 +78,7 @@ class RAGIntegration:
         )
 
         try:
-            response = self.helper_model(
+            response = await self.helper_model.acall(
                 _prepare_text_inputs(prompt),
                 metadata={"generation_name": "detect-relevant-plugins", "tags": [topic, "plugin-detection"], "session_id": self.session_id}
             )
@@ -118,7 +119,7 @@ class RAGIntegration:
             print(f"Error loading plugin descriptions: {e}")
             return []
 
-    def _generate_rag_queries_storyboard(self, scene_plan: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
+    async def _generate_rag_queries_storyboard(self, scene_plan: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
         """Generate RAG queries from the scene plan to help create storyboard.
 
         Args:
@@ -150,7 +151,7 @@ class RAGIntegration:
             relevant_plugins=plugins_str
         )
         
-        queries = self.helper_model(
+        queries = await self.helper_model.acall(
             _prepare_text_inputs(prompt),
             metadata={"generation_name": "rag_query_generation_storyboard", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
         )
@@ -171,7 +172,7 @@ class RAGIntegration:
 
         return queries
 
-    def _generate_rag_queries_technical(self, storyboard: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
+    async def _generate_rag_queries_technical(self, storyboard: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
         """Generate RAG queries from the storyboard to help create technical implementation.
 
         Args:
@@ -199,7 +200,7 @@ class RAGIntegration:
             relevant_plugins=", ".join(relevant_plugins) if relevant_plugins else "No plugins are relevant."
         )
         
-        queries = self.helper_model(
+        queries = await self.helper_model.acall(
             _prepare_text_inputs(prompt),
             metadata={"generation_name": "rag_query_generation_technical", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
         )
@@ -218,7 +219,7 @@ class RAGIntegration:
 
         return queries
 
-    def _generate_rag_queries_narration(self, storyboard: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
+    async def _generate_rag_queries_narration(self, storyboard: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None, relevant_plugins: List[str] = []) -> List[str]:
         """Generate RAG queries from the storyboard to help create narration plan.
 
         Args:
@@ -246,7 +247,7 @@ class RAGIntegration:
             relevant_plugins=", ".join(relevant_plugins) if relevant_plugins else "No plugins are relevant."
         )
         
-        queries = self.helper_model(
+        queries = await self.helper_model.acall(
             _prepare_text_inputs(prompt),
             metadata={"generation_name": "rag_query_generation_narration", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
         )
@@ -265,7 +266,7 @@ class RAGIntegration:
 
         return queries
 
-    def get_relevant_docs(self, rag_queries: List[Dict], scene_trace_id: str, topic: str, scene_number: int) -> List[str]:
+    async def get_relevant_docs(self, rag_queries: List[Dict], scene_trace_id: str, topic: str, scene_number: int) -> List[str]:
         """Get relevant documentation using the vector store.
 
         Args:
@@ -277,15 +278,17 @@ class RAGIntegration:
         Returns:
             List[str]: List of relevant documentation snippets
         """
-        return self.vector_store.find_relevant_docs(
+        return await asyncio.to_thread(
+            self.vector_store.find_relevant_docs,
             queries=rag_queries,
             k=2,
             trace_id=scene_trace_id,
             topic=topic,
-            scene_number=scene_number
+            scene_number=scene_number,
+            session_id=self.session_id
         )
     
-    def _generate_rag_queries_code(self, implementation_plan: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, relevant_plugins: List[str] = None) -> List[str]:
+    async def _generate_rag_queries_code(self, implementation_plan: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, relevant_plugins: List[str] = None) -> List[str]:
         """Generate RAG queries from implementation plan.
 
         Args:
@@ -313,7 +316,7 @@ class RAGIntegration:
         )
 
         try:
-            response = self.helper_model(
+            response = await self.helper_model.acall(
                 _prepare_text_inputs(prompt),
                 metadata={"generation_name": "rag_query_generation_code", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": self.session_id}
             )
@@ -331,7 +334,7 @@ class RAGIntegration:
             print(f"Error generating RAG queries: {e}")
             return []
 
-    def _generate_rag_queries_error_fix(self, error: str, code: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None) -> List[str]:
+    async def _generate_rag_queries_error_fix(self, error: str, code: str, scene_trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None) -> List[str]:
         """Generate RAG queries for fixing code errors.
 
         Args:
@@ -351,10 +354,13 @@ class RAGIntegration:
         else:
             plugins_str = ", ".join(self.relevant_plugins) if self.relevant_plugins else "No plugins are relevant."
 
-        cache_key = f"{topic}_scene{scene_number}_error_fix"
+        # Queries are cached per distinct error, so a different error in a later version gets its own
+        error = distill_error(error)
+        error_key = error_cache_key(error)
+        cache_key = f"{topic}_scene{scene_number}_error_fix_{error_key}"
         cache_dir = os.path.join(self.output_dir, re.sub(r'[^a-z0-9_]+', '_', topic.lower()), f"scene{scene_number}", "rag_cache")
         os.makedirs(cache_dir, exist_ok=True)
-        cache_file = os.path.join(cache_dir, "rag_queries_error_fix.json")
+        cache_file = os.path.join(cache_dir, f"rag_queries_error_fix_{error_key}.json")
 
         if os.path.exists(cache_file):
             with open(cache_file, 'r') as f:
@@ -368,7 +374,7 @@ class RAGIntegration:
             relevant_plugins=plugins_str
         )
 
-        queries = self.helper_model(
+        queries = await self.helper_model.acall(
             _prepare_text_inputs(prompt),
             metadata={"generation_name": "rag-query-generation-fix-error", "trace_id": scene_trace_id, "tags": [topic, f"scene{scene_number}"], "session_id": session_id}
         )
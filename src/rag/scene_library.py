@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+
+from src.rag.vector_store import LiteLLMEmbeddings
+from task_generator import get_prompt_context_learning_code
+
+# Embedding inputs are cut to stay well below the embedding models' input limits
+_MAX_PLAN_CHARS = 12000
+_MAX_CODE_CHARS = 12000
+
+
+class SceneLibrary:
+    """Searchable library of scenes that rendered successfully, used as code generation examples.
+
+    Every scene folder with a succ_rendered.txt under the source directories contributes the
+    code version that rendered (the winner_version of its scene_stats.json) together with its
+    implementation plan. Both are embedded, so a new
+    scene finds the verified scenes whose plans and code are closest to its own plan. Entries
+    are identified by a hash of their code, so refreshing only embeds scenes not indexed yet.
+    The source directories are refreshed once, before the first search or insert.
+
+    Args:
+        library_path (str): ChromaDB directory of the library
+        embedding_model (str): Name of the embedding model
+        source_dirs (Iterable[str], optional): Output directories scanned for rendered scenes. Defaults to ("output",).
+        score_threshold (float, optional): Minimum relevance of an example. Defaults to 0.5.
+    """
+
+    def __init__(self, library_path: str, embedding_model: str, source_dirs: Iterable[str] = ("output",),
+                 score_threshold: float = 0.5):
+        self.library_path = library_path
+        self.embedding_model = embedding_model
+        self.source_dirs = list(source_dirs)
+        self.score_threshold = score_threshold
+        self.store = Chroma(
+            collection_name="scene_library",
+            persist_directory=library_path,
+            embedding_function=LiteLLMEmbeddings(embedding_model)
+        )
+        self._refreshed = False
+        self._refresh_lock = threading.Lock()
+
+    def ensure_refreshed(self) -> None:
+        """Index the source directories unless this has already been done in this process."""
+        with self._refresh_lock:
+            if not self._refreshed:
+                self.refresh()
+                self._refreshed = True
+
+    @staticmethod
+    def _rendered_version(scene_dir: str) -> Optional[tuple]:
+        """Return (version, fix_attempts) of the winning code candidate recorded in scene_stats.json, or None."""
+        stats_path = os.path.join(scene_dir, "scene_stats.json")
+        with open(stats_path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        if stats.get("winner_version") is None:
+            return None
+        winner = next((c for c in stats.get("candidates", []) if c.get("candidate") == stats.get("winner")), {})
+        fix_attempts = winner.get("fix_attempts", max(len(winner.get("versions", [])) - 1, 0))
+        return stats["winner_version"], fix_attempts
+
+    @classmethod
+    def _scene_document(cls, topic_dir: str, scene_dir: str, version: Optional[int] = None,
+                        fix_attempts: Optional[int] = None) -> Optional[Document]:
+        """Build the library entry of a rendered scene, or None if its code is missing.
+
+        Without a version, the winner recorded in scene_stats.json is used; a scene whose stats
+        record no winner is skipped. Scenes rendered before scene stats existed had a single
+        renderer that stopped at the first version that rendered, which is the latest one.
+        """
+        file_prefix = os.path.basename(topic_dir)
+        scene_number = int(re.search(r"(\d+)$", scene_dir).group(1))
+        code_dir = os.path.join(scene_dir, "code")
+        if not os.path.isdir(code_dir):
+            return None
+        if version is None and os.path.exists(os.path.join(scene_dir, "scene_stats.json")):
+            rendered = cls._rendered_version(scene_dir)
+            if rendered is None:
+                return None
+            version, fix_attempts = rendered
+        if version is None:
+            versions = sorted(int(m.group(1)) for m in (re.search(r"_v(\d+)\.py$", name) for name in os.listdir(code_dir)) if m)
+            if not versions:
+                return None
+            version, fix_attempts = versions[-1], len(versions) - 1
+        code_path = os.path.join(code_dir, f"{file_prefix}_scene{scene_number}_v{version}.py")
+        if not os.path.exists(code_path):
+            return None
+        plan_path = os.path.join(scene_dir, f"{file_prefix}_scene{scene_number}_implementation_plan.txt")
+        with open(code_path, "r", encoding="utf-8") as f:
+            code = f.read()
+        plan = ""
+        if os.path.exists(plan_path):
+            with open(plan_path, "r", encoding="utf-8") as f:
+                plan = f.read()
+        return Document(
+            page_content=f"Implementation plan:\n{plan[:_MAX_PLAN_CHARS]}\n\nCode:\n{code[:_MAX_CODE_CHARS]}",
+            metadata={
+                "topic": file_prefix,
+                "scene_number": scene_number,
+                "source": code_path,
+                "fix_attempts": fix_attempts if fix_attempts is not None else 0,
+                "code": code,
+            }
+        )
+
+    def _rendered_scene_dirs(self) -> List[tuple]:
+        """Return (topic_dir, scene_dir) of every rendered scene in the source directories."""
+        found = []
+        for source_dir in self.source_dirs:
+            if not os.path.isdir(source_dir):
+                continue
+            for root, dirs, files in os.walk(source_dir):
+                # Media folders hold thousands of partial movie files and never a scene
+                dirs[:] = [d for d in dirs if d != "media"]
+                if "succ_rendered.txt" in files and re.search(r"scene\d+$", root):
+                    found.append((os.path.dirname(root), root))
+        return found
+
+    def add_scene(self, topic_dir: str, scene_number: int, version: Optional[int] = None,
+                  fix_attempts: Optional[int] = None) -> bool:
+        """Index one rendered scene unless it is already in the library.
+
+        Args:
+            topic_dir (str): Output folder of the topic
+            scene_number (int): Scene number
+            version (int, optional): Code version that rendered. Defaults to the winner in scene_stats.json.
+            fix_attempts (int, optional): Fix attempts of that version's candidate. Defaults to None.
+
+        Returns:
+            bool: Whether a new entry was added
+        """
+        self.ensure_refreshed()
+        document = self._scene_document(topic_dir, os.path.join(topic_dir, f"scene{scene_number}"), version, fix_attempts)
+        return self._add_documents([document]) > 0
+
+    def _add_documents(self, documents: List[Optional[Document]]) -> int:
+        documents = [doc for doc in documents if doc is not None]
+        ids = [hashlib.sha256(doc.metadata["code"].encode("utf-8")).hexdigest() for doc in documents]
+        known = set(self.store.get(ids=ids)["ids"]) if ids else set()
+        new = {doc_id: doc for doc_id, doc in zip(ids, documents) if doc_id not in known}
+        if new:
+            self.store.add_documents(documents=list(new.values()), ids=list(new.keys()))
+        return len(new)
+
+    def refresh(self) -> int:
+        """Index every rendered scene of the source directories that is not in the library yet.
+
+        Returns:
+            int: Number of scenes added
+        """
+        documents = [self._scene_document(topic_dir, scene_dir) for topic_dir, scene_dir in self._rendered_scene_dirs()]
+        added = 0
+        for i in range(0, len(documents), 10):
+            added += self._add_documents(documents[i:i + 10])
+        print(f"Scene library: {added} new scenes indexed, {self.store._collection.count()} in total")
+        return added
+
+    def find_examples(self, scene_implementation: str, k: int = 2, exclude_topic: Optional[str] = None) -> List[Dict]:
+        """Return the verified scenes closest to an implementation plan.
+
+        Args:
+            scene_implementation (str): Implementation plan of the scene to generate
+            k (int, optional): Number of examples. Defaults to 2.
+            exclude_topic (str, optional): Topic whose own scenes are skipped, so that a rerun
+                does not copy its earlier output. Defaults to None.
+
+        Returns:
+            List[Dict]: Examples with 'topic', 'scene_number', 'fix_attempts', 'code' and 'score'
+        """
+        if k <= 0:
+            return []
+        self.ensure_refreshed()
+        if self.store._collection.count() == 0:
+            return []
+        file_prefix = re.sub(r'[^a-z0-9_]+', '_', exclude_topic.lower()) if exclude_topic else None
+        results = self.store.similarity_search_with_relevance_scores(
+            query=f"Implementation plan:\n{scene_implementation[:_MAX_PLAN_CHARS]}",
+            k=k,
+            filter={"topic": {"$ne": file_prefix}} if file_prefix else None,
+            score_threshold=self.score_threshold
+        )
+        return [{**{key: doc.metadata[key] for key in ("topic", "scene_number", "fix_attempts", "code")}, "score": score}
+                for doc, score in results]
+
+    @staticmethod
+    def format_examples(examples: List[Dict]) -> Optional[str]:
+        """Format examples for the code generation prompt, or return None if there are none."""
+        if not examples:
+            return None
+        return get_prompt_context_learning_code(examples="\n".join(
+            f"# Verified scene {example['scene_number']} of '{example['topic']}' (rendered successfully)\n{example['code']}\n"
+            for example in examples
+        ))
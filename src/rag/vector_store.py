@@ -1,7 +1,11 @@
 import json
 import os
-from typing import List, Dict
-import uuid
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple
+import hashlib
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader
@@ -16,8 +20,131 @@ from tqdm import tqdm
 from langfuse import Langfuse
 
 from mllm_tools.utils import _prepare_text_inputs
+from mllm_tools.rate_limiter import get_rate_limiter
+from src.rag.embedding_cache import CachedEmbeddings, get_embedding_cache
+from src.rag.numpy_index import NumpyIndex
 from task_generator import get_prompt_detect_plugins
 
+class LiteLLMEmbeddings(Embeddings):
+    """LangChain embeddings computed with litellm, shared by the documentation stores and the scene library.
+
+    Counts the embedding requests it makes and the texts it embeds. Langfuse logging is chosen
+    per request, so the process-wide LiteLLM callbacks are never modified.
+
+    Args:
+        embedding_model (str): Name of the embedding model
+        use_langfuse (bool, optional): Whether to log the requests to Langfuse. Defaults to False.
+    """
+
+    def __init__(self, embedding_model, use_langfuse: bool = False):
+        self.embedding_model = embedding_model
+        self.use_langfuse = use_langfuse
+        self.request_count = 0
+        self.text_count = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: list[str], metadata: Optional[Dict] = None) -> list[list[float]]:
+        # Per-request callbacks; LiteLLM consumes the lists, so they are created for every call
+        callbacks = {"success_callback": ["langfuse"], "failure_callback": ["langfuse"]} if self.use_langfuse else {}
+        response = embedding(
+            model=self.embedding_model,
+            input=texts,
+            task_type="CODE_RETRIEVAL_QUERY" if self.embedding_model == "vertex_ai/text-embedding-005" else None,
+            metadata=metadata,
+            **callbacks
+        )
+        with self._lock:
+            self.request_count += 1
+            self.text_count += len(texts)
+        return [r["embedding"] for r in response["data"]]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts)
+    
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text])[0]
+
+    def traced(self, trace_id: Optional[str], parent_observation_id: str) -> "_TracedEmbeddings":
+        """Return a view of these embeddings whose requests are logged under a Langfuse observation."""
+        return _TracedEmbeddings(self, {"existing_trace_id": trace_id, "parent_observation_id": parent_observation_id})
+
+
+class _TracedEmbeddings(Embeddings):
+    """LiteLLMEmbeddings of one call, passing its Langfuse metadata with every request.
+
+    The shared LiteLLMEmbeddings is not modified, so concurrent searches keep their own spans.
+    """
+
+    def __init__(self, embeddings: LiteLLMEmbeddings, metadata: Dict):
+        self.embeddings = embeddings
+        self.metadata = metadata
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings._embed(texts, self.metadata)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings._embed([text], self.metadata)[0]
+
+
+# Rows per Chroma write; below the maximum batch size of the sqlite backend
+_CHROMA_WRITE_BATCH = 4000
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    return isinstance(error, litellm.RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+class _AdaptiveConcurrency:
+    """Window of concurrent embedding requests that halves on a rate limit error and grows back on successes.
+
+    A rate limit error also pauses every worker for a backoff that doubles with each error and
+    resets after a success. Errors of requests that were already in flight when the pause
+    started are not counted again.
+
+    Args:
+        max_concurrency (int): Largest number of concurrent requests
+        initial_backoff (float, optional): Pause after the first rate limit error in seconds. Defaults to 2.
+        max_backoff (float, optional): Longest pause in seconds. Defaults to 60.
+    """
+
+    def __init__(self, max_concurrency: int, initial_backoff: float = 2.0, max_backoff: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.backoff = initial_backoff
+        self.active = 0
+        self.paused_until = 0.0
+        self.rate_limit_errors = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until the window has room and no backoff pause is running."""
+        with self._condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.active < int(self.limit):
+                    self.active += 1
+                    return
+                self._condition.wait(timeout=pause if pause > 0 else None)
+
+    def release(self, rate_limited: bool) -> None:
+        """Free a slot and adapt the window to the outcome of the request."""
+        with self._condition:
+            self.active -= 1
+            now = time.monotonic()
+            if rate_limited:
+                self.rate_limit_errors += 1
+                if now >= self.paused_until:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.paused_until = now + self.backoff * random.uniform(0.5, 1.0)
+                    self.backoff = min(self.backoff * 2, self.max_backoff)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                self.backoff = self.initial_backoff
+            self._condition.notify_all()
+
+
 class RAGVectorStore:
     """A class for managing vector stores for RAG (Retrieval Augmented Generation).
 
@@ -32,6 +159,14 @@ class RAGVectorStore:
         session_id (str, optional): Session identifier. Defaults to None
         use_langfuse (bool, optional): Whether to use Langfuse logging. Defaults to True
         helper_model: Helper model for processing. Defaults to None
+        ingest_batch_tokens (int, optional): Token budget of one embedding request when building
+            a store, counted with the tiktoken encoder. Defaults to 16000
+        ingest_batch_size (int, optional): Largest number of chunks per embedding request. Defaults to 200
+        ingest_concurrency (int, optional): Largest number of concurrent embedding requests. Defaults to 4
+        index_backend (str, optional): "chroma" to search with Chroma queries, or "numpy" to search
+            an in-process NumpyIndex snapshot of each store. Defaults to "chroma"
+        ivf_lists (int, optional): Inverted lists of the NumPy indexes; 0 searches all rows. Defaults to 0
+        ivf_probes (int, optional): Inverted lists searched per query. Defaults to 8
     """
 
     def __init__(self, 
@@ -41,7 +176,13 @@ class RAGVectorStore:
                  trace_id: str = None,
                  session_id: str = None,
                  use_langfuse: bool = True,
-                 helper_model = None):
+                 helper_model = None,
+                 ingest_batch_tokens: int = 16000,
+                 ingest_batch_size: int = 200,
+                 ingest_concurrency: int = 4,
+                 index_backend: str = "chroma",
+                 ivf_lists: int = 0,
+                 ivf_probes: int = 8):
         self.chroma_db_path = chroma_db_path
         self.manim_docs_path = manim_docs_path
         self.embedding_model = embedding_model
@@ -49,178 +190,255 @@ class RAGVectorStore:
         self.session_id = session_id
         self.use_langfuse = use_langfuse
         self.helper_model = helper_model
+        self.ingest_batch_tokens = ingest_batch_tokens
+        self.ingest_batch_size = ingest_batch_size
+        self.ingest_concurrency = ingest_concurrency
+        self.index_backend = index_backend
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
         self.enc = tiktoken.encoding_for_model("gpt-4")
+        # One embedding function for the core and plugin stores, so its request counts cover all of them
+        self.embeddings = LiteLLMEmbeddings(self.embedding_model, use_langfuse=use_langfuse)
+        # Search queries recur across retries, scenes and topics; documents are embedded once
+        self.query_embeddings = CachedEmbeddings(self.embeddings, get_embedding_cache(self.embedding_model))
+        self.search_stats = {"calls": 0, "queries": 0, "embedding_requests": 0, "seconds": 0.0}
+        self._stats_lock = threading.Lock()
         self.plugin_stores = {}
+        self.store_paths = {}
         self.vector_store = self._load_or_create_vector_store()
+        self.numpy_indexes = self._load_numpy_indexes() if index_backend == "numpy" else {}
 
     def _load_or_create_vector_store(self):
-        """Loads existing or creates new ChromaDB vector stores.
+        """Loads the ChromaDB vector stores and brings them up to date with the documentation.
 
-        Creates/loads vector stores for both Manim core documentation and any available plugins.
-        Stores are persisted to disk for future reuse.
+        Syncs the store of the Manim core documentation and one store per plugin folder, so
+        that only new or changed documentation is embedded. Stores are persisted to disk for
+        future reuse.
 
         Returns:
             Chroma: The core Manim vector store instance
         """
         print("Entering _load_or_create_vector_store with trace_id:", self.trace_id)
-        core_path = os.path.join(self.chroma_db_path, "manim_core")
-        
-        # Load or create core vector store
-        if os.path.exists(core_path):
-            print("Loading existing core ChromaDB...")
-            self.core_vector_store = Chroma(
-                collection_name="manim_core",
-                persist_directory=core_path,
-                embedding_function=self._get_embedding_function()
-            )
-        else:
-            print("Creating new core ChromaDB...")
-            self.core_vector_store = self._create_core_store()
+        self.core_vector_store = self._sync_store(
+            "manim_core",
+            os.path.join(self.chroma_db_path, "manim_core"),
+            os.path.join(self.manim_docs_path, "manim_core")
+        )
         
         # Fix: Use correct path construction for plugin_docs
         plugin_docs_path = os.path.join(self.manim_docs_path, "plugin_docs")
         print(f"Plugin docs path: {plugin_docs_path}")
         if os.path.exists(plugin_docs_path):
             for plugin_name in os.listdir(plugin_docs_path):
-                plugin_store_path = os.path.join(self.chroma_db_path, f"manim_plugin_{plugin_name}")
-                if os.path.exists(plugin_store_path):
-                    print(f"Loading existing plugin store: {plugin_name}")
-                    self.plugin_stores[plugin_name] = Chroma(
-                        collection_name=f"manim_plugin_{plugin_name}",
-                        persist_directory=plugin_store_path,
-                        embedding_function=self._get_embedding_function()
+                plugin_path = os.path.join(plugin_docs_path, plugin_name)
+                if os.path.isdir(plugin_path):
+                    self.plugin_stores[plugin_name] = self._sync_store(
+                        f"manim_plugin_{plugin_name}",
+                        os.path.join(self.chroma_db_path, f"manim_plugin_{plugin_name}"),
+                        plugin_path
                     )
-                else:
-                    print(f"Creating new plugin store: {plugin_name}")
-                    plugin_path = os.path.join(plugin_docs_path, plugin_name)
-                    if os.path.isdir(plugin_path):
-                        plugin_store = Chroma(
-                            collection_name=f"manim_plugin_{plugin_name}",
-                            embedding_function=self._get_embedding_function(),
-                            persist_directory=plugin_store_path
-                        )
-                        plugin_docs = self._process_documentation_folder(plugin_path)
-                        if plugin_docs:
-                            self._add_documents_to_store(plugin_store, plugin_docs, plugin_name)
-                        self.plugin_stores[plugin_name] = plugin_store
         
         return self.core_vector_store  # Return core store for backward compatibility
 
+    def _load_numpy_indexes(self) -> Dict[str, NumpyIndex]:
+        """Loads the NumPy index of every store, rebuilding those whose collection changed.
+
+        Returns:
+            Dict[str, NumpyIndex]: Indexes keyed by collection name
+        """
+        indexes = {}
+        for store in [self.core_vector_store] + list(self.plugin_stores.values()):
+            collection = store._collection
+            indexes[collection.name] = NumpyIndex.load_or_build(collection, self.store_paths[collection.name], self.ivf_lists)
+        return indexes
+
     def _get_embedding_function(self) -> Embeddings:
         """Creates an embedding function using litellm.
 
         Returns:
             Embeddings: A LangChain Embeddings instance that wraps litellm functionality
         """
-        class LiteLLMEmbeddings(Embeddings):
-            def __init__(self, embedding_model):
-                self.embedding_model = embedding_model
-
-            def embed_documents(self, texts: list[str]) -> list[list[float]]:
-                litellm.success_callback = []
-                litellm.failure_callback = []
-                response = embedding(
-                    model=self.embedding_model,
-                    input=texts,
-                    task_type="CODE_RETRIEVAL_QUERY" if self.embedding_model == "vertex_ai/text-embedding-005" else None
-                )
-                litellm.success_callback = ["langfuse"]
-                litellm.failure_callback = ["langfuse"]
-                return [r["embedding"] for r in response["data"]]
-            
-            def embed_query(self, text: str) -> list[float]:
-                litellm.success_callback = []
-                litellm.failure_callback = []
-                response = embedding(
-                    model=self.embedding_model,
-                    input=[text],
-                    task_type="CODE_RETRIEVAL_QUERY" if self.embedding_model == "vertex_ai/text-embedding-005" else None
-                )
-                litellm.success_callback = ["langfuse"]
-                litellm.failure_callback = ["langfuse"]
-                return response["data"][0]["embedding"]
-        
-        return LiteLLMEmbeddings(self.embedding_model)
+        return self.embeddings
+
+    @staticmethod
+    def _file_hash(file_path: str) -> str:
+        with open(file_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @staticmethod
+    def _chunk_id(source: str, content: str) -> str:
+        """Returns the stable ID of a chunk, derived from its source file and the hash of its content."""
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{source}\n{content_hash}".encode("utf-8")).hexdigest()
 
-    def _create_core_store(self):
-        """Creates the main ChromaDB vector store for Manim core documentation.
+    @staticmethod
+    def _load_manifest(manifest_path: str) -> Dict:
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                return json.load(f)
+        return {}
+
+    @staticmethod
+    def _save_manifest(manifest_path: str, manifest: Dict) -> None:
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, manifest_path)
+
+    def _sync_store(self, collection_name: str, store_path: str, docs_path: str) -> Chroma:
+        """Loads a vector store and re-indexes the documentation files that changed since the last sync.
+
+        A manifest in the store directory records the content hash of every indexed file and
+        the IDs of its chunks. Unchanged files are skipped without being split. The chunks of a
+        new or changed file are only embedded if their ID, derived from the source and the
+        chunk hash, is not in the store yet, and the chunks of changed or deleted files that
+        no longer exist are removed. A store built before manifests existed is first re-keyed
+        to stable IDs from its stored embeddings.
+
+        Args:
+            collection_name (str): Name of the Chroma collection
+            store_path (str): Persist directory of the store
+            docs_path (str): Folder of the documentation indexed in the store
 
         Returns:
-            Chroma: The initialized and populated core vector store
+            Chroma: The up-to-date vector store
         """
-        core_vector_store = Chroma(
-            collection_name="manim_core",
-            embedding_function=self._get_embedding_function(),
-            persist_directory=os.path.join(self.chroma_db_path, "manim_core")
+        vector_store = Chroma(
+            collection_name=collection_name,
+            persist_directory=store_path,
+            embedding_function=self._get_embedding_function()
         )
-        
-        # Process manim core docs
-        core_docs = self._process_documentation_folder(os.path.join(self.manim_docs_path, "manim_core"))
-        if core_docs:
-            self._add_documents_to_store(core_vector_store, core_docs, "manim_core")
-        
-        return core_vector_store
+        self.store_paths[collection_name] = store_path
+        if not os.path.isdir(docs_path):
+            print(f"Documentation folder {docs_path} not found; using {collection_name} as it is")
+            return vector_store
+
+        manifest_path = os.path.join(store_path, "manifest.json")
+        manifest = self._load_manifest(manifest_path)
+        collection = vector_store._collection
+        if manifest.get("embedding_model", self.embedding_model) != self.embedding_model:
+            print(f"{collection_name} was embedded with {manifest['embedding_model']}; re-indexing it with {self.embedding_model}")
+            self._delete_ids(collection, collection.get(include=[])["ids"])
+            manifest = {}
+        migrated = not manifest and collection.count() > 0
+        if migrated:
+            self._migrate_legacy_ids(collection)
+        indexed_files = manifest.get("files", {})
+
+        files = {}
+        for root, _, file_names in os.walk(docs_path):
+            for file_name in file_names:
+                if file_name.endswith(('.md', '.py')):
+                    file_path = os.path.join(root, file_name)
+                    files[file_path] = self._file_hash(file_path)
+
+        new_docs, new_ids, removed_ids = [], [], []
+        synced_files = {}
+        changed_files = 0
+        for file_path, file_hash in files.items():
+            indexed = indexed_files.get(file_path)
+            if indexed and indexed["hash"] == file_hash:
+                synced_files[file_path] = indexed
+                continue
+            changed_files += 1
+            chunks = {}
+            for doc in self._split_file(file_path):
+                chunks.setdefault(self._chunk_id(file_path, doc.page_content), doc)
+            synced_files[file_path] = {"hash": file_hash, "chunks": list(chunks)}
+            removed_ids.extend(chunk_id for chunk_id in (indexed or {}).get("chunks", []) if chunk_id not in chunks)
+            new_docs.extend(chunks.values())
+            new_ids.extend(chunks)
+        for file_path, indexed in indexed_files.items():
+            if file_path not in files:
+                removed_ids.extend(indexed["chunks"])
+
+        # Chunks already in the store, e.g. unchanged parts of a changed file, are not embedded again
+        existing = set()
+        for i in range(0, len(new_ids), _CHROMA_WRITE_BATCH):
+            existing.update(collection.get(ids=new_ids[i:i + _CHROMA_WRITE_BATCH], include=[])["ids"])
+        to_embed = [(doc_id, doc) for doc_id, doc in zip(new_ids, new_docs) if doc_id not in existing]
+
+        if migrated:
+            # Legacy chunks whose file or split no longer exists are not referenced by any file
+            referenced = {chunk_id for indexed in synced_files.values() for chunk_id in indexed["chunks"]}
+            removed_ids.extend(chunk_id for chunk_id in collection.get(include=[])["ids"] if chunk_id not in referenced)
+        removed_files = sum(1 for file_path in indexed_files if file_path not in files)
+        print(f"{collection_name}: {len(files) - changed_files} files unchanged, {changed_files} new or changed, "
+              f"{removed_files} removed; embedding {len(to_embed)} chunks, deleting {len(removed_ids)}")
+        if to_embed:
+            self._add_documents_to_store(vector_store, [doc for _, doc in to_embed], collection_name,
+                                         ids=[doc_id for doc_id, _ in to_embed])
+        self._delete_ids(collection, removed_ids)
+        if to_embed or removed_ids or synced_files != indexed_files:
+            os.makedirs(store_path, exist_ok=True)
+            self._save_manifest(manifest_path, {"embedding_model": self.embedding_model, "files": synced_files})
+        return vector_store
+
+    @staticmethod
+    def _delete_ids(collection, ids: List[str]) -> None:
+        for i in range(0, len(ids), _CHROMA_WRITE_BATCH):
+            collection.delete(ids=ids[i:i + _CHROMA_WRITE_BATCH])
+
+    def _migrate_legacy_ids(self, collection) -> None:
+        """Re-keys the chunks of a store built before the manifest existed with their stable IDs.
 
-    def _process_documentation_folder(self, folder_path: str) -> List[Document]:
-        """Processes documentation files from a folder into LangChain documents.
+        The stored embeddings are copied, so the migration makes no embedding requests.
+        """
+        legacy_ids = collection.get(include=[])["ids"]
+        print(f"Migrating {len(legacy_ids)} chunks of {collection.name} to stable IDs")
+        for i in range(0, len(legacy_ids), _CHROMA_WRITE_BATCH):
+            rows = collection.get(ids=legacy_ids[i:i + _CHROMA_WRITE_BATCH], include=["embeddings", "metadatas", "documents"])
+            stable = {}
+            for embedding_vector, metadata, document in zip(rows["embeddings"], rows["metadatas"], rows["documents"]):
+                stable.setdefault(self._chunk_id(metadata["source"], document), (embedding_vector, metadata, document))
+            collection.delete(ids=rows["ids"])
+            if stable:
+                collection.upsert(
+                    ids=list(stable),
+                    embeddings=[row[0] for row in stable.values()],
+                    metadatas=[row[1] for row in stable.values()],
+                    documents=[row[2] for row in stable.values()]
+                )
+
+    def _split_file(self, file_path: str) -> List[Document]:
+        """Loads a documentation file and splits it into chunks with the splitter of its language.
 
         Args:
-            folder_path (str): Path to the folder containing documentation files
+            file_path (str): Path of a markdown or python file
 
         Returns:
-            List[Document]: List of processed LangChain documents
+            List[Document]: Chunks prefixed with their source, or an empty list if the file cannot be loaded
         """
-        all_docs = []
-        
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if file.endswith(('.md', '.py')):
-                    file_path = os.path.join(root, file)
-                    try:
-                        loader = TextLoader(file_path)
-                        documents = loader.load()
-                        for doc in documents:
-                            doc.metadata['source'] = file_path
-                        all_docs.extend(documents)
-                    except Exception as e:
-                        print(f"Error loading file {file_path}: {e}")
-        
-        if not all_docs:
-            print(f"No markdown or python files found in {folder_path}")
+        try:
+            documents = TextLoader(file_path).load()
+        except Exception as e:
+            print(f"Error loading file {file_path}: {e}")
             return []
-        
-        # Split documents using appropriate splitters
-        split_docs = []
-        markdown_splitter = RecursiveCharacterTextSplitter.from_language(
-            language=Language.MARKDOWN
-        )
-        python_splitter = RecursiveCharacterTextSplitter.from_language(
-            language=Language.PYTHON
-        )
-        
-        for doc in all_docs:
-            if doc.metadata['source'].endswith('.md'):
-                temp_docs = markdown_splitter.split_documents([doc])
-                for temp_doc in temp_docs:
-                    temp_doc.page_content = f"Source: {doc.metadata['source']}\n\n{temp_doc.page_content}"
-                split_docs.extend(temp_docs)
-            elif doc.metadata['source'].endswith('.py'):
-                temp_docs = python_splitter.split_documents([doc])
-                for temp_doc in temp_docs:
-                    temp_doc.page_content = f"Source: {doc.metadata['source']}\n\n{temp_doc.page_content}"
-                split_docs.extend(temp_docs)
-        
+        for doc in documents:
+            doc.metadata['source'] = file_path
+        language = Language.MARKDOWN if file_path.endswith('.md') else Language.PYTHON
+        split_docs = RecursiveCharacterTextSplitter.from_language(language=language).split_documents(documents)
+        for split_doc in split_docs:
+            split_doc.page_content = f"Source: {file_path}\n\n{split_doc.page_content}"
         return split_docs
 
-    def _add_documents_to_store(self, vector_store: Chroma, documents: List[Document], store_name: str):
-        """Adds documents to a vector store in batches with rate limiting.
+    def _add_documents_to_store(self, vector_store: Chroma, documents: List[Document], store_name: str, ids: List[str] = None):
+        """Embeds documents with concurrent batched requests and writes them to a vector store in bulk.
+
+        Batches are filled up to ingest_batch_tokens and ingest_batch_size, and up to
+        ingest_concurrency of them are embedded at a time. Rate limit errors shrink the
+        concurrency and pause the requests with an exponential backoff; the configured rate
+        limit of the embedding model, if any, is respected as well.
 
         Args:
             vector_store (Chroma): The vector store to add documents to
             documents (List[Document]): List of documents to add
             store_name (str): Name of the store for logging purposes
+            ids (List[str], optional): IDs of the documents. Defaults to their stable chunk IDs
         """
         print(f"Adding documents to {store_name} store")
+        if ids is None:
+            ids = [self._chunk_id(doc.metadata['source'], doc.page_content) for doc in documents]
         
         # Calculate token statistics
         token_lengths = [len(self.enc.encode(doc.page_content)) for doc in documents]
@@ -228,23 +446,123 @@ class RAGVectorStore:
               f"Min: {min(token_lengths)}, Max: {max(token_lengths)}, "
               f"Mean: {sum(token_lengths) / len(token_lengths):.1f}, "
               f"Median: {statistics.median(token_lengths)}, "
-              f"Std: {statistics.stdev(token_lengths):.1f}")
-        
-        import time
-
-        batch_size = 10
-        request_count = 0
-        for i in tqdm(range(0, len(documents), batch_size), desc=f"Processing {store_name} batches"):
-            batch_docs = documents[i:i + batch_size]
-            batch_ids = [str(uuid.uuid4()) for _ in batch_docs]
-            vector_store.add_documents(documents=batch_docs, ids=batch_ids)
-            request_count += 1
-            if request_count % 100 == 0:
-                time.sleep(60)  # Sleep for 1 second every 100 requests
-        
+              f"Std: {statistics.stdev(token_lengths) if len(token_lengths) > 1 else 0.0:.1f}")
+
+        batches = []
+        batch, batch_tokens = [], 0
+        for i, tokens in enumerate(token_lengths):
+            if batch and (batch_tokens + tokens > self.ingest_batch_tokens or len(batch) >= self.ingest_batch_size):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+
+        window = _AdaptiveConcurrency(self.ingest_concurrency)
+        limiter = get_rate_limiter(self.embedding_model)
+
+        def embed_batch(indices: List[int]) -> List[List[float]]:
+            texts = [documents[i].page_content for i in indices]
+            tokens = sum(token_lengths[i] for i in indices)
+            for attempt in range(10):
+                window.acquire()
+                if limiter is not None:
+                    limiter.acquire(tokens, key=store_name)
+                try:
+                    vectors = self.embeddings.embed_documents(texts)
+                except Exception as e:
+                    window.release(rate_limited=_is_rate_limit_error(e))
+                    if not _is_rate_limit_error(e) or attempt == 9:
+                        raise
+                    continue
+                window.release(rate_limited=False)
+                return vectors
+
+        pending = {"ids": [], "embeddings": [], "metadatas": [], "documents": []}
+
+        def write_pending():
+            if pending["ids"]:
+                vector_store._collection.upsert(**pending)
+                for rows in pending.values():
+                    rows.clear()
+
+        start = time.perf_counter()
+        done_docs, done_tokens = 0, 0
+        with ThreadPoolExecutor(max_workers=self.ingest_concurrency) as executor, \
+                tqdm(total=len(documents), desc=f"Embedding {store_name}", unit="doc") as progress:
+            futures = {executor.submit(embed_batch, indices): indices for indices in batches}
+            for future in as_completed(futures):
+                indices = futures[future]
+                for i, vector in zip(indices, future.result()):
+                    pending["ids"].append(ids[i])
+                    pending["embeddings"].append(vector)
+                    pending["metadatas"].append(documents[i].metadata)
+                    pending["documents"].append(documents[i].page_content)
+                if len(pending["ids"]) >= _CHROMA_WRITE_BATCH:
+                    write_pending()
+                done_docs += len(indices)
+                done_tokens += sum(token_lengths[i] for i in indices)
+                elapsed = max(time.perf_counter() - start, 1e-9)
+                progress.update(len(indices))
+                progress.set_postfix(docs_per_s=f"{done_docs / elapsed:.1f}", tokens_per_s=f"{done_tokens / elapsed:.0f}",
+                                     concurrency=int(window.limit))
+        write_pending()
         vector_store.persist()
 
-    def find_relevant_docs(self, queries: List[Dict], k: int = 5, trace_id: str = None, topic: str = None, scene_number: int = None) -> List[str]:
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"Ingested {done_docs} documents ({done_tokens} tokens) into {store_name} in {elapsed:.1f}s: "
+              f"{done_docs / elapsed:.1f} docs/s, {done_tokens / elapsed:.0f} tokens/s, {len(batches)} requests, "
+              f"{window.rate_limit_errors} rate limit errors")
+
+    def _search_store(self, store: Chroma, query_texts: List[str], query_embeddings: Dict[str, List[float]],
+                      k: int, score_threshold: float = 0.5) -> List[Dict]:
+        """Searches one store for several embedded queries with a single collection query.
+
+        Scores are computed like similarity_search_with_relevance_scores does, with the relevance
+        function of the store, and results below the threshold are dropped. With the numpy
+        backend the store's NumpyIndex is searched instead of the collection.
+
+        Args:
+            store (Chroma): The vector store to search
+            query_texts (List[str]): Queries to search for
+            query_embeddings (Dict[str, List[float]]): Embeddings of the queries
+            k (int): Number of results per query
+            score_threshold (float, optional): Minimum relevance score. Defaults to 0.5
+
+        Returns:
+            List[Dict]: Results with 'query', 'source', 'content' and 'score' keys
+        """
+        query_texts = list(dict.fromkeys(query_texts))
+        if not query_texts:
+            return []
+        index = self.numpy_indexes.get(store._collection.name)
+        if index is not None:
+            results = index.search([query_embeddings[text] for text in query_texts], k, store._select_relevance_score_fn(),
+                                   score_threshold, self.ivf_probes)
+            return [{"query": query_text, "source": source, "content": content, "score": score}
+                    for query_text, query_results in zip(query_texts, results)
+                    for content, source, score in query_results]
+        results = store._collection.query(
+            query_embeddings=[query_embeddings[text] for text in query_texts],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        relevance_score = store._select_relevance_score_fn()
+        formatted_results = []
+        for query_text, contents, metadatas, distances in zip(query_texts, results["documents"], results["metadatas"], results["distances"]):
+            for content, metadata, distance in zip(contents, metadatas, distances):
+                score = relevance_score(distance)
+                if score >= score_threshold:
+                    formatted_results.append({
+                        "query": query_text,
+                        "source": metadata['source'],
+                        "content": content,
+                        "score": score
+                    })
+        return formatted_results
+
+    def find_relevant_docs(self, queries: List[Dict], k: int = 5, trace_id: str = None, topic: str = None, scene_number: int = None, session_id: str = None) -> List[str]:
         """Finds relevant documentation based on the provided queries.
 
         Args:
@@ -253,10 +571,13 @@ class RAGVectorStore:
             trace_id (str, optional): Trace identifier for logging. Defaults to None
             topic (str, optional): Topic name for logging. Defaults to None
             scene_number (int, optional): Scene number for logging. Defaults to None
+            session_id (str, optional): Session identifier for logging, for stores shared
+                between sessions. Defaults to the store's session_id
 
         Returns:
             List[str]: Formatted string containing relevant documentation snippets
         """
+        start = time.perf_counter()
         manim_core_formatted_results = []
         manim_plugin_formatted_results = []
         
@@ -269,7 +590,7 @@ class RAGVectorStore:
                 metadata={
                     "topic": topic,
                     "scene_number": scene_number,
-                    "session_id": self.session_id
+                    "session_id": session_id or self.session_id
                 }
             )
         
@@ -280,41 +601,36 @@ class RAGVectorStore:
         if len([q for q in queries if q["type"] != "manim-core"]) != len(manim_plugin_queries):
             print("Warning: Some plugin queries were skipped because their types weren't found in available plugin stores")
         
+        # Embed every distinct query of the call not in the embedding cache in one request
+        query_texts = list(dict.fromkeys(query["query"] for query in manim_core_queries + manim_plugin_queries))
+        query_embeddings = self.query_embeddings
+        if self.use_langfuse:
+            # Log the embedding request under this search's span without touching the shared embeddings
+            query_embeddings = CachedEmbeddings(self.embeddings.traced(trace_id, span.id), self.query_embeddings.cache)
+        vectors, embedding_requests = query_embeddings.embed_documents_counted(query_texts)
+        query_embeddings = dict(zip(query_texts, vectors))
+
         # Search in core manim docs
-        for query in manim_core_queries:
-            query_text = query["query"]
-            self.core_vector_store._embedding_function.parent_observation_id = span.id
-            manim_core_results = self.core_vector_store.similarity_search_with_relevance_scores(
-                query=query_text,
-                k=k,
-                score_threshold=0.5
-            )
-            for result in manim_core_results:
-                manim_core_formatted_results.append({
-                    "query": query_text,
-                    "source": result[0].metadata['source'],
-                    "content": result[0].page_content,
-                    "score": result[1]
-                })
+        manim_core_formatted_results.extend(self._search_store(
+            self.core_vector_store, [query["query"] for query in manim_core_queries], query_embeddings, k
+        ))
         
-        # Search in relevant plugin docs
-        for query in manim_plugin_queries:
-            plugin_name = query["type"]
-            query_text = query["query"]
-            self.plugin_stores[plugin_name]._embedding_function.parent_observation_id = span.id
-            if plugin_name in self.plugin_stores:
-                plugin_results = self.plugin_stores[plugin_name].similarity_search_with_relevance_scores(
-                    query=query_text,
-                    k=k,
-                    score_threshold=0.5
-                )
-                for result in plugin_results:
-                    manim_plugin_formatted_results.append({
-                        "query": query_text,
-                        "source": result[0].metadata['source'],
-                        "content": result[0].page_content,
-                        "score": result[1]
-                    })
+        # Search in relevant plugin docs, one collection query per plugin
+        for plugin_name in dict.fromkeys(query["type"] for query in manim_plugin_queries):
+            manim_plugin_formatted_results.extend(self._search_store(
+                self.plugin_stores[plugin_name],
+                [query["query"] for query in manim_plugin_queries if query["type"] == plugin_name],
+                query_embeddings,
+                k
+            ))
+
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.search_stats["calls"] += 1
+            self.search_stats["queries"] += len(query_texts)
+            self.search_stats["embedding_requests"] += embedding_requests
+            self.search_stats["seconds"] += elapsed
+        print(f"RAG search: {len(query_texts)} queries, {embedding_requests} embedding request, {elapsed:.2f}s")
         
         print(f"Number of results before removing duplicates: {len(manim_core_formatted_results) + len(manim_plugin_formatted_results)}")
         
@@ -353,4 +669,79 @@ class RAGVectorStore:
         manim_core_results = "Please refer to the following Manim core documentation that may be helpful for the code generation:\n\n" + "\n\n".join([f"Content:\n````text\n{res['content']}\n````\nScore: {res['score']}" for res in manim_core_unique_results])
         manim_plugin_results = "Please refer to the following Manim plugin documentation that may be helpful for the code generation:\n\n" + "\n\n".join([f"Content:\n````text\n{res['content']}\n````\nScore: {res['score']}" for res in manim_plugin_unique_results])
         
-        return manim_core_results + "\n\n" + manim_plugin_results
\ No newline at end of file
+        return manim_core_results + "\n\n" + manim_plugin_results
+
+# Process-wide documentation stores, keyed by (ChromaDB path, embedding model), and their search options
+_stores: Dict[Tuple[str, str], RAGVectorStore] = {}
+_store_options: Dict[str, object] = {}
+_store_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def configure_vector_stores(index_backend: str = "chroma", ivf_lists: int = 0, ivf_probes: int = 8) -> None:
+    """Set the search backend of the stores created by get_vector_store in this process.
+
+    Args:
+        index_backend (str, optional): "chroma" or "numpy". Defaults to "chroma".
+        ivf_lists (int, optional): Inverted lists of the NumPy indexes; 0 searches all rows. Defaults to 0.
+        ivf_probes (int, optional): Inverted lists searched per query. Defaults to 8.
+    """
+    with _registry_lock:
+        _store_options.clear()
+        _store_options.update(index_backend=index_backend, ivf_lists=ivf_lists, ivf_probes=ivf_probes)
+
+
+def get_vector_store(chroma_db_path: str, manim_docs_path: str, embedding_model: str,
+                     use_langfuse: bool = True, helper_model=None) -> RAGVectorStore:
+    """Return the store shared by every planner and code generator of this process.
+
+    The store of a (ChromaDB path, embedding model) pair is loaded, or built, by the first
+    caller; concurrent callers for the same pair wait for that load instead of opening their
+    own Chroma clients, plugin stores and tokenizer. Stores of other pairs load in parallel.
+
+    Args:
+        chroma_db_path (str): Path to ChromaDB storage directory
+        manim_docs_path (str): Path to Manim documentation files
+        embedding_model (str): Name of the embedding model to use
+        use_langfuse (bool, optional): Whether to use Langfuse logging. Defaults to True
+        helper_model: Helper model for processing. Defaults to None
+
+    Returns:
+        RAGVectorStore: The shared store
+    """
+    key = (os.path.abspath(chroma_db_path), embedding_model)
+    with _registry_lock:
+        if key in _stores:
+            return _stores[key]
+        load_lock = _store_locks.setdefault(key, threading.Lock())
+        options = dict(_store_options)
+    with load_lock:
+        with _registry_lock:
+            if key in _stores:
+                return _stores[key]
+        store = RAGVectorStore(
+            chroma_db_path=chroma_db_path,
+            manim_docs_path=manim_docs_path,
+            embedding_model=embedding_model,
+            use_langfuse=use_langfuse,
+            helper_model=helper_model,
+            **options
+        )
+        with _registry_lock:
+            _stores[key] = store
+    return store
+
+
+def print_vector_store_stats() -> None:
+    """Print the search latency and embedding requests of every shared store of this process."""
+    with _registry_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        with store._stats_lock:
+            stats = dict(store.search_stats)
+        if not stats["calls"]:
+            continue
+        print(f"\nRAG search stats ({os.path.basename(store.chroma_db_path)}, {store.embedding_model}):")
+        print(f"  calls={stats['calls']} queries={stats['queries']} embedding_requests={stats['embedding_requests']} "
+              f"mean_latency={stats['seconds'] / stats['calls']:.2f}s "
+              f"total_embedding_requests={store.embeddings.request_count}")
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    job_key TEXT NOT NULL UNIQUE,
+    group_key TEXT,
+    payload TEXT NOT NULL,
+    group_follow_up TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_group ON jobs (group_key, kind, status);
+"""
+
+# Job states. A leased job whose lease expired counts as queued again.
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+
+def default_worker_id() -> str:
+    """Return an identifier unique to this process across machines."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """Durable job queue in a SQLite database shared by a coordinator and any number of workers.
+
+    Workers lease jobs for a limited time and extend the lease with heartbeats while they
+    work. A job whose lease expires, because its worker crashed or lost the machine, is
+    handed to the next worker that asks for work, up to max_attempts times.
+
+    A job can carry a group follow-up, e.g. combining a topic after its scenes. It is
+    enqueued when the last job of the group and kind finishes, whether it completed,
+    failed or ran out of attempts with an expired lease, but only if every job of the
+    group and kind completed: a topic with a scene that failed for good is not combined.
+
+    Workers on several machines can share one queue file on a shared filesystem, as long
+    as the filesystem implements POSIX locks correctly (SQLite relies on them).
+
+    Args:
+        db_path (str): Path of the SQLite queue database
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # Queues created before group follow-ups were stored with their jobs
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "group_follow_up" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN group_follow_up TEXT")
+
+    def _transaction(self, func):
+        """Run func(conn) in an immediate transaction and return its result."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _insert(conn, kind: str, job_key: str, payload: Dict[str, Any], group_key: Optional[str], priority: int,
+                max_attempts: int, group_follow_up: Optional[Dict[str, Any]] = None) -> bool:
+        now = time.time()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (kind, job_key, group_key, payload, group_follow_up, priority, max_attempts, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, job_key, group_key, json.dumps(payload), json.dumps(group_follow_up) if group_follow_up else None,
+             priority, max_attempts, now, now)
+        )
+        return cursor.rowcount == 1
+
+    def enqueue(self, kind: str, job_key: str, payload: Dict[str, Any], group_key: Optional[str] = None,
+                priority: int = 0, max_attempts: int = 3, group_follow_up: Optional[Dict[str, Any]] = None) -> bool:
+        """Add a job unless a job with the same key exists.
+
+        Args:
+            kind (str): Job type, e.g. "topic", "scene" or "combine"
+            job_key (str): Unique key that makes enqueueing idempotent
+            payload (Dict[str, Any]): JSON-serializable job arguments
+            group_key (str, optional): Key grouping related jobs, e.g. the topic. Defaults to None.
+            priority (int, optional): Lower values are leased first. Defaults to 0.
+            max_attempts (int, optional): Leases before the job is marked failed. Defaults to 3.
+            group_follow_up (Dict[str, Any], optional): Keyword arguments of enqueue() for a job to add
+                once every job of this job's group and kind has completed. Defaults to None.
+
+        Returns:
+            bool: Whether the job was added
+        """
+        return self._transaction(lambda conn: self._insert(conn, kind, job_key, payload, group_key, priority,
+                                                           max_attempts, group_follow_up))
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Lease the next runnable job, reclaiming jobs whose lease expired.
+
+        Args:
+            worker_id (str): Identifier of the leasing worker
+            lease_seconds (float): Lease duration; extend it with heartbeat()
+
+        Returns:
+            Optional[Dict[str, Any]]: The job with its payload decoded, or None if nothing is runnable
+        """
+        def lease_next(conn):
+            now = time.time()
+            # Expired leases that used up their attempts are failed rather than retried forever
+            exhausted = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts",
+                (LEASED, now)
+            ).fetchall()
+            for row in exhausted:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires_at = NULL, error = 'lease expired', "
+                    "updated_at = ? WHERE id = ?",
+                    (FAILED, now, row["id"])
+                )
+                self._finish_group(conn, row["id"])
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                "ORDER BY priority, id LIMIT 1",
+                (QUEUED, LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == LEASED:
+                print(f"Reclaiming job {row['id']} ({row['job_key']}) from expired lease of {row['lease_owner']}")
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (LEASED, worker_id, now + lease_seconds, now, row["id"])
+            )
+            job = dict(row)
+            job["payload"] = json.loads(job["payload"])
+            job["attempts"] += 1
+            return job
+
+        return self._transaction(lease_next)
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease of a job held by the worker.
+
+        Returns:
+            bool: False if the worker lost the lease, e.g. after it expired and was reclaimed
+        """
+        def extend(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, time.time(), job_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(extend)
+
+    def _insert_follow_ups(self, conn, follow_ups: List[Dict[str, Any]]) -> None:
+        for job in follow_ups:
+            self._insert(conn, job["kind"], job["job_key"], job["payload"], job.get("group_key"),
+                         job.get("priority", 0), job.get("max_attempts", 3), job.get("group_follow_up"))
+
+    def _finish_group(self, conn, job_id: int) -> None:
+        """Enqueue the group follow-up of a job that just finished if it was the last of its group and kind.
+
+        The follow-up is skipped when a job of the group and kind failed for good.
+        """
+        row = conn.execute("SELECT group_key, kind, group_follow_up FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["group_follow_up"] is None:
+            return
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE group_key = ? AND kind = ? GROUP BY status",
+            (row["group_key"], row["kind"])
+        ).fetchall())
+        if counts.get(QUEUED, 0) or counts.get(LEASED, 0):
+            return
+        if counts.get(FAILED, 0):
+            follow_up = json.loads(row["group_follow_up"])
+            print(f"Not enqueueing {follow_up['job_key']}: {counts[FAILED]} {row['kind']} job(s) of {row['group_key']} failed")
+            return
+        self._insert_follow_ups(conn, [json.loads(row["group_follow_up"])])
+
+    def complete(self, job_id: int, worker_id: str, follow_ups: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """Mark a leased job done and enqueue the jobs that follow from it, atomically.
+
+        Args:
+            job_id (int): Job id
+            worker_id (str): Worker holding the lease
+            follow_ups (List[Dict[str, Any]], optional): Keyword arguments of enqueue() for new jobs
+
+        Returns:
+            bool: False if the worker no longer held the lease
+        """
+        def finish(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires_at = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (DONE, time.time(), job_id, LEASED, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._insert_follow_ups(conn, follow_ups or [])
+            self._finish_group(conn, job_id)
+            return True
+
+        return self._transaction(finish)
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> None:
+        """Release a job after an error: it is queued again until it runs out of attempts.
+
+        Args:
+            job_id (int): Job id
+            worker_id (str): Worker holding the lease
+            error (str): Error message to keep with the job
+        """
+        def release(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, "
+                "lease_owner = NULL, lease_expires_at = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (FAILED, QUEUED, error, time.time(), job_id, LEASED, worker_id)
+            )
+            if cursor.rowcount == 1:
+                self._finish_group(conn, job_id)
+
+        self._transaction(release)
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Return job counts per kind and status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status").fetchall()
+        counts = {}
+        for row in rows:
+            counts.setdefault(row["kind"], {})[row["status"]] = row["n"]
+        return counts
+
+    def has_pending_work(self) -> bool:
+        """Return whether any job is queued or leased, i.e. whether more work can still appear."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1", (QUEUED, LEASED)).fetchone() is not None
+
+    def print_stats(self) -> None:
+        """Print job counts per kind and status."""
+        print("\nJob queue:")
+        for kind, statuses in sorted(self.counts().items()):
+            print(f"  {kind:<8} " + ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items())))
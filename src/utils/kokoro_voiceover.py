@@ -14,6 +14,27 @@ from manim_voiceover.helper import remove_bookmarks, wav2mp3
 from scipy.io.wavfile import write as write_wav
 from src.config.config import Config
 
+# Kokoro models loaded in this process, keyed by (model_path, voices_path). Lets a
+# long-lived render server load the model once and reuse it for every scene.
+_kokoro_models = {}
+
+
+def get_kokoro_model(model_path: str, voices_path: str) -> Kokoro:
+    """
+    Return a Kokoro model for the given paths, loading it on first use.
+
+    Parameters:
+        model_path (str): Path to the Kokoro ONNX model.
+        voices_path (str): Path to the voices file.
+
+    Returns:
+        Kokoro: The loaded model.
+    """
+    key = (model_path, voices_path)
+    if key not in _kokoro_models:
+        _kokoro_models[key] = Kokoro(model_path, voices_path)
+    return _kokoro_models[key]
+
 
 class KokoroService(SpeechService):
     """Speech service class for kokoro_self (using text_to_speech via Kokoro ONNX)."""
@@ -25,7 +46,7 @@ class KokoroService(SpeechService):
                  speed: float = Config.KOKORO_DEFAULT_SPEED,
                  lang: str = Config.KOKORO_DEFAULT_LANG,
                  **kwargs):
-        self.kokoro = Kokoro(model_path, voices_path)
+        self.kokoro = get_kokoro_model(model_path, voices_path)
         self.voice = voice
         self.speed = speed
         self.lang = lang
@@ -0,0 +1,366 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from src.utils.utils import extract_xml
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    file_prefix TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    num_scenes INTEGER,
+    outline_path TEXT,
+    combined_video_path TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scenes (
+    file_prefix TEXT NOT NULL,
+    scene_number INTEGER NOT NULL,
+    plan_path TEXT,
+    code_versions INTEGER NOT NULL DEFAULT 0,
+    latest_code_path TEXT,
+    rendered_version INTEGER,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (file_prefix, scene_number)
+);
+CREATE TABLE IF NOT EXISTS stage_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_prefix TEXT NOT NULL,
+    scene_number INTEGER,
+    stage TEXT NOT NULL,
+    version INTEGER,
+    status TEXT NOT NULL,
+    artifact_path TEXT,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stage_runs_scene ON stage_runs (file_prefix, scene_number, stage);
+"""
+
+
+def get_file_prefix(topic: str) -> str:
+    """Return the output folder name used for a topic."""
+    return re.sub(r'[^a-z0-9_]+', '_', topic.lower())
+
+
+class StateStore:
+    """Embedded SQLite database recording the progress of every topic and scene.
+
+    Every stage (outline, plan, code, render, combine) is recorded transactionally as
+    it finishes, together with its artifact path, timing and error. Status checks and
+    resume decisions are then queries instead of walks over the output tree, and
+    concurrent runs sharing an output directory see a consistent state.
+
+    Output trees created before the store existed are indexed from the filesystem the
+    first time a topic is looked up.
+
+    Args:
+        db_path (str): Path of the SQLite database file
+        output_dir (str): Output directory the recorded artifacts live in
+    """
+
+    def __init__(self, db_path: str, output_dir: str):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _write(self, statements: List[tuple]) -> None:
+        """Execute (sql, params) statements in one transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _upsert_scene(file_prefix: str, scene_number: int, **fields) -> tuple:
+        """Build an upsert statement for a scene row."""
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+        sql = (f"INSERT INTO scenes (file_prefix, scene_number, {columns}, updated_at) VALUES (?, ?, {placeholders}, ?) "
+               f"ON CONFLICT (file_prefix, scene_number) DO UPDATE SET {updates}, updated_at = excluded.updated_at")
+        return sql, (file_prefix, scene_number, *fields.values(), time.time())
+
+    @staticmethod
+    def _stage_run(file_prefix: str, scene_number: Optional[int], stage: str, status: str, version: Optional[int] = None,
+                   artifact_path: Optional[str] = None, started_at: Optional[float] = None, error: Optional[str] = None) -> tuple:
+        """Build an insert statement for a stage run."""
+        return (
+            "INSERT INTO stage_runs (file_prefix, scene_number, stage, version, status, artifact_path, started_at, finished_at, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (file_prefix, scene_number, stage, version, status, artifact_path, started_at, time.time(), error)
+        )
+
+    def record_outline(self, topic: str, num_scenes: int, outline_path: str, started_at: Optional[float] = None) -> None:
+        """Record a topic's scene outline.
+
+        Args:
+            topic (str): Topic name
+            num_scenes (int): Number of scenes in the outline
+            outline_path (str): Path of the outline file
+            started_at (float, optional): time.time() when the stage started. Defaults to None.
+        """
+        file_prefix = get_file_prefix(topic)
+        self._write([
+            ("INSERT INTO topics (file_prefix, topic, num_scenes, outline_path, updated_at) VALUES (?, ?, ?, ?, ?) "
+             "ON CONFLICT (file_prefix) DO UPDATE SET topic = excluded.topic, num_scenes = excluded.num_scenes, "
+             "outline_path = excluded.outline_path, updated_at = excluded.updated_at",
+             (file_prefix, topic, num_scenes, outline_path, time.time())),
+            self._stage_run(file_prefix, None, "outline", "succeeded", artifact_path=outline_path, started_at=started_at),
+        ])
+
+    def record_plan(self, topic: str, scene_number: int, plan_path: str, started_at: Optional[float] = None) -> None:
+        """Record a scene's implementation plan.
+
+        Args:
+            topic (str): Topic name
+            scene_number (int): Scene number
+            plan_path (str): Path of the implementation plan file
+            started_at (float, optional): time.time() when the stage started. Defaults to None.
+        """
+        file_prefix = get_file_prefix(topic)
+        self._write([
+            self._upsert_scene(file_prefix, scene_number, plan_path=plan_path),
+            self._stage_run(file_prefix, scene_number, "plan", "succeeded", artifact_path=plan_path, started_at=started_at),
+        ])
+
+    def record_code(self, topic: str, scene_number: int, version: int, code_path: str, started_at: Optional[float] = None) -> None:
+        """Record a generated or fixed code version.
+
+        Args:
+            topic (str): Topic name
+            scene_number (int): Scene number
+            version (int): Code version
+            code_path (str): Path of the code file
+            started_at (float, optional): time.time() when the stage started. Defaults to None.
+        """
+        file_prefix = get_file_prefix(topic)
+        self._write([
+            ("INSERT INTO scenes (file_prefix, scene_number, code_versions, latest_code_path, updated_at) VALUES (?, ?, 1, ?, ?) "
+             "ON CONFLICT (file_prefix, scene_number) DO UPDATE SET code_versions = code_versions + 1, "
+             "latest_code_path = excluded.latest_code_path, updated_at = excluded.updated_at",
+             (file_prefix, scene_number, code_path, time.time())),
+            self._stage_run(file_prefix, scene_number, "code", "succeeded", version=version, artifact_path=code_path, started_at=started_at),
+        ])
+
+    def record_render(self, topic: str, scene_number: int, version: int, error: Optional[str] = None,
+                      stage: str = "render", started_at: Optional[float] = None) -> None:
+        """Record the outcome of rendering (or statically checking) a code version.
+
+        Args:
+            topic (str): Topic name
+            scene_number (int): Scene number
+            version (int): Code version
+            error (str, optional): Error message, None if the render succeeded. Defaults to None.
+            stage (str, optional): Stage name, e.g. "render" or "static_check". Defaults to "render".
+            started_at (float, optional): time.time() when the stage started. Defaults to None.
+        """
+        file_prefix = get_file_prefix(topic)
+        if error is None:
+            scene_update = self._upsert_scene(file_prefix, scene_number, rendered_version=version, last_error=None)
+        else:
+            scene_update = self._upsert_scene(file_prefix, scene_number, last_error=error)
+        self._write([
+            scene_update,
+            self._stage_run(file_prefix, scene_number, stage, "succeeded" if error is None else "failed",
+                            version=version, started_at=started_at, error=error),
+        ])
+
+    def record_combined(self, topic: str, video_path: str, started_at: Optional[float] = None) -> None:
+        """Record the combined video of a topic.
+
+        Args:
+            topic (str): Topic name
+            video_path (str): Path of the combined video
+            started_at (float, optional): time.time() when the stage started. Defaults to None.
+        """
+        file_prefix = get_file_prefix(topic)
+        self._write([
+            ("UPDATE topics SET combined_video_path = ?, updated_at = ? WHERE file_prefix = ?", (video_path, time.time(), file_prefix)),
+            self._stage_run(file_prefix, None, "combine", "succeeded", artifact_path=video_path, started_at=started_at),
+        ])
+
+    def has_topic(self, topic: str) -> bool:
+        """Return whether the topic is known to the store."""
+        return bool(self._query("SELECT 1 FROM topics WHERE file_prefix = ?", (get_file_prefix(topic),)))
+
+    def ensure_topics(self, topics: Iterable[str]) -> None:
+        """Index topics from the filesystem if the store does not know them yet.
+
+        Args:
+            topics (Iterable[str]): Topic names
+        """
+        known = {row["file_prefix"] for row in self._query("SELECT file_prefix FROM topics")}
+        for topic in topics:
+            if get_file_prefix(topic) not in known:
+                self.backfill_topic(topic)
+
+    def backfill_topic(self, topic: str) -> None:
+        """Index the existing output of a topic from the filesystem.
+
+        Args:
+            topic (str): Topic name
+        """
+        file_prefix = get_file_prefix(topic)
+        topic_dir = os.path.join(self.output_dir, file_prefix)
+        outline_path = os.path.join(topic_dir, f"{file_prefix}_scene_outline.txt")
+        if not os.path.exists(outline_path):
+            return
+        with open(outline_path, "r") as f:
+            num_scenes = len(re.findall(r'<SCENE_(\d+)>[^<]', extract_xml(f.read())))
+
+        statements = [(
+            "INSERT OR REPLACE INTO topics (file_prefix, topic, num_scenes, outline_path, combined_video_path, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (file_prefix, topic, num_scenes, outline_path, None, time.time())
+        )]
+        combined_video_path = os.path.join(topic_dir, f"{file_prefix}_combined.mp4")
+        if os.path.exists(combined_video_path):
+            statements.append(("UPDATE topics SET combined_video_path = ? WHERE file_prefix = ?", (combined_video_path, file_prefix)))
+
+        for i in range(1, num_scenes + 1):
+            scene_dir = os.path.join(topic_dir, f"scene{i}")
+            plan_path = os.path.join(scene_dir, f"{file_prefix}_scene{i}_implementation_plan.txt")
+            code_dir = os.path.join(scene_dir, "code")
+            versions = []
+            if os.path.isdir(code_dir):
+                versions = sorted(int(m.group(1)) for m in (re.search(r'_v(\d+)\.py$', name) for name in os.listdir(code_dir)) if m)
+            rendered = os.path.exists(os.path.join(scene_dir, "succ_rendered.txt"))
+            statements.append(self._upsert_scene(
+                file_prefix, i,
+                plan_path=plan_path if os.path.exists(plan_path) else None,
+                code_versions=len(versions),
+                latest_code_path=os.path.join(code_dir, f"{file_prefix}_scene{i}_v{versions[-1]}.py") if versions else None,
+                rendered_version=versions[-1] if rendered and versions else None
+            ))
+        self._write(statements)
+
+    def backfill_output_dir(self) -> None:
+        """Index every topic folder of the output directory that the store does not know yet."""
+        if not os.path.isdir(self.output_dir):
+            return
+        known = {row["file_prefix"] for row in self._query("SELECT file_prefix FROM topics")}
+        for item in os.listdir(self.output_dir):
+            if item not in known and os.path.isdir(os.path.join(self.output_dir, item)):
+                # Folder names are already file prefixes, which map to themselves
+                self.backfill_topic(item)
+
+    def implementation_plan_paths(self, topic: str) -> Dict[int, Optional[str]]:
+        """Return the implementation plan path of every scene of a topic.
+
+        Args:
+            topic (str): Topic name
+
+        Returns:
+            Dict[int, Optional[str]]: Scene number mapped to its plan path, or None if it has no plan.
+            Empty if the topic has no outline.
+        """
+        statuses = self.topic_statuses([topic])
+        status = statuses[0]
+        if not status["has_scene_outline"]:
+            return {}
+        return {scene["scene_number"]: scene["plan_path"] for scene in status["scene_status"]}
+
+    def scene_state(self, topic: str, scene_number: int) -> Dict[str, object]:
+        """Return the recorded state of one scene.
+
+        Args:
+            topic (str): Topic name
+            scene_number (int): Scene number
+
+        Returns:
+            Dict[str, object]: has_plan, has_code and has_render flags plus the raw row fields
+        """
+        rows = self._query("SELECT * FROM scenes WHERE file_prefix = ? AND scene_number = ?", (get_file_prefix(topic), scene_number))
+        row = dict(rows[0]) if rows else {"plan_path": None, "code_versions": 0, "rendered_version": None}
+        row["has_plan"] = row["plan_path"] is not None
+        row["has_code"] = row["code_versions"] > 0
+        row["has_render"] = row["rendered_version"] is not None
+        return row
+
+    def topic_statuses(self, topics: Iterable[str]) -> List[Dict[str, object]]:
+        """Return the status of many topics, in the format of VideoGenerator.check_theorem_status.
+
+        Args:
+            topics (Iterable[str]): Topic names
+
+        Returns:
+            List[Dict[str, object]]: One status dict per topic, in order
+        """
+        topics = list(topics)
+        prefixes = [get_file_prefix(topic) for topic in topics]
+        topic_rows = {}
+        scene_rows = {}
+        # Primary key lookups, in chunks below SQLite's bound parameter limit
+        for start in range(0, len(prefixes), 500):
+            chunk = prefixes[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            for row in self._query(f"SELECT * FROM topics WHERE file_prefix IN ({placeholders})", tuple(chunk)):
+                topic_rows[row["file_prefix"]] = row
+            for row in self._query(f"SELECT * FROM scenes WHERE file_prefix IN ({placeholders})", tuple(chunk)):
+                scene_rows.setdefault(row["file_prefix"], {})[row["scene_number"]] = row
+
+        statuses = []
+        for topic, file_prefix in zip(topics, prefixes):
+            topic_row = topic_rows.get(file_prefix)
+            num_scenes = topic_row["num_scenes"] if topic_row is not None else 0
+            scenes = scene_rows.get(file_prefix, {})
+            scene_status = []
+            for i in range(1, num_scenes + 1):
+                row = scenes.get(i)
+                scene_status.append({
+                    'scene_number': i,
+                    'has_plan': row is not None and row["plan_path"] is not None,
+                    'has_code': row is not None and row["code_versions"] > 0,
+                    'has_render': row is not None and row["rendered_version"] is not None,
+                    'plan_path': row["plan_path"] if row is not None else None,
+                    'rendered_version': row["rendered_version"] if row is not None else None,
+                    'last_error': row["last_error"] if row is not None else None,
+                })
+            statuses.append({
+                'topic': topic,
+                'has_scene_outline': topic_row is not None,
+                'total_scenes': num_scenes,
+                'implementation_plans': sum(scene['has_plan'] for scene in scene_status),
+                'code_files': sum(scene['has_code'] for scene in scene_status),
+                'rendered_scenes': sum(scene['has_render'] for scene in scene_status),
+                'has_combined_video': topic_row is not None and topic_row["combined_video_path"] is not None,
+                'scene_status': scene_status
+            })
+        return statuses
+
+    def summary(self) -> Dict[str, int]:
+        """Return output-wide counts of topics, combined videos, scenes and rendered scenes."""
+        topic_counts = self._query("SELECT COUNT(*) AS total, COUNT(combined_video_path) AS combined FROM topics")[0]
+        scene_counts = self._query("SELECT COUNT(*) AS total, COUNT(rendered_version) AS rendered FROM scenes")[0]
+        return {
+            "topics": topic_counts["total"],
+            "combined_videos": topic_counts["combined"],
+            "scenes": scene_counts["total"],
+            "rendered_scenes": scene_counts["rendered"],
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
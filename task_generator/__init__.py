@@ -1,6 +1,8 @@
 from .prompts_raw import (
     _prompt_code_generation,
     _prompt_fix_error,
+    _prompt_fix_error_diff,
+    _prompt_code_edits,
     _prompt_visual_fix_error,
     _prompt_scene_plan,
     _prompt_scene_vision_storyboard,
@@ -24,6 +26,9 @@ from .prompts_raw import (
     _prompt_rag_query_generation_fix_error
 )
 from typing import Union, List
+
+# Bump when prompts are assembled differently, so that cached model responses are not reused
+PROMPT_TEMPLATE_VERSION = "2"
   
 def get_prompt_scene_plan(topic: str, description: str) -> str:
     """
@@ -114,7 +119,7 @@ def get_prompt_code_generation(topic: str,
                 prompt += f"\n" + "\n".join(additional_context[1:])
     return prompt
 
-def get_prompt_fix_error(implementation_plan: str, manim_code: str, error: str, additional_context: Union[str, List[str]] = None) -> str:
+def get_prompt_fix_error(implementation_plan: str, manim_code: str, error: str, additional_context: Union[str, List[str]] = None, diff: bool = False) -> str:
     """
     Generate a prompt to fix errors in the given manim code.
 
@@ -122,11 +127,12 @@ def get_prompt_fix_error(implementation_plan: str, manim_code: str, error: str,
         implementation_plan (str): The implementation plan of the scene.
         code (str): The manim code with errors.
         error (str): The error message encountered.
+        diff (bool): Ask for SEARCH/REPLACE edits instead of the full corrected code.
 
     Returns:
         str: The formatted prompt to fix the code errors.
     """
-    prompt = _prompt_fix_error.format(
+    prompt = (_prompt_fix_error_diff if diff else _prompt_fix_error).format(
         implementation_plan=implementation_plan,
         manim_code=manim_code,
         error_message=error
@@ -147,6 +153,15 @@ def get_prompt_visual_fix_error(implementation: str, generated_code: str) -> str
     )
     return prompt
 
+def get_prompt_code_edits() -> str:
+    """
+    Return the instructions asking for SEARCH/REPLACE edits instead of complete code.
+
+    Returns:
+        str: Output format instructions to append to a code revision prompt.
+    """
+    return _prompt_code_edits
+
 def get_banned_reasonings() -> List[str]:
     return _banned_reasonings.split("\n")
 
@@ -1875,3 +1875,64 @@ You MUST only output the queries in the following JSON format (with json triple
 ]
 ```"""
 
+_prompt_fix_error_diff = """You are an expert Manim developer specializing in debugging and error resolution. Based on the provided implementation plan and Manim code, analyze the error message and fix the code with the smallest edits that resolve the error.
+
+Implementation Plan of the Scene:
+{implementation_plan}
+
+Manim Code:
+```python
+{manim_code}
+```
+
+Error Message:
+{error_message}
+
+Requirements:
+1. Provide complete error analysis with specific line numbers where possible.
+2. Explain why the error occurred in plain language.
+3. If external assets (e.g., images, audio, video) are referenced, remove them.
+4. **If voiceover is present in the original code, ensure it remains preserved in the corrected code.**
+5. Preserve all original code that is not causing the reported error. Do not remove or alter any intentional elements unnecessarily.
+6. Follow best practices for code clarity and the current Manim version.
+7. Do NOT return the full code. Return only the changed parts as SEARCH/REPLACE blocks:
+   - The SEARCH section must copy consecutive lines of the Manim Code above exactly, including indentation, and must match only one place in the code. Include a line or two of unchanged context if needed to make it unique.
+   - The REPLACE section holds the new version of those lines.
+   - Use one block per change, in the order the changes appear in the code. To delete lines, leave REPLACE empty. To add lines, SEARCH a neighbouring line and repeat it in REPLACE together with the new lines.
+
+You MUST only output the following format (from <THINKING> to </CODE_EDITS>). You MUST NOT come up with any other format like JSON.
+
+<THINKING>
+Error Type: [Syntax/Runtime/Logic/Other]
+Error Location: [File/Line number/Component]
+Root Cause: [Brief explanation of what caused the error]
+Impact: [What functionality is affected]
+Solution:
+[FIXES_REQUIRED]
+- Fix 1: [Description]
+  - Location: [Where to apply]
+  - Change: [What to modify]
+- Fix 2: [If applicable]
+...
+</THINKING>
+<CODE_EDITS>
+<<<<<<< SEARCH
+[Exact lines of the current code]
+=======
+[Corrected lines]
+>>>>>>> REPLACE
+</CODE_EDITS>
+"""
+
+_prompt_code_edits = """Instead of the complete code, return only the changed parts of the Generated Code as SEARCH/REPLACE blocks inside the code section:
+
+<<<<<<< SEARCH
+[Exact lines of the current code]
+=======
+[Improved lines]
+>>>>>>> REPLACE
+
+- The SEARCH section must copy consecutive lines of the current code exactly, including indentation, and must match only one place in the code. Include a line or two of unchanged context if needed to make it unique.
+- Use one block per change, in the order the changes appear in the code. To delete lines, leave REPLACE empty. To add lines, SEARCH a neighbouring line and repeat it in REPLACE together with the new lines.
+"""
+